@@ -0,0 +1,62 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Shortest ICD-10 code that can be a parent (the three-character category)
+MIN_PARENT_LENGTH = 3
+
+def normalize_code(code: str) -> str:
+    """Undotted upper-case form used to compare codes (A01.09 -> A0109)"""
+    return (code or "").replace(".", "").strip().upper()
+
+def code_forms(code: str) -> List[str]:
+    """Spellings a code may be stored under: dotted (A01.09) and undotted (A0109)"""
+    normalized = normalize_code(code)
+    if len(normalized) <= MIN_PARENT_LENGTH:
+        return [normalized]
+    return [f"{normalized[:MIN_PARENT_LENGTH]}.{normalized[MIN_PARENT_LENGTH:]}", normalized]
+
+def resolve_parents(codes: Iterable[Tuple[str, Optional[str]]]) -> Dict[str, Optional[str]]:
+    """
+    Map each code to its nearest existing ancestor code, given (code,
+    category_code) pairs. The parent is the longest proper prefix of the
+    code that is itself a code (A01.09 -> A01.0 -> A01); when no prefix
+    exists the row's category_code is used if that is a code. Codes are
+    compared undotted, so dotted codes and undotted category codes match.
+    """
+    pairs = list(codes)
+    by_normalized = {normalize_code(code): code for code, _ in pairs}
+
+    parents = {}
+    for code, category_code in pairs:
+        normalized = normalize_code(code)
+        parent = None
+        for length in range(len(normalized) - 1, MIN_PARENT_LENGTH - 1, -1):
+            parent = by_normalized.get(normalized[:length])
+            if parent is not None:
+                break
+        if parent is None:
+            candidate = by_normalized.get(normalize_code(category_code))
+            if candidate is not None and candidate != code:
+                parent = candidate
+        parents[code] = parent
+    return parents
+
+def ancestor_paths(parents: Dict[str, Optional[str]]) -> Dict[str, List[str]]:
+    """Root-first ancestor path of every code; depth is the path's length"""
+    paths: Dict[str, List[str]] = {}
+
+    def path_of(code):
+        chain = []
+        seen = {code}
+        parent = parents.get(code)
+        while parent is not None and parent not in seen:
+            if parent in paths:
+                chain.extend(reversed(paths[parent] + [parent]))
+                break
+            chain.append(parent)
+            seen.add(parent)
+            parent = parents.get(parent)
+        return list(reversed(chain))
+
+    for code in parents:
+        paths[code] = path_of(code)
+    return paths
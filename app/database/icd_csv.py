@@ -0,0 +1,53 @@
+import csv
+import hashlib
+from pathlib import Path
+
+# data/codes.csv at the project root
+DEFAULT_CSV_PATH = Path(__file__).resolve().parent.parent.parent / 'data' / 'codes.csv'
+
+def format_icd_code(code: str) -> str:
+    """Format ICD code with proper dots (e.g., A0109 -> A01.09)"""
+    if len(code) <= 3:
+        return code
+    return f"{code[:3]}.{code[3:]}"
+
+def process_icd_row(row):
+    """
+    Process a row from the CSV into structured data. The raw row rides along
+    as _raw_row, so a row that later fails to write can be rejected verbatim.
+    """
+    return {
+        'category_code': row[0],
+        'subcategory': row[1],
+        'full_code': format_icd_code(row[2]),
+        'short_description': row[3],
+        'long_description': row[4],
+        'category_name': row[5],
+        '_raw_row': list(row)
+    }
+
+# Fields that make up a code's content; a change in any of them means the code changed
+FINGERPRINT_FIELDS = ('category_code', 'subcategory', 'short_description', 'long_description', 'category_name')
+
+def row_fingerprint(row) -> str:
+    """Stable hash of a processed row's descriptive fields"""
+    content = "\x1f".join(str(row.get(field) or '') for field in FINGERPRINT_FIELDS)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def iter_icd_rows(csv_path=DEFAULT_CSV_PATH):
+    """Yield processed rows from an ICD codes CSV, skipping malformed lines"""
+    with open(csv_path, 'r', encoding='utf-8') as file:
+        for row in csv.reader(file):
+            if len(row) < 6:
+                continue
+            yield process_icd_row(row)
+
+def iter_icd_records(csv_path=DEFAULT_CSV_PATH):
+    """Yield CSV rows in the shape returned by ICDService searches (code, short_desc, ...)"""
+    for row in iter_icd_rows(csv_path):
+        yield {
+            'code': row['full_code'],
+            'short_desc': row['short_description'],
+            'long_desc': row['long_description'],
+            'category_code': row['category_code']
+        }
@@ -1,55 +1,479 @@
-from neo4j import GraphDatabase
+from neo4j import READ_ACCESS, AsyncGraphDatabase, GraphDatabase
+from app.database.hierarchy import MIN_PARENT_LENGTH, ancestor_paths, code_forms, normalize_code, resolve_parents
+from app.database.icd_csv import row_fingerprint
+from app.database.schema import ensure_schema
+import hashlib
 import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DATASET_NAME = 'icd10'
+
+DATASET_VERSION_QUERY = "MATCH (dataset:Dataset {name: $name}) RETURN dataset.version as version"
+
+# Hierarchy pass: link each code to its resolved parent, dropping a stale parent link
+HIERARCHY_QUERY = """
+UNWIND $rows AS row
+MATCH (code:ICDCode {code: row.code})
+SET code.parent_code = row.parent_code,
+    code.ancestors = row.ancestors,
+    code.depth = row.depth
+WITH code, row
+OPTIONAL MATCH (stale:ICDCode)-[old:HAS_SUBCATEGORY]->(code)
+WHERE row.parent_code IS NULL OR stale.code <> row.parent_code
+DELETE old
+WITH DISTINCT code, row
+WHERE row.parent_code IS NOT NULL
+MATCH (parent:ICDCode {code: row.parent_code})
+MERGE (parent)-[:HAS_SUBCATEGORY]->(code)
+"""
+
+# Hierarchy pass: attach each code to its named category, dropping the link to an old one
+CATEGORY_MEMBERSHIP_QUERY = """
+UNWIND $rows AS row
+MATCH (code:ICDCode {code: row.code})
+MERGE (cat:Category {name: row.category_name})
+MERGE (cat)-[:CONTAINS]->(code)
+WITH cat, code
+OPTIONAL MATCH (stale:Category)-[old:CONTAINS]->(code)
+WHERE stale <> cat
+DELETE old
+"""
+
+# Partial hierarchy pass. A code's parent is a prefix of it at least
+# MIN_PARENT_LENGTH long, so codes sharing a three-character root (A01, A01.0,
+# A01.09, ...) can only be each other's relatives: rebuilding a code means
+# re-reading its root's family, not the whole graph (seeks on the unique index).
+HIERARCHY_FAMILY_QUERY = """
+UNWIND $roots AS root
+MATCH (code:ICDCode)
+WHERE code.code STARTS WITH root
+RETURN code.code as code, code.category_code as category_code, code.category_name as category_name,
+       code.parent_code as parent_code, coalesce(code.ancestors, []) as ancestors
+"""
+
+# Codes in other families that fall back to one of the given codes as their category
+HIERARCHY_CATEGORY_LINK_QUERY = """
+MATCH (code:ICDCode)
+WHERE code.category_code IN $keys
+RETURN code.code as code
+"""
+
+# Category-fallback parents outside the families being rebuilt, with their stored ancestry
+HIERARCHY_ANCHOR_QUERY = """
+UNWIND $candidates AS candidate
+MATCH (code:ICDCode {code: candidate})
+RETURN code.code as code, coalesce(code.ancestors, []) as ancestors
+"""
+
+def pool_config_from_env():
+    """Connection pool settings, overridable through NEO4J_* environment variables"""
+    return {
+        'max_connection_pool_size': int(os.getenv('NEO4J_MAX_CONNECTION_POOL_SIZE', 50)),
+        'connection_acquisition_timeout': float(os.getenv('NEO4J_CONNECTION_ACQUISITION_TIMEOUT', 30)),
+        'max_connection_lifetime': float(os.getenv('NEO4J_MAX_CONNECTION_LIFETIME', 3600)),
+        'max_transaction_retry_time': float(os.getenv('NEO4J_MAX_TRANSACTION_RETRY_TIME', 15)),
+    }
+
+# Query label -> normalised query text; ICDService reports it as the neo4j_queries collector
+QUERY_TEXTS = {}
+
+def query_label(query):
+    """Short stable id for a query, used as its metrics label (full text in the neo4j_queries collector)"""
+    label = hashlib.sha1(query.encode("utf-8")).hexdigest()[:10]
+    if label not in QUERY_TEXTS:
+        QUERY_TEXTS[label] = " ".join(query.split())[:200]
+    return label
+
+def profile_slow_ms_from_env():
+    """Threshold in ms above which reads are re-run with PROFILE (NEO4J_PROFILE_SLOW_MS, off if unset)"""
+    value = os.getenv('NEO4J_PROFILE_SLOW_MS')
+    return float(value) if value else None
 
 class Neo4jICD:
-    def __init__(self, uri, user, password):
-        self._driver = GraphDatabase.driver(uri, auth=(user, password))
+    """
+    Shared Neo4j client used by ICDService and the loader.
+
+    Holds a single pooled driver, created on first use. Reads go through
+    execute_read and writes through execute_write, so transient errors are
+    retried by the driver and reads can be routed to followers in a cluster.
+    Pass driver to wrap an existing driver (or a stand-in, as the benchmarks
+    do) instead.
+
+    Pass metrics (a MetricsRegistry) to record every query's latency and
+    result size; with profile_slow_ms set too, reads slower than that are
+    re-run once with PROFILE and the plan is kept in metrics.slow_queries.
+    Without a registry nothing is recorded.
+    """
+
+    def __init__(self, uri, user, password, driver=None, metrics=None, profile_slow_ms=None, **pool_config):
+        self.metrics = metrics
+        self.profile_slow_ms = profile_slow_ms if profile_slow_ms is not None else profile_slow_ms_from_env()
+        self._driver = driver
+        self._connection = (uri, user, password, pool_config)
+        self._driver_lock = threading.Lock()
+
+    @property
+    def driver(self):
+        """The pooled driver, created on first use so constructing the client costs nothing"""
+        if self._driver is None:
+            with self._driver_lock:
+                if self._driver is None:
+                    self._driver = self._create_driver()
+        return self._driver
+
+    def _create_driver(self):
+        uri, user, password, pool_config = self._connection
+        if uri is None:
+            raise RuntimeError("No Neo4j URI configured (a snapshot-only service has no database to query)")
+        config = pool_config_from_env()
+        config.update({key: value for key, value in pool_config.items() if value is not None})
+        logger.info(f"Creating Neo4j driver for {uri} (pool size {config['max_connection_pool_size']})")
+        return GraphDatabase.driver(uri, auth=(user, password), **config)
+
+    def verify_connectivity(self):
+        """Constant-time health check: raises if the server can't be reached or authentication fails"""
+        started = time.perf_counter()
+        self.driver.verify_connectivity()
+        if self.metrics is not None:
+            self.metrics.observe("neo4j_connectivity_check_seconds", time.perf_counter() - started)
 
     def close(self):
-        self._driver.close()
-
-    def create_icd_relationships(self, row):
-        with self._driver.session() as session:
-            # Create nodes and relationships for one ICD code entry
-            query = """
-            MERGE (cat:Category {name: $category_name})
-            
-            MERGE (code:ICDCode {
-                code: $full_code,
-                category_code: $category_code,
-                subcategory: $subcategory,
-                short_desc: $short_description,
-                long_desc: $long_description
-            })
-            
-            MERGE (cat)-[:CONTAINS]->(code)
-            
-            // Create hierarchical relationships
-            WITH cat, code
-            MATCH (parent:ICDCode)
-            WHERE parent.code = $category_code
-            MERGE (parent)-[:HAS_SUBCATEGORY]->(code)
+        if self._driver is not None:
+            self._driver.close()
+
+    def read(self, query, **params):
+        """Run a read query in a managed (retried) read transaction and return all records"""
+        started = time.perf_counter()
+        with self.driver.session() as session:
+            records = session.execute_read(lambda tx: list(tx.run(query, params)))
+        elapsed = time.perf_counter() - started
+        label = self._record_query("read", query, elapsed, len(records))
+        if self.metrics is not None and self.profile_slow_ms is not None and elapsed * 1000 >= self.profile_slow_ms:
+            self._profile(label, query, params, elapsed)
+        return records
+
+    def stream(self, query, fetch_size=None, **params):
+        """
+        Run a read query in an auto-commit transaction and yield records as the
+        driver receives them, fetch_size at a time, instead of collecting them.
+        Close the generator (or stop iterating) to release the session early.
+        """
+        config = {'default_access_mode': READ_ACCESS}
+        if fetch_size:
+            config['fetch_size'] = fetch_size
+        started = time.perf_counter()
+        count = 0
+        try:
+            with self.driver.session(**config) as session:
+                for record in session.run(query, params):
+                    count += 1
+                    yield record
+        finally:
+            self._record_query("stream", query, time.perf_counter() - started, count)
+
+    def read_single(self, query, **params):
+        """Run a read query and return its first record, or None"""
+        records = self.read(query, **params)
+        return records[0] if records else None
+
+    def write(self, query, session=None, **params):
+        """
+        Run a write query in a managed (retried) write transaction. Pass session
+        to reuse a session the caller holds (e.g. one per loader worker).
+        """
+        started = time.perf_counter()
+        if session is not None:
+            summary = session.execute_write(lambda tx: tx.run(query, params).consume())
+        else:
+            with self.driver.session() as session:
+                summary = session.execute_write(lambda tx: tx.run(query, params).consume())
+        self._record_query("write", query, time.perf_counter() - started)
+        return summary
+
+    def _record_query(self, kind, query, elapsed, records=None):
+        label = query_label(query)
+        if self.metrics is None:
+            return label
+        self.metrics.observe("neo4j_query_seconds", elapsed, query=label, kind=kind)
+        self.metrics.increment("neo4j_queries_total", query=label, kind=kind)
+        if records is not None:
+            self.metrics.observe("neo4j_records", records, query=label)
+        return label
+
+    def _profile(self, label, query, params, elapsed):
+        """Re-run a slow read with PROFILE and keep its plan (reads only, so re-running is safe)"""
+        try:
+            with self.driver.session() as session:
+                summary = session.run(f"PROFILE {query}", params).consume()
+            plan = summary.profile
+        except Exception as e:
+            plan = {'error': str(e)}
+        self.metrics.record_slow_query({
+            'query': label,
+            'text': QUERY_TEXTS.get(label),
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'params': sorted(params),
+            'plan': plan
+        })
+
+    def ensure_schema(self, await_timeout=None):
+        """Create uniqueness constraints and indexes if they don't exist yet (see schema.ensure_schema)"""
+        ensure_schema(self.driver, await_timeout=await_timeout)
+
+    def get_dataset_version(self):
+        """Version stamp of the last completed import, or None if nothing was imported"""
+        record = self.read_single(DATASET_VERSION_QUERY, name=DATASET_NAME)
+        return record["version"] if record else None
+
+    def bump_dataset_version(self, version=None):
+        """Record a new dataset version so caches keyed on the old one are invalidated"""
+        version = version or str(time.time_ns())
+        self.write(
             """
-            
-            session.run(query, 
-                category_name=row['category_name'],
-                full_code=row['full_code'],
-                category_code=row['category_code'],
-                subcategory=row['subcategory'],
-                short_description=row['short_description'],
-                long_description=row['long_description']
+            MERGE (dataset:Dataset {name: $name})
+            SET dataset.version = $version, dataset.updated_at = datetime()
+            """,
+            name=DATASET_NAME,
+            version=version
+        )
+        logger.info(f"Dataset version bumped to {version}")
+        return version
+
+    def create_icd_relationships(self, row, session=None):
+        # Create or update the node for one ICD code entry; edges are created by build_hierarchy
+        query = """
+        MERGE (code:ICDCode {code: $full_code})
+        SET code.category_code = $category_code,
+            code.category_name = $category_name,
+            code.subcategory = $subcategory,
+            code.short_desc = $short_description,
+            code.long_desc = $long_description,
+            code.fingerprint = $fingerprint
+        """
+
+        self.write(query,
+            session=session,
+            category_name=row['category_name'],
+            full_code=row['full_code'],
+            category_code=row['category_code'],
+            subcategory=row['subcategory'],
+            short_description=row['short_description'],
+            long_description=row['long_description'],
+            fingerprint=row.get('fingerprint') or row_fingerprint(row)
+        )
+
+    def create_icd_relationships_batch(self, rows, session=None):
+        """
+        Create or update the nodes for a batch of ICD code entries in one
+        transaction. Edges are left to build_hierarchy, which runs once all
+        nodes exist, so the import never looks up parents row by row.
+        """
+        query = """
+        UNWIND $rows AS row
+        MERGE (code:ICDCode {code: row.full_code})
+        SET code.category_code = row.category_code,
+            code.category_name = row.category_name,
+            code.subcategory = row.subcategory,
+            code.short_desc = row.short_description,
+            code.long_desc = row.long_description,
+            code.fingerprint = row.fingerprint
+        """
+
+        params = [
+            {
+                'category_name': row['category_name'],
+                'full_code': row['full_code'],
+                'category_code': row['category_code'],
+                'subcategory': row['subcategory'],
+                'short_description': row['short_description'],
+                'long_description': row['long_description'],
+                'fingerprint': row.get('fingerprint') or row_fingerprint(row)
+            }
+            for row in rows
+        ]
+
+        self.write(query, session=session, rows=params)
+        return len(params)
+
+    def build_hierarchy(self, codes=None, batch_size=5000):
+        """
+        Create every HAS_SUBCATEGORY and CONTAINS edge in one pass after the
+        nodes are imported, and store each code's parent_code, ancestors
+        (root first) and depth on the node. Parents are resolved in Python
+        from a single scan of all codes, then written with batched UNWIND
+        queries.
+
+        Pass codes (new, changed or retired) to update only around them: only
+        their families are read (see HIERARCHY_FAMILY_QUERY), and only the
+        given codes plus nodes whose parent or ancestors changed are written.
+        Returns the number of codes written.
+        """
+        started = time.perf_counter()
+        if codes is None:
+            records = self.read(
+                "MATCH (code:ICDCode) RETURN code.code as code, code.category_code as category_code, "
+                "code.category_name as category_name"
             )
+            anchors = {}
+        else:
+            codes = set(codes)
+            records, anchors = self._hierarchy_neighbourhood(codes)
+
+        parents = resolve_parents(
+            [(record["code"], record["category_code"]) for record in records] + [(code, None) for code in anchors]
+        )
+        parents.update({code: None for code in anchors})  # their ancestry is read, not recomputed
+        ancestors = ancestor_paths(parents)
+        for code, path in ancestors.items():
+            if path and path[0] in anchors:
+                ancestors[code] = anchors[path[0]] + path
+
+        rows = []
+        for record in records:
+            code = record["code"]
+            row = {
+                'code': code,
+                'parent_code': parents[code],
+                'ancestors': ancestors[code],
+                'depth': len(ancestors[code]),
+                'category_name': record["category_name"]
+            }
+            moved = codes is not None and (record["parent_code"] != row['parent_code']
+                                           or list(record["ancestors"]) != row['ancestors'])
+            if codes is None or code in codes or moved:
+                rows.append(row)
+
+        with self.driver.session() as session:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                self.write(HIERARCHY_QUERY, session=session, rows=batch)
+                self.write(CATEGORY_MEMBERSHIP_QUERY, session=session,
+                           rows=[row for row in batch if row['category_name']])
+
+        linked = sum(1 for row in rows if row['parent_code'] is not None)
+        logger.info(f"Built hierarchy for {len(rows)} codes ({linked} with a parent) "
+                    f"in {time.perf_counter() - started:.1f}s")
+        return len(rows)
+
+    def _hierarchy_neighbourhood(self, codes):
+        """
+        Records of every family a partial hierarchy pass can touch: the given
+        codes' families, plus (transitively) families whose codes fall back
+        to one of them as their category. Also returns the ancestry of
+        category-fallback parents outside those families, keyed by code.
+        """
+        records = {}
+        done = set()
+        pending = {normalize_code(code)[:MIN_PARENT_LENGTH] for code in codes}
+        while pending:
+            fetched = self.read(HIERARCHY_FAMILY_QUERY, roots=sorted(pending))
+            records.update((record["code"], record) for record in fetched)
+            done |= pending
+            keys = sorted({form for record in fetched for form in code_forms(record["code"])} |
+                          {form for code in codes for form in code_forms(code)})
+            linked = self.read(HIERARCHY_CATEGORY_LINK_QUERY, keys=keys)
+            pending = {normalize_code(record["code"])[:MIN_PARENT_LENGTH] for record in linked} - done
+
+        candidates = sorted({
+            form for record in records.values() if record["category_code"]
+            and normalize_code(record["category_code"])[:MIN_PARENT_LENGTH] not in done
+            for form in code_forms(record["category_code"])
+        })
+        anchors = {}
+        if candidates:
+            anchors = {record["code"]: list(record["ancestors"])
+                       for record in self.read(HIERARCHY_ANCHOR_QUERY, candidates=candidates)}
+        return list(records.values()), anchors
+
+    def get_fingerprints(self):
+        """Map of code -> content fingerprint for every active ICD code"""
+        records = self.read("MATCH (code:ICDCode) RETURN code.code as code, code.fingerprint as fingerprint")
+        return {record["code"]: record["fingerprint"] for record in records}
+
+    def retire_codes(self, codes, session=None):
+        """
+        Retire codes dropped from the release: they lose the ICDCode label (and so
+        drop out of every index and query) and their relationships, but the node
+        is kept as RetiredICDCode for reference
+        """
+        query = """
+        UNWIND $codes AS retired_code
+        MATCH (code:ICDCode {code: retired_code})
+        OPTIONAL MATCH (code)-[rel]-()
+        DELETE rel
+        WITH DISTINCT code
+        REMOVE code:ICDCode
+        SET code:RetiredICDCode, code.retired_at = datetime()
+        """
+        self.write(query, session=session, codes=list(codes))
+        return len(codes)
 
     def get_disease_info(self, icd_code):
-        with self._driver.session() as session:
-            query = """
-            MATCH (code:ICDCode {code: $code})
-            OPTIONAL MATCH (code)<-[:HAS_SUBCATEGORY]-(parent:ICDCode)
-            OPTIONAL MATCH (code)-[:HAS_SUBCATEGORY]->(child:ICDCode)
-            RETURN 
-                code.long_desc as description,
-                code.category_code as category,
-                collect(DISTINCT parent.code) as parent_codes,
-                collect(DISTINCT child.code) as child_codes
-            """
-            return session.run(query, code=icd_code).single()
\ No newline at end of file
+        # Parent and ancestors come from the properties written by build_hierarchy
+        query = """
+        MATCH (code:ICDCode {code: $code})
+        OPTIONAL MATCH (code)-[:HAS_SUBCATEGORY]->(child:ICDCode)
+        RETURN
+            code.long_desc as description,
+            code.category_code as category,
+            CASE WHEN code.parent_code IS NULL THEN [] ELSE [code.parent_code] END as parent_codes,
+            coalesce(code.ancestors, []) as ancestor_codes,
+            coalesce(code.depth, 0) as depth,
+            collect(DISTINCT child.code) as child_codes
+        """
+        return self.read_single(query, code=icd_code)
+
+class AsyncNeo4jICD:
+    """Read-only asyncio counterpart of Neo4jICD, built on the async driver"""
+
+    def __init__(self, uri, user, password, driver=None, metrics=None, **pool_config):
+        self.metrics = metrics
+        self._driver = driver
+        self._connection = (uri, user, password, pool_config)
+
+    @property
+    def driver(self):
+        """The async driver, created on first use (always from the event loop's thread)"""
+        if self._driver is None:
+            uri, user, password, pool_config = self._connection
+            if uri is None:
+                raise RuntimeError("No Neo4j URI configured (a snapshot-only service has no database to query)")
+            config = pool_config_from_env()
+            config.update({key: value for key, value in pool_config.items() if value is not None})
+            self._driver = AsyncGraphDatabase.driver(uri, auth=(user, password), **config)
+        return self._driver
+
+    async def close(self):
+        if self._driver is not None:
+            await self._driver.close()
+
+    @staticmethod
+    async def _collect(tx, query, params):
+        result = await tx.run(query, params)
+        return [record async for record in result]
+
+    async def read(self, query, **params):
+        """Run a read query in a managed (retried) read transaction and return all records"""
+        started = time.perf_counter()
+        async with self.driver.session() as session:
+            records = await session.execute_read(self._collect, query, params)
+        if self.metrics is not None:
+            label = query_label(query)
+            self.metrics.observe("neo4j_query_seconds", time.perf_counter() - started, query=label, kind="read")
+            self.metrics.increment("neo4j_queries_total", query=label, kind="read")
+            self.metrics.observe("neo4j_records", len(records), query=label)
+        return records
+
+    async def read_single(self, query, **params):
+        """Run a read query and return its first record, or None"""
+        records = await self.read(query, **params)
+        return records[0] if records else None
+
+    async def get_dataset_version(self):
+        """Version stamp of the last completed import, or None if nothing was imported"""
+        record = await self.read_single(DATASET_VERSION_QUERY, name=DATASET_NAME)
+        return record["version"] if record else None
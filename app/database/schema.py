@@ -0,0 +1,35 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+FULLTEXT_INDEX_NAME = "icd_code_text"
+
+# Idempotent schema statements; every lookup by code or category goes through these
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT icd_code_unique IF NOT EXISTS "
+    "FOR (code:ICDCode) REQUIRE code.code IS UNIQUE",
+    "CREATE CONSTRAINT category_name_unique IF NOT EXISTS "
+    "FOR (cat:Category) REQUIRE cat.name IS UNIQUE",
+    "CREATE CONSTRAINT dataset_name_unique IF NOT EXISTS "
+    "FOR (dataset:Dataset) REQUIRE dataset.name IS UNIQUE",
+    "CREATE INDEX icd_category_code IF NOT EXISTS "
+    "FOR (code:ICDCode) ON (code.category_code)",
+    # Keyset pagination within a category: seek on (category_code, code > cursor) in code order
+    "CREATE INDEX icd_category_code_order IF NOT EXISTS "
+    "FOR (code:ICDCode) ON (code.category_code, code.code)",
+    f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX_NAME} IF NOT EXISTS "
+    "FOR (code:ICDCode) ON EACH [code.short_desc, code.long_desc, code.code]",
+]
+
+def ensure_schema(driver, await_timeout=None):
+    """
+    Create the constraints and indexes used by the loader and ICDService.
+    With await_timeout (seconds), also wait for freshly created indexes to
+    come online; only the loader needs that, since it queries them right away.
+    """
+    with driver.session() as session:
+        for statement in SCHEMA_STATEMENTS:
+            session.run(statement).consume()
+        if await_timeout:
+            session.run("CALL db.awaitIndexes($timeout)", {'timeout': int(await_timeout)}).consume()
+    logger.info(f"Schema ready ({len(SCHEMA_STATEMENTS)} constraints/indexes)")
@@ -0,0 +1,323 @@
+from app.database.hierarchy import ancestor_paths, normalize_code, resolve_parents
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ICDSNAP\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIII")  # magic, format version, code count, section count
+SECTION = struct.Struct("<8sQQ")  # name, byte offset, byte length
+SECTION_ALIGNMENT = 8
+NO_ROW = 0xFFFFFFFF
+
+# Per-code columns, row-major in the "codes" section (string ids unless noted)
+KEY, CODE, SHORT_DESC, LONG_DESC, CATEGORY_CODE, CATEGORY_NAME, SUBCATEGORY, PARENT, DEPTH = range(9)
+COLUMNS = 9
+
+def _uint32(values) -> array:
+    values = array('I', values)
+    if values.itemsize != 4:
+        raise RuntimeError("Snapshots need a platform with 32-bit unsigned ints")
+    return values
+
+class _StringTable:
+    """Deduplicated UTF-8 strings, stored as one blob plus an offsets array"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self.blob = bytearray()
+        self.offsets = [0]
+
+    def add(self, value: Optional[str]) -> int:
+        value = value or ""
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = self._ids[value] = len(self.offsets) - 1
+            self.blob += value.encode("utf-8")
+            self.offsets.append(len(self.blob))
+        return string_id
+
+def write_snapshot(path, records: Iterable[dict], dataset_version: Optional[str] = None) -> Path:
+    """
+    Write ICD codes to a snapshot file. records are dicts with code,
+    short_desc, long_desc, category_code and optionally category_name and
+    subcategory; parents are resolved the same way build_hierarchy does.
+    The file is written next to path and renamed into place, so processes
+    that have the old snapshot mapped keep reading it undisturbed.
+    """
+    started = time.perf_counter()
+    if sys.byteorder != "little":
+        raise RuntimeError("Snapshots are little-endian; write them on a little-endian host")
+
+    by_code = {record['code']: record for record in records if record.get('code')}
+    codes = sorted(by_code, key=lambda code: (normalize_code(code), code))
+    row_of = {code: row for row, code in enumerate(codes)}
+    parents = resolve_parents((code, by_code[code].get('category_code')) for code in codes)
+    depths = {code: len(path) for code, path in ancestor_paths(parents).items()}
+
+    strings = _StringTable()
+    columns = []
+    children: List[List[int]] = [[] for _ in codes]
+    categories: Dict[str, List[int]] = {}
+    for row, code in enumerate(codes):
+        record = by_code[code]
+        parent = parents.get(code)
+        parent_row = row_of[parent] if parent is not None else NO_ROW
+        if parent is not None:
+            children[parent_row].append(row)
+        categories.setdefault(record.get('category_code') or "", []).append(row)
+        columns.extend([
+            strings.add(normalize_code(code)),
+            strings.add(code),
+            strings.add(record.get('short_desc')),
+            strings.add(record.get('long_desc')),
+            strings.add(record.get('category_code')),
+            strings.add(record.get('category_name')),
+            strings.add(record.get('subcategory')),
+            parent_row,
+            depths[code]
+        ])
+
+    # CSR adjacency: children of row r are children[child_offsets[r]:child_offsets[r + 1]]
+    child_offsets, child_rows = [0], []
+    for row_children in children:
+        child_rows.extend(row_children)
+        child_offsets.append(len(child_rows))
+
+    # Category -> rows in code order (the order category browsing returns)
+    category_keys = sorted(categories)
+    category_offsets, category_rows = [0], []
+    for category in category_keys:
+        category_rows.extend(sorted(categories[category], key=lambda row: codes[row]))
+        category_offsets.append(len(category_rows))
+
+    category_key_ids = [strings.add(category) for category in category_keys]
+    meta = {
+        'dataset_version': dataset_version,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'codes': len(codes),
+        'categories': len(category_keys)
+    }
+    sections = [
+        (b"meta", json.dumps(meta).encode("utf-8")),
+        (b"strdata", bytes(strings.blob)),
+        (b"stroffs", _uint32(strings.offsets).tobytes()),
+        (b"codes", _uint32(columns).tobytes()),
+        (b"childoff", _uint32(child_offsets).tobytes()),
+        (b"children", _uint32(child_rows).tobytes()),
+        (b"catkeys", _uint32(category_key_ids).tobytes()),
+        (b"catoff", _uint32(category_offsets).tobytes()),
+        (b"catrows", _uint32(category_rows).tobytes()),
+    ]
+
+    path = Path(path)
+    temp_path = path.with_name(path.name + ".tmp")
+    offset = HEADER.size + SECTION.size * len(sections)
+    table, layout = [], []
+    for name, data in sections:
+        offset += -offset % SECTION_ALIGNMENT
+        table.append(SECTION.pack(name, offset, len(data)))
+        layout.append((offset, data))
+        offset += len(data)
+
+    with open(temp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(codes), len(sections)))
+        file.write(b"".join(table))
+        for section_offset, data in layout:
+            file.write(b"\0" * (section_offset - file.tell()))
+            file.write(data)
+    os.replace(temp_path, path)
+
+    logger.info(f"Wrote snapshot {path}: {len(codes)} codes, {len(category_keys)} categories, "
+                f"{offset / (1024 * 1024):.1f} MB in {time.perf_counter() - started:.2f}s")
+    return path
+
+class ReadOnlySnapshotError(RuntimeError):
+    """A write was attempted on a service that serves a snapshot instead of Neo4j"""
+
+class ICDSnapshot:
+    """
+    Read-only, memory-mapped view of a snapshot written by write_snapshot.
+
+    Opening maps the file and slices the sections into zero-copy uint32
+    views; nothing is parsed up front, and worker processes mapping the same
+    file share its pages through the OS cache. Codes are sorted by their
+    undotted form, so a lookup is a binary search (O(log n)); children come
+    from CSR arrays and ancestors from the parent column. Results have the
+    same shapes as the equivalent Neo4j queries.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, self._count, section_count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not an ICD snapshot")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {version} in {self.path}")
+        if sys.byteorder != "little":
+            raise RuntimeError("Snapshots are little-endian and can't be mapped on this host")
+
+        sections = {}
+        for position in range(section_count):
+            name, offset, length = SECTION.unpack_from(self._mmap, HEADER.size + position * SECTION.size)
+            sections[name.rstrip(b"\0")] = self._view[offset:offset + length]
+
+        self.meta = json.loads(bytes(sections[b"meta"]).decode("utf-8"))
+        self._strings = sections[b"strdata"]
+        self._string_offsets = sections[b"stroffs"].cast("I")
+        self._columns = sections[b"codes"].cast("I")
+        self._child_offsets = sections[b"childoff"].cast("I")
+        self._children = sections[b"children"].cast("I")
+        self._category_keys = sections[b"catkeys"].cast("I")
+        self._category_offsets = sections[b"catoff"].cast("I")
+        self._category_rows = sections[b"catrows"].cast("I")
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def dataset_version(self) -> Optional[str]:
+        return self.meta.get('dataset_version')
+
+    def close(self) -> None:
+        views = (self._strings, self._string_offsets, self._columns, self._child_offsets, self._children,
+                 self._category_keys, self._category_offsets, self._category_rows, self._view)
+        for view in views:
+            view.release()
+        self._mmap.close()
+
+    # Low-level access
+
+    def _bytes(self, string_id: int) -> bytes:
+        return bytes(self._strings[self._string_offsets[string_id]:self._string_offsets[string_id + 1]])
+
+    def _string(self, string_id: int) -> str:
+        return self._bytes(string_id).decode("utf-8")
+
+    def _column(self, row: int, column: int) -> int:
+        return self._columns[row * COLUMNS + column]
+
+    @staticmethod
+    def _search(target: bytes, count: int, key, after: bool = False) -> int:
+        """First position in [0, count) whose key is >= target (> target with after=True)"""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            probe = key(middle)
+            if probe < target or (after and probe == target):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _find(self, code: str) -> Optional[int]:
+        """Row of a code, dotted or undotted; O(log n)"""
+        target = normalize_code(code).encode("utf-8")
+        row = self._search(target, self._count, lambda row: self._bytes(self._column(row, KEY)))
+        if row < self._count and self._bytes(self._column(row, KEY)) == target:
+            return row
+        return None
+
+    def _parent(self, row: int) -> Optional[int]:
+        parent = self._column(row, PARENT)
+        return None if parent == NO_ROW else parent
+
+    def _ancestors(self, row: int) -> List[int]:
+        chain = []
+        parent = self._parent(row)
+        while parent is not None and len(chain) <= self._column(row, DEPTH):
+            chain.append(parent)
+            parent = self._parent(parent)
+        return list(reversed(chain))
+
+    def _child_rows(self, row: int):
+        return self._children[self._child_offsets[row]:self._child_offsets[row + 1]]
+
+    def _category_range(self, category_code: str):
+        target = (category_code or "").encode("utf-8")
+        count = len(self._category_keys)
+        position = self._search(target, count, lambda position: self._bytes(self._category_keys[position]))
+        if position < count and self._bytes(self._category_keys[position]) == target:
+            return self._category_offsets[position], self._category_offsets[position + 1]
+        return 0, 0
+
+    # Queries
+
+    def code_details(self, code: str) -> Optional[dict]:
+        """Code properties plus category name, as get_code_details returns them"""
+        row = self._find(code)
+        if row is None:
+            return None
+        parent = self._parent(row)
+        return {
+            'code': self._string(self._column(row, CODE)),
+            'short_desc': self._string(self._column(row, SHORT_DESC)),
+            'long_desc': self._string(self._column(row, LONG_DESC)),
+            'category_code': self._string(self._column(row, CATEGORY_CODE)),
+            'category_name': self._string(self._column(row, CATEGORY_NAME)),
+            'subcategory': self._string(self._column(row, SUBCATEGORY)),
+            'parent_code': self._string(self._column(parent, CODE)) if parent is not None else None,
+            'ancestors': [self._string(self._column(ancestor, CODE)) for ancestor in self._ancestors(row)],
+            'depth': self._column(row, DEPTH)
+        }
+
+    def disease_info(self, code: str) -> Optional[dict]:
+        """Same fields as Neo4jICD.get_disease_info"""
+        row = self._find(code)
+        if row is None:
+            return None
+        parent = self._parent(row)
+        return {
+            'description': self._string(self._column(row, LONG_DESC)),
+            'category': self._string(self._column(row, CATEGORY_CODE)),
+            'parent_codes': [self._string(self._column(parent, CODE))] if parent is not None else [],
+            'ancestor_codes': [self._string(self._column(ancestor, CODE)) for ancestor in self._ancestors(row)],
+            'depth': self._column(row, DEPTH),
+            'child_codes': [self._string(self._column(child, CODE)) for child in self._child_rows(row)]
+        }
+
+    def _code_info(self, row: int) -> dict:
+        parent = self._parent(row)
+        return {
+            'code': self._string(self._column(row, CODE)),
+            'short_desc': self._string(self._column(row, SHORT_DESC)),
+            'long_desc': self._string(self._column(row, LONG_DESC)),
+            'parent_code': self._string(self._column(parent, CODE)) if parent is not None else '',
+            'parent_desc': self._string(self._column(parent, SHORT_DESC)) if parent is not None else '',
+            'depth': self._column(row, DEPTH)
+        }
+
+    def category_page(self, category_code: str, after: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        """Codes of a category in code order, starting after the given code (CATEGORY_PAGE_QUERY's shape)"""
+        start, end = self._category_range(category_code)
+        if after:
+            start += self._search(after.encode("utf-8"), end - start,
+                                  lambda position: self._bytes(self._column(self._category_rows[start + position], CODE)),
+                                  after=True)
+        if limit is not None:
+            end = min(end, start + limit)
+        return [self._code_info(self._category_rows[position]) for position in range(start, end)]
+
+    def records(self) -> Iterator[dict]:
+        """Every code in the search result shape, for building local indexes"""
+        for row in range(self._count):
+            yield {
+                'code': self._string(self._column(row, CODE)),
+                'short_desc': self._string(self._column(row, SHORT_DESC)),
+                'long_desc': self._string(self._column(row, LONG_DESC)),
+                'category_code': self._string(self._column(row, CATEGORY_CODE))
+            }
@@ -0,0 +1,173 @@
+from app.database.hierarchy import ancestor_paths, normalize_code, resolve_parents
+from array import array
+from bisect import bisect_left
+from heapq import nsmallest
+from typing import Dict, Iterable, List
+import logging
+import re
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+# Looks like the start of an ICD-10 code: a letter, optionally followed by a digit and more
+CODE_PREFIX_PATTERN = re.compile(r'^[a-z](?:\d[0-9a-z]*\.?[0-9a-z]*)?$')
+MAX_COMPLETIONS = 20
+# Description prefixes this short match too many words to merge per keystroke; their
+# top completions are precomputed in finalize()
+PRECOMPUTED_PREFIX_LENGTH = 2
+
+class AutocompleteIndex:
+    """
+    Sorted-array prefix index for typeahead over ICD codes and description words.
+
+    Codes are numbered in (hierarchy level, code) order, so a shallower code
+    always ranks ahead of its descendants. Every level is a contiguous, sorted
+    slice of the code array, and a code prefix is answered with one bisect per
+    level. Description words map to posting arrays that are already in rank
+    order, so completing a word prefix only reads the head of each posting.
+    """
+
+    def __init__(self):
+        self._codes: List[str] = []  # normalized codes, in rank order
+        self._raw_codes: List[str] = []
+        self._short_descs: List[str] = []
+        self._word_texts: List[str] = []  # " word word ... " for phrase checks
+        self._category_codes: List[str] = []
+        self._levels = array('B')
+        self._level_starts: List[int] = [0]  # level n occupies [starts[n], starts[n + 1])
+        self._postings: Dict[str, array] = {}
+        self._vocabulary: List[str] = []
+        self._short_prefixes: Dict[str, array] = {}
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "AutocompleteIndex":
+        """Build the index from dicts with code, short_desc and category_code"""
+        started = time.perf_counter()
+        records = [record for record in records if record.get('code')]
+        paths = ancestor_paths(resolve_parents((record['code'], record.get('category_code')) for record in records))
+        ranked = sorted(records, key=lambda record: (len(paths[record['code']]), normalize_code(record['code'])))
+
+        index = cls()
+        for record in ranked:
+            index._add(record['code'], record.get('short_desc'), record.get('category_code'),
+                       len(paths[record['code']]))
+        index.finalize()
+        logger.info(f"Built autocomplete index: {len(index)} codes, {len(index._vocabulary)} words "
+                    f"in {time.perf_counter() - started:.2f}s")
+        return index
+
+    def _add(self, code: str, short_desc: str, category_code: str, level: int) -> None:
+        """Append one code; codes must arrive in (level, normalized code) order"""
+        doc_id = len(self._codes)
+        while len(self._level_starts) <= level + 1:
+            self._level_starts.append(doc_id)
+        self._level_starts[level + 1] = doc_id + 1
+
+        self._codes.append(sys.intern(normalize_code(code)))
+        self._raw_codes.append(code)
+        words = TOKEN_PATTERN.findall((short_desc or "").lower())
+        self._short_descs.append(short_desc or "")
+        self._word_texts.append(f" {' '.join(words)} ")
+        self._category_codes.append(sys.intern(category_code or ""))
+        self._levels.append(min(level, 255))
+
+        for word in dict.fromkeys(words):
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[sys.intern(word)] = array('I')
+            postings.append(doc_id)
+
+    def finalize(self) -> "AutocompleteIndex":
+        """Sort the vocabulary and precompute the top completions of very short word prefixes"""
+        self._vocabulary = sorted(self._postings)
+        heads: Dict[str, set] = {}
+        for word, postings in self._postings.items():
+            head = postings[:MAX_COMPLETIONS]
+            for length in range(1, min(PRECOMPUTED_PREFIX_LENGTH, len(word)) + 1):
+                heads.setdefault(word[:length], set()).update(head)
+        self._short_prefixes = {prefix: array('I', sorted(docs)[:MAX_COMPLETIONS]) for prefix, docs in heads.items()}
+        return self
+
+    def _entry(self, doc_id: int, match: str) -> dict:
+        return {
+            'code': self._raw_codes[doc_id],
+            'short_desc': self._short_descs[doc_id],
+            'category_code': self._category_codes[doc_id],
+            'level': self._levels[doc_id],
+            'match': match
+        }
+
+    def _code_matches(self, prefix: str, limit: int) -> List[int]:
+        """Codes starting with prefix, shallowest level first, then in code order"""
+        matches = []
+        for level in range(len(self._level_starts) - 1):
+            start, end = self._level_starts[level], self._level_starts[level + 1]
+            position = bisect_left(self._codes, prefix, start, end)
+            while position < end and len(matches) < limit and self._codes[position].startswith(prefix):
+                matches.append(position)
+                position += 1
+            if len(matches) >= limit:
+                break
+        return matches
+
+    def _word_matches(self, prefix: str, limit: int) -> List[int]:
+        """Codes with a description word starting with prefix, best ranked first"""
+        if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH and limit <= MAX_COMPLETIONS:
+            return list(self._short_prefixes.get(prefix, ()))[:limit]
+        heads = []
+        position = bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(prefix):
+            heads.extend(self._postings[self._vocabulary[position]][:limit])
+            position += 1
+        return nsmallest(limit, set(heads))
+
+    def _phrase_matches(self, words: List[str], limit: int) -> List[int]:
+        """Codes whose description has every complete word plus a word starting with the last one"""
+        complete, prefix = words[:-1], words[-1]
+        postings = [self._postings.get(word) for word in complete]
+        if not all(postings):
+            return []
+        needles = [f" {word} " for word in complete]
+        prefix_needle = f" {prefix}"
+        matches = []
+        for doc_id in min(postings, key=len):  # rank order, so the first hits are the best
+            text = self._word_texts[doc_id]
+            if prefix_needle in text and all(needle in text for needle in needles):
+                matches.append(doc_id)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def complete(self, text: str, limit: int = 10) -> List[dict]:
+        """
+        Top completions for partially typed text. Input that looks like a code
+        ("J1", "E11.2") is matched against codes first; description words
+        fill the remaining slots. Each entry carries its hierarchy level.
+        """
+        lowered = text.strip().lower()
+        if not lowered or limit <= 0:
+            return []
+
+        results = []
+        seen = set()
+        if CODE_PREFIX_PATTERN.match(lowered):
+            for doc_id in self._code_matches(normalize_code(lowered), limit):
+                seen.add(doc_id)
+                results.append(self._entry(doc_id, 'code'))
+
+        words = TOKEN_PATTERN.findall(lowered)
+        if words and len(results) < limit:
+            # Ask for a full page: some description hits may repeat code hits
+            if len(words) == 1:
+                doc_ids = self._word_matches(words[0], limit)
+            else:
+                doc_ids = self._phrase_matches(words, limit)
+            for doc_id in doc_ids:
+                if doc_id not in seen and len(results) < limit:
+                    results.append(self._entry(doc_id, 'description'))
+        return results
@@ -0,0 +1,246 @@
+from app.services.llm_service import MedicalCodingAssistant
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+import csv
+import json
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of values (0.0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+class StageTimer:
+    """Collects latencies per pipeline stage and summarises them as percentiles"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+
+    def time(self, stage: str, fn: Callable):
+        started = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                stage: {
+                    'count': len(samples),
+                    'p50_ms': round(percentile(samples, 50) * 1000, 2),
+                    'p95_ms': round(percentile(samples, 95) * 1000, 2),
+                    'p99_ms': round(percentile(samples, 99) * 1000, 2),
+                    'total_s': round(sum(samples), 3)
+                }
+                for stage, samples in self._samples.items()
+            }
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` calls per second with bursts up to `burst`"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+def retry_with_backoff(fn: Callable, max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0):
+    """Call fn, retrying failures with exponential backoff and jitter"""
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries:
+                raise
+            delay = min(max_delay, base_delay * (2 ** attempt)) * (0.5 + random.random() / 2)
+            attempt += 1
+            logger.warning(f"Attempt {attempt} failed ({str(e)}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def read_notes(input_path) -> Iterator[dict]:
+    """
+    Read clinical notes from JSONL ({"id": ..., "text": ...}) or CSV (id and
+    text/note columns). Notes without an id are numbered by position.
+    """
+    input_path = Path(input_path)
+    with open(input_path, 'r', encoding='utf-8') as file:
+        if input_path.suffix.lower() == '.csv':
+            rows = csv.DictReader(file)
+        else:
+            rows = (json.loads(line) for line in file if line.strip())
+        for position, row in enumerate(rows, start=1):
+            text = row.get('text') or row.get('note') or ''
+            yield {'id': str(row.get('id') or position), 'text': text}
+
+def _normalize_note(text: str) -> str:
+    return " ".join(text.lower().split())
+
+class BatchCoder:
+    """
+    Codes large batches of clinical notes with a MedicalCodingAssistant.
+
+    Identical notes (ignoring case and spacing) are coded once and searched
+    under their normalised text. Lookups are sent to Neo4j in multi-search
+    batches, and LLM calls go through a bounded, rate-limited worker pool with
+    retries.
+    Results are appended to a JSONL file as they finish, so a restarted run
+    skips notes that are already in the output. Notes whose database lookup
+    fails (after retries) are left out of the output, so a rerun codes them.
+    """
+
+    def __init__(self, assistant: MedicalCodingAssistant, max_workers: int = 8,
+                 requests_per_second: float = 5.0, max_retries: int = 4,
+                 lookup_batch_size: int = 50, limit: int = 10):
+        self.assistant = assistant
+        self.icd_service = assistant.icd_service
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.max_retries = max_retries
+        self.lookup_batch_size = lookup_batch_size
+        self.limit = limit
+        self.timer = StageTimer()
+
+    @staticmethod
+    def completed_ids(output_path) -> set:
+        """Ids already written to the output file by a previous run"""
+        output_path = Path(output_path)
+        done = set()
+        if not output_path.exists():
+            return done
+        with open(output_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    done.add(str(json.loads(line)['id']))
+                except (ValueError, KeyError):
+                    continue  # partially written last line from an interrupted run
+        return done
+
+    def _lookup(self, texts: List[str]) -> Dict[str, List[dict]]:
+        """
+        Resolve database results for note texts, one multi-search per batch of
+        distinct texts. Each text is searched as given, since the phrase,
+        exact-code and relevance clauses all read the full text. Texts from
+        batches whose search still fails after retries are missing from the
+        returned dict.
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        results: Dict[str, List[dict]] = {}
+        failed = 0
+        for start in range(0, len(unique_texts), self.lookup_batch_size):
+            batch = unique_texts[start:start + self.lookup_batch_size]
+
+            def search():
+                return self.icd_service.search_many(batch, limit=self.limit, raise_errors=True)
+
+            try:
+                found = self.timer.time('neo4j_lookup', lambda: retry_with_backoff(search, max_retries=self.max_retries))
+            except Exception as e:
+                failed += len(batch)
+                logger.error(f"Lookup failed for {len(batch)} notes, leaving them for a rerun: {str(e)}")
+                continue
+            results.update(zip(batch, found))
+        logger.info(f"Resolved {len(unique_texts) - failed} of {len(unique_texts)} unique notes")
+        return results
+
+    def _explain(self, text: str, db_results: List[dict]) -> dict:
+        def call():
+            self.rate_limiter.acquire()
+            return self.assistant.explain_results(text, db_results)
+
+        try:
+            return self.timer.time('llm', lambda: retry_with_backoff(call, max_retries=self.max_retries))
+        except Exception as e:
+            logger.error(f"LLM failed after {self.max_retries} retries: {str(e)}")
+            return self.assistant._database_only_response(db_results)
+
+    def run(self, input_path, output_path) -> dict:
+        """Code every note in input_path, appending results to output_path; returns a run report"""
+        started = time.perf_counter()
+        done = self.completed_ids(output_path)
+
+        notes_by_text: Dict[str, List[dict]] = {}
+        total = 0
+        skipped = 0
+        for note in read_notes(input_path):
+            total += 1
+            if note['id'] in done:
+                skipped += 1
+                continue
+            notes_by_text.setdefault(_normalize_note(note['text']), []).append(note)
+
+        unique_texts = list(notes_by_text)
+        logger.info(f"{total} notes, {skipped} already coded, {len(unique_texts)} unique notes to code")
+
+        db_results = self._lookup(unique_texts)
+
+        written = 0
+        failed = 0
+        write_lock = threading.Lock()
+        with open(output_path, 'a', encoding='utf-8') as output, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # Terminate a line left half-written by an interrupted run
+            if output.tell() > 0:
+                with open(output_path, 'rb') as existing:
+                    existing.seek(-1, 2)
+                    if existing.read(1) != b"\n":
+                        output.write("\n")
+
+            futures = {}
+            for text, notes in notes_by_text.items():
+                if text not in db_results:
+                    failed += len(notes)  # not written, so the next run retries them
+                    continue
+                futures[pool.submit(self._explain, notes[0]['text'], db_results[text])] = notes
+
+            for future in as_completed(futures):
+                response = future.result()
+                with write_lock:
+                    for note in futures[future]:
+                        output.write(json.dumps({'id': note['id'], **response}) + "\n")
+                        written += 1
+                    output.flush()
+
+        elapsed = time.perf_counter() - started
+        report = {
+            'notes_total': total,
+            'notes_skipped': skipped,
+            'notes_written': written,
+            'notes_failed': failed,
+            'unique_notes': len(unique_texts),
+            'elapsed_s': round(elapsed, 3),
+            'notes_per_s': round(written / elapsed, 2) if elapsed > 0 else 0.0,
+            'stages': self.timer.summary()
+        }
+        logger.info(f"Batch coding finished: {json.dumps(report)}")
+        return report
@@ -0,0 +1,378 @@
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Awaitable, Callable, Optional, Tuple
+import asyncio
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class LRUCache:
+    """Thread-safe bounded LRU cache with per-entry TTL and hit/miss/eviction counters"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Any, Any], bool]) -> int:
+        """Drop every entry for which predicate(key, value) is true"""
+        with self._lock:
+            doomed = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in doomed:
+                del self._data[key]
+            return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+class DiskCache:
+    """
+    Small SQLite-backed key/value tier that outlives the process and can be
+    shared by several workers on the same host. Values must be JSON-serialisable.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = 3600):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value) -> None:
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+
+    def purge_expired(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def stats(self) -> dict:
+        return {'path': self.path, 'hits': self.hits, 'misses': self.misses}
+
+def normalize_cache_arg(value):
+    """
+    Normalise an argument so equivalent calls share a cache key. Only
+    whitespace is collapsed: case matters to the queries (codes are matched
+    case-sensitively), so "a01" and "A01" are cached separately.
+    """
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, (list, tuple)):
+        return [normalize_cache_arg(item) for item in value]
+    return value
+
+class ResultCache:
+    """
+    Two-level cache (in-process LRU, optional disk tier) for query results.
+
+    Every key embeds the current dataset version, so bumping the version after
+    an import makes all older entries unreachable; they then age out of the LRU
+    and expire from the disk tier. The version is re-read at most once every
+    version_check_interval seconds.
+
+    Async callers read it through version_async(), which awaits
+    async_version_provider, or runs the sync provider in the default executor
+    when there is none, so the event loop never blocks on the database.
+    """
+
+    def __init__(self, memory: Optional[LRUCache] = None, disk: Optional[DiskCache] = None,
+                 version_provider: Optional[Callable[[], Optional[str]]] = None,
+                 version_check_interval: float = 30,
+                 async_version_provider: Optional[Callable[[], Awaitable[Optional[str]]]] = None):
+        self.memory = memory if memory is not None else LRUCache()
+        self.disk = disk
+        self.version_provider = version_provider
+        self.async_version_provider = async_version_provider
+        self.version_check_interval = version_check_interval
+        self._version: Optional[str] = None
+        self._version_checked_at = 0.0
+
+    @classmethod
+    def from_env(cls, version_provider=None, async_version_provider=None) -> "ResultCache":
+        """Build a cache from ICD_CACHE_SIZE, ICD_CACHE_TTL and (optional) ICD_CACHE_PATH"""
+        ttl = float(os.getenv('ICD_CACHE_TTL', 600))
+        disk_path = os.getenv('ICD_CACHE_PATH')
+        return cls(
+            memory=LRUCache(maxsize=int(os.getenv('ICD_CACHE_SIZE', 2048)), ttl=ttl),
+            disk=DiskCache(disk_path, ttl=ttl) if disk_path else None,
+            version_provider=version_provider,
+            async_version_provider=async_version_provider
+        )
+
+    def _version_due(self) -> bool:
+        """True (and the check is claimed) if the version should be re-read now"""
+        has_provider = self.version_provider is not None or self.async_version_provider is not None
+        now = time.monotonic()
+        if has_provider and now - self._version_checked_at >= self.version_check_interval:
+            self._version_checked_at = now
+            return True
+        return False
+
+    def _set_version(self, version: Optional[str]) -> None:
+        if version != self._version:
+            logger.info(f"Dataset version is now {version}; older cache entries are stale")
+            self._version = version
+
+    @property
+    def version(self) -> str:
+        if self.version_provider is not None and self._version_due():
+            try:
+                self._set_version(self.version_provider())
+            except Exception as e:
+                logger.warning(f"Could not read dataset version: {str(e)}")
+        return self._version or "0"
+
+    async def version_async(self) -> str:
+        """The dataset version, re-read without blocking the event loop"""
+        if self._version_due():
+            try:
+                if self.async_version_provider is not None:
+                    version = await self.async_version_provider()
+                else:
+                    version = await asyncio.get_running_loop().run_in_executor(None, self.version_provider)
+                self._set_version(version)
+            except Exception as e:
+                logger.warning(f"Could not read dataset version: {str(e)}")
+        return self._version or "0"
+
+    def make_key(self, namespace: str, *args, version: Optional[str] = None) -> str:
+        """Cache key for namespace and args; async callers pass the version from version_async()"""
+        version = version if version is not None else self.version
+        return json.dumps([version, namespace, [normalize_cache_arg(arg) for arg in args]])
+
+    def get(self, key: str, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key, _MISSING)
+            if value is not _MISSING:
+                self.memory.set(key, value)
+                return value
+        return default
+
+    def set(self, key: str, value) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except (TypeError, sqlite3.Error) as e:
+                logger.warning(f"Could not write to disk cache: {str(e)}")
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        stats = {'version': self._version, 'memory': self.memory.stats()}
+        if self.disk is not None:
+            stats['disk'] = self.disk.stats()
+        return stats
+
+def cached(namespace: str):
+    """
+    Cache a service method's result in self.result_cache, keyed on its
+    normalised arguments. Empty results are not cached, because the service
+    methods report query failures as empty results.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache = getattr(self, 'result_cache', None)
+            if cache is None:
+                return method(self, *args, **kwargs)
+
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            key = cache.make_key(namespace, *list(bound.arguments.values())[1:])
+
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            value = method(self, *args, **kwargs)
+            if value:
+                cache.set(key, value)
+            return value
+
+        return wrapper
+    return decorator
+
+class _InFlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key: the first caller runs the
+    function and every caller that arrives while it is running waits for and
+    shares its result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn: Callable[[], Any]):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _InFlightCall()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight: identical concurrent awaits share one task"""
+
+    def __init__(self):
+        self._tasks = {}
+        self.coalesced = 0
+
+    async def do(self, key, fn: Callable[[], Awaitable[Any]]):
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield() so one cancelled waiter doesn't cancel the shared call
+        return await asyncio.shield(task)
+
+def async_cached(namespace: str):
+    """Async variant of @cached; shares cache entries with the sync method of the same namespace"""
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            cache = getattr(self, 'result_cache', None)
+            if cache is None:
+                return await method(self, *args, **kwargs)
+
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            key = cache.make_key(namespace, *list(bound.arguments.values())[1:],
+                                 version=await cache.version_async())
+
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            value = await method(self, *args, **kwargs)
+            if value:
+                cache.set(key, value)
+            return value
+
+        return wrapper
+    return decorator
@@ -0,0 +1,121 @@
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_TOKENS = 1000
+NO_RESULTS_CONTEXT = "No exact matches found in the database."
+
+class TokenCounter:
+    """
+    Counts tokens with tiktoken when it is installed, else estimates ~4
+    characters per token. tiktoken and its encoding are loaded on first use.
+    """
+
+    def __init__(self, model: str = "gpt-3.5-turbo"):
+        self.model = model
+        self._encoding = None
+        self._loaded = False
+
+    def _load_encoding(self):
+        try:
+            import tiktoken
+        except ImportError:  # optional: fall back to a character-based estimate
+            return None
+        try:
+            return tiktoken.encoding_for_model(self.model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if not self._loaded:
+            self._encoding = self._load_encoding()
+            self._loaded = True
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return max(1, (len(text) + 3) // 4)
+
+class ContextBuilder:
+    """
+    Builds the database-results section of the prompt within a token budget.
+
+    Results are taken in the order search returned them (best first) and
+    grouped under a header per category. Every code that fits gets a one-line
+    entry; long descriptions are only added when they differ from the short
+    one, and only while budget remains, so lower-ranked codes are dropped
+    before higher-ranked codes lose their detail.
+    """
+
+    def __init__(self, max_tokens: int = DEFAULT_CONTEXT_TOKENS, counter: Optional[TokenCounter] = None):
+        self.max_tokens = max_tokens
+        self.counter = counter or TokenCounter()
+
+    @staticmethod
+    def _detail(result: Dict) -> Optional[str]:
+        short_desc = (result.get('short_desc') or "").strip()
+        long_desc = (result.get('long_desc') or "").strip()
+        if not long_desc or long_desc.lower() == short_desc.lower():
+            return None
+        return long_desc
+
+    @staticmethod
+    def _render(groups: Dict[str, List[Tuple[Dict, Optional[str]]]]) -> str:
+        lines = []
+        for category, entries in groups.items():
+            lines.append(f"{category or 'Other'}:")
+            for result, detail in entries:
+                line = f"- {result['code']}: {result.get('short_desc') or ''}"
+                if detail:
+                    line += f" ({detail})"
+                lines.append(line)
+        return "\n".join(lines)
+
+    def build(self, db_results: List[Dict]) -> Tuple[str, dict]:
+        """Return the context text and stats (context_tokens, context_codes, truncated)"""
+        if not db_results:
+            return NO_RESULTS_CONTEXT, {'context_tokens': self.counter.count(NO_RESULTS_CONTEXT),
+                                        'context_codes': 0, 'truncated': False}
+
+        seen = set()
+        ranked = []
+        for result in db_results:
+            if result['code'] not in seen:
+                seen.add(result['code'])
+                ranked.append(result)
+
+        # Pass 1: one short line per code, best first, while the budget allows
+        groups: Dict[str, List[list]] = {}
+        used = 0
+        included = []
+        for result in ranked:
+            category = result.get('category_code') or ""
+            cost = self.counter.count(f"- {result['code']}: {result.get('short_desc') or ''}\n")
+            if category not in groups:
+                cost += self.counter.count(f"{category or 'Other'}:\n")
+            if included and used + cost > self.max_tokens:
+                break
+            groups.setdefault(category, []).append([result, None])
+            included.append(groups[category][-1])
+            used += cost
+
+        # Pass 2: long descriptions that add information, best first, with what is left
+        for entry in included:
+            detail = self._detail(entry[0])
+            if detail is None:
+                continue
+            cost = self.counter.count(f" ({detail})")
+            if used + cost <= self.max_tokens:
+                entry[1] = detail
+                used += cost
+
+        context = self._render(groups)
+        stats = {
+            'context_tokens': self.counter.count(context),
+            'context_codes': len(included),
+            'truncated': len(included) < len(ranked)
+        }
+        if stats['truncated']:
+            logger.debug(f"Context truncated to {len(included)} of {len(ranked)} codes")
+        return context, stats
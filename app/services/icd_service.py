@@ -1,7 +1,18 @@
-from app.database.neo4j_client import Neo4jICD
+from app.database.icd_csv import iter_icd_records
+from app.database.neo4j_client import QUERY_TEXTS, AsyncNeo4jICD, Neo4jICD
+from app.database.schema import ensure_schema, FULLTEXT_INDEX_NAME
+from app.database.snapshot import ICDSnapshot, ReadOnlySnapshotError
 from app.models.icd_models import ICDCode, ICDResponse
-from typing import Optional, List
-from neo4j import GraphDatabase
+from app.services.autocomplete import AutocompleteIndex
+from app.services.cache import ResultCache, async_cached, cached
+from app.services.metrics import MetricsRegistry, metrics as default_metrics
+from app.services.search_index import InMemorySearchIndex
+from app.services.term_extractor import TermExtractor
+from contextlib import closing
+from pathlib import Path
+from typing import Iterable, Optional, List
+from neo4j.exceptions import ClientError
+import asyncio
 import logging
 import re
 
@@ -9,30 +20,277 @@ import re
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Characters with special meaning in Lucene query syntax
+LUCENE_SPECIAL_CHARS = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+
+# How Neo4j reports a query against a full-text index that doesn't exist: the
+# procedure call fails with the missing index as its cause
+FULLTEXT_CALL_FAILED_CODE = "Neo.ClientError.Procedure.ProcedureCallFailed"
+INDEX_NOT_FOUND_CODE = "Neo.ClientError.Schema.IndexNotFound"
+MISSING_FULLTEXT_INDEX_CAUSE = "no such fulltext schema index"
+
+# Codes per page when browsing a category
+DEFAULT_PAGE_SIZE = 50
+
+# Reciprocal rank fusion constant for hybrid semantic + Cypher ranking
+RRF_K = 60
+
+SEARCH_FULLTEXT_QUERY = """
+CALL db.index.fulltext.queryNodes($index_name, $fulltext_query)
+YIELD node AS code, score
+
+RETURN {
+    code: code.code,
+    short_desc: code.short_desc,
+    long_desc: code.long_desc,
+    category_code: code.category_code
+} as result, score as relevance
+ORDER BY relevance DESC, result.code
+LIMIT $limit
+"""
+
+SEARCH_CONTAINS_QUERY = """
+// Match codes based on search terms
+MATCH (code:ICDCode)
+WHERE code.code = $search_text
+    OR ANY(term IN $search_terms WHERE
+        toLower(code.code) CONTAINS toLower(term)
+        OR toLower(code.short_desc) CONTAINS toLower(term)
+    )
+
+// Convert node properties to dictionary in Neo4j
+WITH {
+    code: code.code,
+    short_desc: code.short_desc,
+    long_desc: code.long_desc,
+    category_code: code.category_code
+} as result,
+CASE
+    WHEN code.code = $search_text THEN 100
+    WHEN code.short_desc CONTAINS toLower($search_text) THEN 75
+    ELSE 50
+END as relevance
+
+RETURN result, relevance
+ORDER BY relevance DESC, result.code
+LIMIT $limit
+"""
+
+# Category browsing reads the parent_code/depth written by the hierarchy pass;
+# the parent lookup is a single unique-index seek, not a traversal
+CATEGORY_CODES_QUERY = """
+MATCH (code:ICDCode {category_code: $category_code})
+OPTIONAL MATCH (parent:ICDCode {code: code.parent_code})
+RETURN {
+    code: code.code,
+    short_desc: code.short_desc,
+    long_desc: code.long_desc,
+    parent_code: COALESCE(parent.code, ''),
+    parent_desc: COALESCE(parent.short_desc, ''),
+    depth: COALESCE(code.depth, 0)
+} as code_info
+ORDER BY code_info.code
+"""
+
+# Keyset pagination: seek past the cursor in code order, then look up parents for this page only
+CATEGORY_PAGE_QUERY = """
+MATCH (code:ICDCode {category_code: $category_code})
+WHERE code.code > $after
+WITH code
+ORDER BY code.code
+LIMIT $limit
+OPTIONAL MATCH (parent:ICDCode {code: code.parent_code})
+RETURN {
+    code: code.code,
+    short_desc: code.short_desc,
+    long_desc: code.long_desc,
+    parent_code: COALESCE(parent.code, ''),
+    parent_desc: COALESCE(parent.short_desc, ''),
+    depth: COALESCE(code.depth, 0)
+} as code_info
+ORDER BY code_info.code
+"""
+
+CODE_DETAILS_QUERY = """
+MATCH (code:ICDCode {code: $code})
+OPTIONAL MATCH (category:Category)-[:CONTAINS]->(code)
+RETURN code, category
+"""
+
+# Many codes in one round trip; each lookup lists the spellings a code may be stored under
+CODE_DETAILS_MANY_QUERY = """
+UNWIND $lookups AS lookup
+MATCH (code:ICDCode)
+WHERE code.code IN lookup.candidates
+OPTIONAL MATCH (category:Category)-[:CONTAINS]->(code)
+RETURN lookup.position as position, code, category
+"""
+
+# Multi-search variants: one round trip answers many searches, each with its own LIMIT
+SEARCH_MANY_FULLTEXT_QUERY = """
+UNWIND $searches AS search
+CALL {
+    WITH search
+    CALL db.index.fulltext.queryNodes($index_name, search.fulltext_query)
+    YIELD node AS code, score
+    WITH code, score
+    ORDER BY score DESC, code.code
+    LIMIT $limit
+    RETURN collect({
+        code: code.code,
+        short_desc: code.short_desc,
+        long_desc: code.long_desc,
+        category_code: code.category_code
+    }) as results
+}
+RETURN search.position as position, results
+"""
+
+SEARCH_MANY_CONTAINS_QUERY = """
+UNWIND $searches AS search
+CALL {
+    WITH search
+    MATCH (code:ICDCode)
+    WHERE code.code = search.search_text
+        OR ANY(term IN search.search_terms WHERE
+            toLower(code.code) CONTAINS toLower(term)
+            OR toLower(code.short_desc) CONTAINS toLower(term)
+        )
+    WITH code,
+    CASE
+        WHEN code.code = search.search_text THEN 100
+        WHEN code.short_desc CONTAINS toLower(search.search_text) THEN 75
+        ELSE 50
+    END as relevance
+    ORDER BY relevance DESC, code.code
+    LIMIT $limit
+    RETURN collect({
+        code: code.code,
+        short_desc: code.short_desc,
+        long_desc: code.long_desc,
+        category_code: code.category_code
+    }) as results
+}
+RETURN search.position as position, results
+"""
+
+def _is_missing_index_error(error: ClientError) -> bool:
+    code = getattr(error, "code", None)
+    if code == INDEX_NOT_FOUND_CODE:
+        return True
+    message = getattr(error, "message", None) or str(error)
+    return code == FULLTEXT_CALL_FAILED_CODE and MISSING_FULLTEXT_INDEX_CAUSE in message.lower()
+
 class ICDService:
-    def __init__(self, uri: str, user: str, password: str):
+    def __init__(self, uri: str, user: str, password: str, db_client: Optional[Neo4jICD] = None,
+                 result_cache: Optional[ResultCache] = None, enable_cache: bool = True, lazy: bool = False,
+                 metrics: Optional[MetricsRegistry] = None, **pool_config):
+        """
+        Pass db_client to share one pooled Neo4jICD client (and its driver) with
+        other components; otherwise one is created with the given pool settings.
+        Search, category and code-detail results are cached unless enable_cache
+        is False; the cache is invalidated whenever the loader bumps the dataset
+        version.
+
+        With lazy=True construction does no I/O: the driver is created by the
+        first query, and the connectivity check and schema setup (the loader
+        creates the schema too) are skipped.
+
+        Stage and query metrics go to metrics (the shared client's registry, or
+        the process-wide one, by default); a db_client without a registry is
+        given this one. Collectors (cache stats, query texts) are only
+        registered on a registry passed in explicitly, directly or through
+        db_client, and are removed again by close(), so short-lived services
+        don't pile up on the process-wide registry.
+        """
         logger.info(f"Initializing ICDService with URI: {uri}")
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
-        self._verify_connection()
+        self._owns_client = db_client is None
+        if metrics is None and db_client is not None:
+            metrics = db_client.metrics
+        self._collectors = {} if metrics is not None else None  # name -> collect, once registered
+        metrics = metrics if metrics is not None else default_metrics
+        self.metrics = metrics
+        self.db_client = db_client or Neo4jICD(uri, user, password, metrics=metrics, **pool_config)
+        if self.db_client.metrics is None:
+            self.db_client.metrics = metrics
+        self._connection = (uri, user, password, pool_config)
+        self._async_client: Optional[AsyncNeo4jICD] = None
+        if result_cache is None and enable_cache:
+            result_cache = ResultCache.from_env(version_provider=self.dataset_version,
+                                                async_version_provider=self._dataset_version_async)
+        self.result_cache = result_cache
+        self.register_collector("result_cache", self.cache_stats)
+        self.register_collector("neo4j_queries", lambda: dict(QUERY_TEXTS))
+        self._fulltext_available = True
+        self.term_extractor = TermExtractor.from_env()
+        self.search_index: Optional[InMemorySearchIndex] = None
+        self.autocomplete_index: Optional[AutocompleteIndex] = None
+        self.snapshot: Optional[ICDSnapshot] = None
+        self.vector_index = None
+        if not lazy:
+            self._verify_connection()
+            self._ensure_schema()
+
+    @classmethod
+    def from_snapshot(cls, path, **kwargs) -> "ICDService":
+        """
+        Service backed only by a snapshot file (see scripts/export_snapshot.py),
+        for replicas without a Neo4j instance. Startup is an mmap; code
+        details, hierarchy and category lookups read the snapshot, and
+        searches use the in-memory indexes built from it on first use.
+        The service is read-only: writes raise ReadOnlySnapshotError.
+        """
+        kwargs.setdefault('enable_cache', False)  # snapshot lookups are already in-process
+        service = cls(None, None, None, lazy=True, **kwargs)
+        service.load_snapshot(path)
+        return service
+
+    def load_snapshot(self, path) -> ICDSnapshot:
+        """Memory-map a snapshot and serve code, hierarchy and category lookups from it"""
+        self.snapshot = ICDSnapshot(path)
+        logger.info(f"Loaded snapshot {path}: {len(self.snapshot)} codes "
+                    f"(dataset version {self.snapshot.dataset_version})")
+        return self.snapshot
+
+    @property
+    def driver(self):
+        return self.db_client.driver
 
     def _verify_connection(self):
         try:
-            with self.driver.session() as session:
-                result = session.run("MATCH (n) RETURN count(n) as count")
-                count = result.single()["count"]
-                logger.info(f"Connected to Neo4j. Total nodes: {count}")
+            self.db_client.verify_connectivity()
+            logger.info("Connected to Neo4j")
         except Exception as e:
             logger.error(f"Failed to connect to Neo4j: {str(e)}")
             raise
 
+    def _ensure_schema(self):
+        try:
+            ensure_schema(self.driver)
+        except Exception as e:
+            # Queries still work without the indexes, just slower
+            logger.warning(f"Could not create Neo4j constraints/indexes: {str(e)}")
+
     def create_icd_code(self, icd_code: ICDCode) -> None:
-        """Create ICD code and its relationships in Neo4j"""
+        """Create ICD code and its relationships in Neo4j; only its family is re-read to place it"""
+        self._require_database("create ICD codes")
         row = icd_code.model_dump()
         self.db_client.create_icd_relationships(row)
+        self.db_client.build_hierarchy(codes=[row['full_code']])
+
+    def _require_database(self, action: str) -> None:
+        if self.snapshot is not None:
+            raise ReadOnlySnapshotError(
+                f"Cannot {action}: this service reads a read-only snapshot backend ({self.snapshot.path}); "
+                f"write to Neo4j and export a new snapshot instead"
+            )
 
     def get_disease_info(self, code: str) -> Optional[ICDResponse]:
         """Get disease information including related conditions"""
-        result = self.db_client.get_disease_info(code)
+        if self.snapshot is not None:
+            result = self.snapshot.disease_info(code)
+        else:
+            result = self.db_client.get_disease_info(code)
         
         if not result:
             return None
@@ -44,161 +302,585 @@ class ICDService:
             related_conditions=result["parent_codes"] + result["child_codes"]
         )
 
+    def dataset_version(self) -> Optional[str]:
+        """Version of the data being served: the snapshot's stamp, or the one recorded in Neo4j"""
+        if self.snapshot is not None:
+            return self.snapshot.dataset_version
+        return self.db_client.get_dataset_version()
+
+    def cache_stats(self) -> dict:
+        """Hit/miss/eviction counters for the result cache"""
+        return self.result_cache.stats() if self.result_cache else {}
+
+    def register_collector(self, name: str, collect) -> None:
+        """Report collect() in this service's metrics, if they go to an explicitly given registry"""
+        if self._collectors is not None:
+            self.metrics.register_collector(name, collect)
+            self._collectors[name] = collect
+
     def close(self):
-        """Close the Neo4j driver connection"""
-        if self.driver:
-            self.driver.close()
+        """Close the Neo4j driver connection if this service created it, and any snapshot"""
+        if self._collectors:
+            for name, collect in self._collectors.items():
+                self.metrics.unregister_collector(name, collect)
+            self._collectors.clear()
+        if self._owns_client:
+            self.db_client.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
 
     def _extract_medical_terms(self, query: str) -> List[str]:
-        """Extract medical terms with context"""
-        query = re.sub(r'[^\w\s]', ' ', query.lower())
-        
-        # Medical term mappings with hierarchical context
-        medical_mappings = {
-            'typhoid': ['typhoid', 'a01', 'fever'],
-            'pneumonia': ['pneumonia', 'j12', 'respiratory'],
-            'fever': ['fever', 'temperature'],
-            'respiratory': ['respiratory', 'breathing'],
-            'infection': ['infection', 'infectious'],
-            'viral': ['viral', 'virus']
-        }
-        
-        words = query.split()
-        expanded_terms = set()
-        
-        # Process multi-word terms
-        for i in range(len(words)-1):
-            two_words = f"{words[i]} {words[i+1]}"
-            if two_words in medical_mappings:
-                expanded_terms.update(medical_mappings[two_words])
-        
-        # Process single words
-        for word in words:
-            if word in medical_mappings:
-                expanded_terms.update(medical_mappings[word])
-            elif len(word) > 2:
-                expanded_terms.add(word)
-        
-        logger.info(f"Expanded medical terms: {expanded_terms}")
-        return list(expanded_terms)
+        """Extract medical terms with context (see TermExtractor)"""
+        terms = self.term_extractor.extract(query)
+        logger.debug(f"Expanded medical terms: {terms}")
+        return terms
+
+    def load_term_vocabulary(self, descriptions: Optional[Iterable[str]] = None,
+                             csv_path: Optional[str] = None) -> TermExtractor:
+        """
+        Rebuild the term extractor with vocabulary and phrases harvested from
+        ICD short descriptions: the given ones, the CSV's, or Neo4j's. Codes
+        read from the CSV or Neo4j also become the extractor's known codes.
+        """
+        codes = None
+        if descriptions is None:
+            records = list(iter_icd_records(csv_path) if csv_path else self._fetch_all_codes())
+            descriptions = [record['short_desc'] for record in records]
+            codes = [record['code'] for record in records]
+        self.term_extractor = TermExtractor.from_descriptions(descriptions, codes=codes)
+        return self.term_extractor
 
     def _normalize_code(self, code: str) -> str:
         """Normalize ICD code by removing dots"""
         return code.replace(".", "")
 
-    def search_by_description(self, search_text: str, limit: int = 10) -> List[dict]:
+    def _format_code(self, code: str) -> str:
+        """Format ICD code with dot notation (e.g., A0109 -> A01.09)"""
+        code = self._normalize_code(code)
+        if len(code) > 3:
+            return f"{code[:3]}.{code[3:]}"
+        return code
+
+    def _format_result(self, code_data: dict) -> dict:
+        """Build the search result dictionary returned to callers"""
+        return {
+            'code': self._format_code(code_data['code']),
+            'short_desc': code_data['short_desc'],
+            'long_desc': code_data['long_desc'],
+            'category_code': code_data['category_code']
+        }
+
+    def _build_fulltext_query(self, search_text: str, search_terms: List[str]) -> str:
+        """Build a Lucene query for the full-text index from the search terms"""
+        clauses = []
+        phrase = LUCENE_SPECIAL_CHARS.sub(r'\\\1', search_text.strip())
+        if phrase:
+            # Exact code and whole-phrase hits should outrank single-term hits
+            clauses.append(f'code:"{phrase}"^10')
+            clauses.append(f'"{phrase}"^4')
+        for term in search_terms:
+            # Lower case, so a bare AND/OR/NOT is searched for rather than read as an operator
+            term = LUCENE_SPECIAL_CHARS.sub(r'\\\1', term.lower())
+            if " " in term:
+                clauses.append(f'"{term}"^2')  # multi-word lexicon/phrase term
+                continue
+            clauses.append(term)
+            if len(term) > 3:
+                clauses.append(f"{term}*")
+        return " OR ".join(clauses)
+
+    def load_search_index(self, csv_path: Optional[str] = None) -> InMemorySearchIndex:
+        """
+        Build the in-memory search index from a codes CSV, or from Neo4j when
+        no path is given. Once loaded, mode="memory" searches never touch the
+        database and Neo4j searches fall back to it if the query fails. The
+        term extractor's vocabulary is harvested from the same descriptions.
+        """
+        if csv_path:
+            self.search_index = InMemorySearchIndex.from_csv(csv_path)
+        else:
+            self.search_index = InMemorySearchIndex.from_records(self._fetch_all_codes())
+        self.load_term_vocabulary(self.search_index.short_descriptions())
+        return self.search_index
+
+    def load_autocomplete_index(self, csv_path: Optional[str] = None) -> AutocompleteIndex:
+        """Build the typeahead prefix index from a codes CSV, or from Neo4j when no path is given"""
+        records = iter_icd_records(csv_path) if csv_path else self._fetch_all_codes()
+        self.autocomplete_index = AutocompleteIndex.from_records(records)
+        return self.autocomplete_index
+
+    def autocomplete(self, text: str, limit: int = 10) -> List[dict]:
+        """
+        Top completions for a partial code ("J1", "E11.2") or description
+        prefix, each with code, short_desc, category_code, level (0 for
+        categories) and match ("code" or "description"). Answered in memory;
+        the index is loaded from Neo4j on first use.
+        """
+        if self.autocomplete_index is None:
+            self.load_autocomplete_index()
+        with self.metrics.timer("autocomplete"):
+            return self.autocomplete_index.complete(text, limit)
+
+    def _fetch_all_codes(self) -> List[dict]:
+        """Every ICD code in the search result shape, for building local indexes"""
+        if self.snapshot is not None:
+            return list(self.snapshot.records())
+        records = self.db_client.read("""
+        MATCH (code:ICDCode)
+        RETURN code.code as code,
+               code.short_desc as short_desc,
+               code.long_desc as long_desc,
+               code.category_code as category_code
+        """)
+        return [record.data() for record in records]
+
+    def load_vector_index(self, index_dir: str, csv_path: Optional[str] = None, n_features: int = 512):
+        """
+        Memory-map the semantic vector index from index_dir, building it first
+        (from the CSV if given, otherwise from Neo4j) when it doesn't exist yet
+        or was built from another version of the data: the dataset version,
+        or the CSV's size and modification time. Requires numpy.
+        """
+        from app.services.vector_index import VectorIndex
+
+        def records():
+            if csv_path:
+                return iter_icd_records(csv_path)
+            return self._fetch_all_codes()
+
+        if csv_path:
+            stat = Path(csv_path).stat()
+            dataset_version = f"csv:{stat.st_size}:{stat.st_mtime_ns}"
+        else:
+            dataset_version = self.dataset_version()
+        self.vector_index = VectorIndex.load_or_build(index_dir, records, n_features=n_features,
+                                                      dataset_version=dataset_version)
+        logger.info(f"Vector index ready: {len(self.vector_index)} codes")
+        return self.vector_index
+
+    def semantic_search(self, search_text: str, limit: int = 10, hybrid: bool = False,
+                        mode: str = "fulltext") -> List[dict]:
+        """
+        Rank codes by cosine similarity between hashed TF-IDF vectors of the query
+        and of each code's descriptions. With hybrid=True the vector ranking is
+        fused (reciprocal rank fusion) with the Cypher search ranking, so codes
+        both retrievers agree on come first.
+        """
+        if self.vector_index is None:
+            logger.warning("Semantic search requested before load_vector_index(); using Cypher search")
+            return self.search_by_description(search_text, limit=limit, mode=mode)
+
+        candidates = limit * 3 if hybrid else limit
+        vector_results = [
+            self._format_result(code_data)
+            for code_data, _ in self.vector_index.search(search_text, limit=candidates)
+        ]
+        if not hybrid:
+            return vector_results
+
+        cypher_results = self.search_by_description(search_text, limit=candidates, mode=mode)
+        fused = {}
+        results_by_code = {}
+        for ranking in (vector_results, cypher_results):
+            for rank, result in enumerate(ranking):
+                fused[result['code']] = fused.get(result['code'], 0.0) + 1.0 / (RRF_K + rank + 1)
+                results_by_code.setdefault(result['code'], result)
+        ranked = sorted(fused, key=lambda code: (-fused[code], code))
+        return [results_by_code[code] for code in ranked[:limit]]
+
+    @cached("search")
+    def search_by_description(self, search_text: str, limit: int = 10, mode: str = "fulltext") -> List[dict]:
         """
         Search using Neo4j graph structure and relationships
+
+        mode="fulltext" ranks hits from the full-text index by score and falls back
+        to the CONTAINS scan if the index is missing; mode="contains" always scans;
+        mode="memory" answers from the in-memory index (see load_search_index);
+        mode="semantic" ranks by vector similarity (see load_vector_index).
         """
-        logger.info(f"Searching for: {search_text}")
-        
-        search_terms = self._extract_medical_terms(search_text)
-        logger.info(f"Extracted terms: {search_terms}")
-        
-        with self.driver.session() as session:
-            cypher_query = """
-            // Match codes based on search terms
-            MATCH (code:ICDCode)
-            WHERE code.code = $search_text
-                OR ANY(term IN $search_terms WHERE
-                    toLower(code.code) CONTAINS toLower(term)
-                    OR toLower(code.short_desc) CONTAINS toLower(term)
-                )
-
-            // Convert node properties to dictionary in Neo4j
-            WITH {
-                code: code.code,
-                short_desc: code.short_desc,
-                long_desc: code.long_desc,
-                category_code: code.category_code
-            } as result,
-            CASE 
-                WHEN code.code = $search_text THEN 100
-                WHEN code.short_desc CONTAINS toLower($search_text) THEN 75
-                ELSE 50
-            END as relevance
-
-            RETURN result, relevance
-            ORDER BY relevance DESC, result.code
-            LIMIT $limit
-            """
-            
-            try:
-                result = session.run(
-                    cypher_query,
-                    search_text=search_text.upper(),
-                    search_terms=search_terms,
-                    limit=limit
-                )
-                
-                codes = []
-                for record in result:
-                    # Get the already-converted dictionary
-                    code_data = record["result"]
-                    
-                    # Format code with dot notation if needed
-                    if len(code_data['code']) > 3:
-                        formatted_code = f"{code_data['code'][:3]}.{code_data['code'][3:]}"
-                    else:
-                        formatted_code = code_data['code']
-                    
-                    # Create new dictionary with formatted code
-                    formatted_data = {
-                        'code': formatted_code,
-                        'short_desc': code_data['short_desc'],
-                        'long_desc': code_data['long_desc'],
-                        'category_code': code_data['category_code']
-                    }
-                    
-                    codes.append(formatted_data)
-                    logger.info(f"Found code {formatted_data['code']} ({formatted_data['short_desc']})")
-                
-                return codes
-                
-            except Exception as e:
-                logger.error(f"Neo4j query failed: {str(e)}")
-                logger.error(f"Search text: {search_text}")
-                logger.error(f"Search terms: {search_terms}")
-                return []
+        logger.debug(f"Searching for: {search_text}")
+        mode = self._local_search_mode(mode)
+
+        with self.metrics.timer("extract_terms"):
+            search_terms = self._extract_medical_terms(search_text)
+        logger.debug(f"Extracted terms: {search_terms}")
+
+        with self.metrics.timer("search", mode=mode):
+            codes = self._search(search_text, search_terms, limit, mode)
+        self._record_search(mode, codes)
+        return codes
+
+    def _local_search_mode(self, mode: str) -> str:
+        """With a snapshot backend, searches are answered from the in-memory index built from it"""
+        if self.snapshot is None or (mode == "semantic" and self.vector_index is not None):
+            return mode
+        if self.search_index is None:
+            self.load_search_index()
+        return "memory"
+
+    def _record_search(self, mode: str, codes: List[dict]) -> None:
+        self.metrics.increment("searches_total", mode=mode)
+        self.metrics.observe("search_results", len(codes), mode=mode)
+
+    def _search(self, search_text: str, search_terms: List[str], limit: int, mode: str) -> List[dict]:
+        if mode == "memory" and self.search_index is not None:
+            return self._search_memory(search_text, search_terms, limit)
+
+        if mode == "semantic" and self.vector_index is not None:
+            return self.semantic_search(search_text, limit=limit)
+
+        try:
+            if mode == "fulltext" and self._fulltext_available:
+                codes = self._search_fulltext(search_text, search_terms, limit)
+                if codes is not None:
+                    return codes
+
+            return self._search_contains(search_text, search_terms, limit)
+
+        except Exception as e:
+            logger.error(f"Neo4j query failed: {str(e)}")
+            logger.error(f"Search text: {search_text}")
+            logger.error(f"Search terms: {search_terms}")
+            if self.search_index is not None:
+                logger.warning("Serving search from the in-memory index")
+                return self._search_memory(search_text, search_terms, limit)
+            return []
+
+    def search_many(self, search_texts: List[str], limit: int = 10, mode: str = "fulltext",
+                    raise_errors: bool = False) -> List[List[dict]]:
+        """
+        Run many searches in a single round trip (UNWIND + CALL subquery).
+        Returns one result list per search text, in input order. A failed
+        query yields empty lists, or raises with raise_errors=True so callers
+        can tell an outage from searches that found nothing.
+        """
+        mode = self._local_search_mode(mode)
+        searches = []
+        for position, search_text in enumerate(search_texts):
+            search_terms = self._extract_medical_terms(search_text)
+            searches.append({
+                'position': position,
+                'search_text': search_text.upper(),
+                'search_terms': search_terms,
+                'fulltext_query': self._build_fulltext_query(search_text, search_terms)
+            })
+
+        results: List[List[dict]] = [[] for _ in search_texts]
+        if not searches:
+            return results
+        self.metrics.observe("search_many_batch_size", len(searches), mode=mode)
+
+        if mode == "memory" and self.search_index is not None:
+            return [
+                self._search_memory(search_text, search['search_terms'], limit)
+                for search_text, search in zip(search_texts, searches)
+            ]
+
+        try:
+            records = None
+            if mode == "fulltext" and self._fulltext_available:
+                try:
+                    records = self.db_client.read(
+                        SEARCH_MANY_FULLTEXT_QUERY,
+                        index_name=FULLTEXT_INDEX_NAME,
+                        # Lucene rejects empty queries, so leave those out
+                        searches=[search for search in searches if search['fulltext_query']],
+                        limit=limit
+                    )
+                except ClientError as e:
+                    self._on_fulltext_error(e)
+            if records is None:
+                records = self.db_client.read(SEARCH_MANY_CONTAINS_QUERY, searches=searches, limit=limit)
+        except Exception as e:
+            logger.error(f"Neo4j multi-search failed for {len(searches)} searches: {str(e)}")
+            if raise_errors:
+                raise
+            return results
+
+        for record in records:
+            results[record["position"]] = [self._format_result(code_data) for code_data in record["results"]]
+        return results
+
+    def _search_memory(self, search_text: str, search_terms: List[str], limit: int) -> List[dict]:
+        """Search the in-memory inverted index"""
+        return [
+            self._format_result(code_data)
+            for code_data in self.search_index.search(search_text, search_terms, limit)
+        ]
+
+    def _search_fulltext(self, search_text: str, search_terms: List[str], limit: int) -> Optional[List[dict]]:
+        """Search through the full-text index, returning None if the index is unavailable"""
+        fulltext_query = self._build_fulltext_query(search_text, search_terms)
+        if not fulltext_query:
+            return []
+
+        try:
+            records = self.db_client.read(
+                SEARCH_FULLTEXT_QUERY,
+                index_name=FULLTEXT_INDEX_NAME,
+                fulltext_query=fulltext_query,
+                limit=limit
+            )
+        except ClientError as e:
+            self._on_fulltext_error(e)
+            return None
+
+        return self._records_to_results(records)
+
+    def _on_fulltext_error(self, error: ClientError) -> None:
+        """
+        Stop using the full-text index if the error says it doesn't exist. Any
+        other failure (e.g. a query Lucene can't parse) only sends that one
+        search to the CONTAINS scan.
+        """
+        if _is_missing_index_error(error):
+            logger.warning(f"Full-text index {FULLTEXT_INDEX_NAME} is missing, falling back to CONTAINS: {str(error)}")
+            self._fulltext_available = False
+        else:
+            logger.warning(f"Full-text query failed, using CONTAINS for this search: {str(error)}")
+
+    def _records_to_results(self, records) -> List[dict]:
+        codes = []
+        for record in records:
+            # Get the already-converted dictionary
+            formatted_data = self._format_result(record["result"])
+            codes.append(formatted_data)
+            logger.debug(f"Found code {formatted_data['code']} ({formatted_data['short_desc']})")
+
+        return codes
+
+    def _search_contains(self, search_text: str, search_terms: List[str], limit: int) -> List[dict]:
+        """Search by scanning short descriptions with CONTAINS"""
+        records = self.db_client.read(
+            SEARCH_CONTAINS_QUERY,
+            search_text=search_text.upper(),
+            search_terms=search_terms,
+            limit=limit
+        )
+        return self._records_to_results(records)
 
     def get_category_codes(self, category_code: str) -> List[dict]:
         """Get all codes in a category with their relationships"""
-        with self.driver.session() as session:
-            cypher_query = """
-            MATCH (category:Category {code: $category_code})<-[:BELONGS_TO]-(code:ICDCode)
-            OPTIONAL MATCH (code)-[:IS_A]->(parent:ICDCode)
-            RETURN {
-                code: code.code,
-                short_desc: code.short_desc,
-                long_desc: code.long_desc,
-                parent_code: COALESCE(parent.code, ''),
-                parent_desc: COALESCE(parent.short_desc, '')
-            } as code_info
-            ORDER BY code_info.code
-            """
-            
-            try:
-                result = session.run(cypher_query, category_code=category_code)
-                return [record["code_info"] for record in result]
-            except Exception as e:
-                logger.error(f"Neo4j query failed: {str(e)}")
-                return []
+        if self.snapshot is not None:
+            return self.snapshot.category_page(category_code)
+        try:
+            return self._category_codes(category_code)
+        except Exception as e:
+            logger.error(f"Neo4j query failed: {str(e)}")
+            return []
+
+    @cached("category")
+    def _category_codes(self, category_code: str) -> List[dict]:
+        # Query errors propagate through the cache, so a failed read is never stored
+        records = self.db_client.read(CATEGORY_CODES_QUERY, category_code=category_code)
+        return [record["code_info"] for record in records]
+
+    def get_category_page(self, category_code: str, after: Optional[str] = None,
+                          page_size: int = DEFAULT_PAGE_SIZE) -> dict:
+        """
+        One page of a category's codes in code order: {'codes': [...],
+        'next_cursor': ..., 'error': None}. Pass next_cursor back as after for
+        the following page; it is None on the last page. Records are streamed
+        from the driver and only one look-ahead record beyond the page is read.
 
+        If the query fails, even partway through the page, no codes are
+        returned: 'error' holds the message and next_cursor is still after,
+        so the same page can be requested again.
+        """
+        if page_size < 1:
+            raise ValueError(f"page_size must be at least 1, got {page_size}")
+        if self.snapshot is not None:
+            codes = self.snapshot.category_page(category_code, after=after, limit=page_size + 1)
+            next_cursor = codes[page_size - 1]['code'] if len(codes) > page_size else None
+            return {'codes': codes[:page_size], 'next_cursor': next_cursor, 'error': None}
+
+        codes: List[dict] = []
+        next_cursor = None
+        try:
+            with closing(self.db_client.stream(CATEGORY_PAGE_QUERY, fetch_size=page_size + 1,
+                                               category_code=category_code, after=after or "",
+                                               limit=page_size + 1)) as records:
+                for record in records:
+                    if len(codes) == page_size:
+                        next_cursor = codes[-1]['code']
+                        break
+                    codes.append(record["code_info"])
+        except Exception as e:
+            logger.error(f"Neo4j query failed: {str(e)}")
+            return {'codes': [], 'next_cursor': after, 'error': str(e)}
+        return {'codes': codes, 'next_cursor': next_cursor, 'error': None}
+
+    @cached("code_details")
     def get_code_details(self, code: str) -> Optional[dict]:
         """
         Get detailed information about a specific ICD code
         """
-        with self.driver.session() as session:
-            cypher_query = """
-            MATCH (code:ICDCode {code: $code})
-            OPTIONAL MATCH (code)-[:BELONGS_TO]->(category:Category)
-            RETURN code, category
-            """
-            result = session.run(cypher_query, code=code)
-            record = result.single()
-            if record:
-                details = record["code"]
-                if record["category"]:
-                    details["category_name"] = record["category"]["name"]
-                return details
-            return None
+        if self.snapshot is not None:
+            return self.snapshot.code_details(code)
+        record = self.db_client.read_single(CODE_DETAILS_QUERY, code=code)
+        return self._record_to_details(record)
+
+    def get_code_details_many(self, codes: List[str]) -> List[Optional[dict]]:
+        """
+        Details for any number of codes, dotted or undotted, in input order
+        (None for unknown codes). Cached codes are answered from the result
+        cache; the rest are resolved with a single UNWIND query. Unlike
+        get_code_details (an exact match) codes are normalised, so entries
+        live in their own cache namespace, keyed by the undotted code.
+        """
+        if self.snapshot is not None:
+            return [self.snapshot.code_details(code) for code in codes]
+        details, lookups = self._cached_details(codes)
+        if lookups:
+            records = self.db_client.read(CODE_DETAILS_MANY_QUERY, lookups=lookups)
+            self._store_details(codes, details, records)
+        return details
+
+    def _code_candidates(self, code: str) -> List[str]:
+        """Spellings a code may be stored under: dotted (as loaded) and undotted"""
+        normalized = self._normalize_code(code.strip().upper())
+        return list(dict.fromkeys([self._format_code(normalized), normalized]))
+
+    def _details_key(self, code: str, version: Optional[str] = None) -> str:
+        return self.result_cache.make_key("code_details_many", self._normalize_code(code.strip().upper()),
+                                          version=version)
+
+    def _cached_details(self, codes: List[str], version: Optional[str] = None):
+        details: List[Optional[dict]] = [None] * len(codes)
+        lookups = []
+        for position, code in enumerate(codes):
+            if self.result_cache is not None:
+                details[position] = self.result_cache.get(self._details_key(code, version))
+            if details[position] is None:
+                lookups.append({'position': position, 'candidates': self._code_candidates(code)})
+        return details, lookups
+
+    def _store_details(self, codes: List[str], details: List[Optional[dict]], records,
+                       version: Optional[str] = None) -> None:
+        for record in records:
+            position = record["position"]
+            details[position] = self._record_to_details(record)
+            if self.result_cache is not None:
+                self.result_cache.set(self._details_key(codes[position], version), details[position])
+
+    def _record_to_details(self, record) -> Optional[dict]:
+        if record:
+            details = dict(record["code"])
+            if record["category"]:
+                details["category_name"] = record["category"]["name"]
+            return details
+        return None
+
+    # Async API: same queries and cache entries as the sync methods, on the async driver
+
+    @property
+    def async_db_client(self) -> AsyncNeo4jICD:
+        """Async Neo4j client, created on first use so sync-only callers never open it"""
+        if self._async_client is None:
+            uri, user, password, pool_config = self._connection
+            self._async_client = AsyncNeo4jICD(uri, user, password, metrics=self.metrics, **pool_config)
+        return self._async_client
+
+    async def _dataset_version_async(self) -> Optional[str]:
+        if self.snapshot is not None:
+            return self.snapshot.dataset_version
+        return await self.async_db_client.get_dataset_version()
+
+    async def cache_version_async(self) -> str:
+        """Dataset version the result cache keys on, read without blocking the event loop"""
+        return await self.result_cache.version_async() if self.result_cache is not None else "0"
+
+    @async_cached("search")
+    async def search_by_description_async(self, search_text: str, limit: int = 10, mode: str = "fulltext") -> List[dict]:
+        """Async version of search_by_description"""
+        mode = self._local_search_mode(mode)
+        with self.metrics.timer("extract_terms"):
+            search_terms = self._extract_medical_terms(search_text)
+
+        with self.metrics.timer("search", mode=mode):
+            codes = await self._search_async(search_text, search_terms, limit, mode)
+        self._record_search(mode, codes)
+        return codes
+
+    async def _search_async(self, search_text: str, search_terms: List[str], limit: int, mode: str) -> List[dict]:
+        if mode == "memory" and self.search_index is not None:
+            return self._search_memory(search_text, search_terms, limit)
+
+        try:
+            if mode == "fulltext" and self._fulltext_available:
+                fulltext_query = self._build_fulltext_query(search_text, search_terms)
+                if not fulltext_query:
+                    return []
+                try:
+                    records = await self.async_db_client.read(
+                        SEARCH_FULLTEXT_QUERY,
+                        index_name=FULLTEXT_INDEX_NAME,
+                        fulltext_query=fulltext_query,
+                        limit=limit
+                    )
+                    return self._records_to_results(records)
+                except ClientError as e:
+                    self._on_fulltext_error(e)
+
+            records = await self.async_db_client.read(
+                SEARCH_CONTAINS_QUERY,
+                search_text=search_text.upper(),
+                search_terms=search_terms,
+                limit=limit
+            )
+            return self._records_to_results(records)
+
+        except Exception as e:
+            logger.error(f"Neo4j query failed: {str(e)}")
+            logger.error(f"Search text: {search_text}")
+            if self.search_index is not None:
+                logger.warning("Serving search from the in-memory index")
+                return self._search_memory(search_text, search_terms, limit)
+            return []
+
+    async def search_many_async(self, search_texts: List[str], limit: int = 10, mode: str = "fulltext") -> List[List[dict]]:
+        """Run several independent searches concurrently"""
+        return list(await asyncio.gather(
+            *(self.search_by_description_async(text, limit=limit, mode=mode) for text in search_texts)
+        ))
+
+    async def get_category_codes_async(self, category_code: str) -> List[dict]:
+        """Async version of get_category_codes"""
+        if self.snapshot is not None:
+            return self.snapshot.category_page(category_code)
+        try:
+            return await self._category_codes_async(category_code)
+        except Exception as e:
+            logger.error(f"Neo4j query failed: {str(e)}")
+            return []
+
+    @async_cached("category")
+    async def _category_codes_async(self, category_code: str) -> List[dict]:
+        records = await self.async_db_client.read(CATEGORY_CODES_QUERY, category_code=category_code)
+        return [record["code_info"] for record in records]
+
+    @async_cached("code_details")
+    async def get_code_details_async(self, code: str) -> Optional[dict]:
+        """Async version of get_code_details"""
+        if self.snapshot is not None:
+            return self.snapshot.code_details(code)
+        record = await self.async_db_client.read_single(CODE_DETAILS_QUERY, code=code)
+        return self._record_to_details(record)
+
+    async def get_code_details_many_async(self, codes: List[str]) -> List[Optional[dict]]:
+        """Async version of get_code_details_many (one UNWIND query for the uncached codes)"""
+        if self.snapshot is not None:
+            return [self.snapshot.code_details(code) for code in codes]
+        version = await self.cache_version_async()
+        details, lookups = self._cached_details(codes, version=version)
+        if lookups:
+            records = await self.async_db_client.read(CODE_DETAILS_MANY_QUERY, lookups=lookups)
+            self._store_details(codes, details, records, version=version)
+        return details
+
+    async def aclose(self):
+        """Close the async driver, if one was opened"""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
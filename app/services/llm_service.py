@@ -1,21 +1,67 @@
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, Iterator, List, Dict, Optional, Tuple
+from app.services.cache import AsyncSingleFlight, LRUCache, SingleFlight
+from app.services.context_builder import DEFAULT_CONTEXT_TOKENS, ContextBuilder, TokenCounter
 from app.services.icd_service import ICDService
-import openai
-from openai import OpenAI
+from app.services.term_extractor import code_pattern
 import os
+import asyncio
+import hashlib
+import time
 from dotenv import load_dotenv
 import logging
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+SYSTEM_PROMPT = """You are an ICD-10 coding assistant. Suggest only codes listed in the database results below, \
+briefly explain why each fits, and say so if none match the query well.
+
+Database results:
+{context}
+"""
+
+# ICD-10 codes the model may mention, in the same shape the term extractor accepts
+CODE_MENTION_PATTERN = code_pattern()
+
+# Per-message framing tokens added by the chat format (system + user message, plus reply priming)
+MESSAGE_OVERHEAD_TOKENS = 11
+
 class MedicalCodingAssistant:
-    def __init__(self, icd_service: ICDService):
+    def __init__(self, icd_service: ICDService, client: Optional["OpenAI"] = None,
+                 async_client: Optional["AsyncOpenAI"] = None):
+        """
+        The OpenAI clients (and the openai package itself) are only loaded when
+        the first completion is requested, unless clients are passed in.
+        """
         self.icd_service = icd_service
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self._client = client
+        self._async_client = async_client
+        self.model = "gpt-3.5-turbo"
+        self.temperature = 0.3
+        self.context_builder = ContextBuilder(
+            max_tokens=int(os.getenv("LLM_CONTEXT_TOKENS", DEFAULT_CONTEXT_TOKENS)),
+            counter=TokenCounter(self.model)
+        )
+
+        # Answers for identical (query, retrieved codes, model) triples are reused
+        self.response_cache = LRUCache(
+            maxsize=int(os.getenv("LLM_CACHE_SIZE", 512)),
+            ttl=float(os.getenv("LLM_CACHE_TTL", 3600))
+        )
+        self._inflight = SingleFlight()
+        self._async_inflight = AsyncSingleFlight()
+
+        self.metrics = icd_service.metrics
+        icd_service.register_collector("llm_response_cache", lambda: dict(
+            self.response_cache.stats(),
+            coalesced=self._inflight.coalesced + self._async_inflight.coalesced
+        ))
         
         self.base_prompt = """You are a medical coding assistant specialized in ICD-10 codes. 
         Given a medical description, suggest the most appropriate ICD-10 codes and explain your reasoning.
@@ -27,7 +73,25 @@ class MedicalCodingAssistant:
         
         Use the provided database results to ensure accuracy."""
 
+    @property
+    def client(self) -> "OpenAI":
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
+
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+            self._async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._async_client
+
     def process_query(self, user_query: str) -> Dict:
+        with self.metrics.timer("process_query"):
+            return self._process_query(user_query)
+
+    def _process_query(self, user_query: str) -> Dict:
         try:
             logger.info(f"Processing query: {user_query}")
             
@@ -36,71 +100,345 @@ class MedicalCodingAssistant:
             logger.info(f"Found {len(db_results)} results in database")
             
             if not db_results:
-                return {
-                    "suggested_codes": [],
-                    "explanation": "I couldn't find any matching ICD-10 codes in the database. Please try rephrasing your query or provide more specific medical terms.",
-                    "source": "no results"
-                }
-            
-            # Prepare context with strict verification
-            context = self._prepare_context(db_results)
-            
-            system_prompt = """You are a medical coding assistant specialized in ICD-10 codes. 
-            IMPORTANT RULES:
-            1. ONLY suggest codes that are present in the provided database results
-            2. DO NOT make up or suggest codes that aren't in the database results
-            3. If you're not sure about a code, say so
-            4. Explain why each suggested code is relevant
-            5. If the database results don't match the query well, acknowledge this
-            
-            Current database results:
-            {context}
-            """
+                return self._no_results_response()
             
             try:
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": system_prompt.format(context=context)},
-                        {"role": "user", "content": user_query}
-                    ],
-                    temperature=0.3  # Lower temperature for more conservative responses
-                )
-                
-                explanation = response.choices[0].message.content
-                
-                return {
-                    "suggested_codes": db_results,
-                    "explanation": explanation,
-                    "source": "database + llm",
-                    "verified_codes": True
-                }
+                system_prompt, prompt_stats = self._build_prompt(user_query, db_results)
+                explanation = self._get_explanation(user_query, db_results, system_prompt)
+                verification = self._verify_mentions(explanation, db_results)
+                return self._llm_response(db_results, explanation, prompt_stats, verification)
                 
             except Exception as e:
                 logger.error(f"OpenAI API error: {str(e)}")
-                return {
-                    "suggested_codes": db_results,
-                    "explanation": "Here are the relevant codes found in our database. For detailed explanations, please consult official ICD-10 documentation.",
-                    "source": "database only",
-                    "verified_codes": True
-                }
+                self.metrics.increment("llm_errors_total", model=self.model)
+                return self._database_only_response(db_results)
                 
         except Exception as e:
             logger.error(f"Unexpected error: {str(e)}")
-            return {
-                "suggested_codes": [],
-                "explanation": "I apologize, but I encountered an error processing your request. Please try again.",
-                "source": "error",
-                "verified_codes": False
-            }
+            return self._error_response()
 
-    def _prepare_context(self, db_results: List[Dict]) -> str:
-        """Prepare context from database results for LLM"""
+    async def process_query_async(self, user_query: str) -> Dict:
+        """Async version of process_query using the async Neo4j driver and AsyncOpenAI"""
+        with self.metrics.timer("process_query"):
+            return await self._process_query_async(user_query)
+
+    async def _process_query_async(self, user_query: str) -> Dict:
+        try:
+            logger.info(f"Processing query: {user_query}")
+
+            db_results = await self.icd_service.search_by_description_async(user_query)
+            logger.info(f"Found {len(db_results)} results in database")
+
+            if not db_results:
+                return self._no_results_response()
+
+            try:
+                system_prompt, prompt_stats = self._build_prompt(user_query, db_results)
+                explanation = await self._get_explanation_async(user_query, db_results, system_prompt)
+                verification = await self._verify_mentions_async(explanation, db_results)
+                return self._llm_response(db_results, explanation, prompt_stats, verification)
+
+            except Exception as e:
+                logger.error(f"OpenAI API error: {str(e)}")
+                self.metrics.increment("llm_errors_total", model=self.model)
+                return self._database_only_response(db_results)
+
+        except Exception as e:
+            logger.error(f"Unexpected error: {str(e)}")
+            return self._error_response()
+
+    def explain_results(self, user_query: str, db_results: List[Dict]) -> Dict:
+        """Build the LLM-backed response for already retrieved results; LLM errors propagate"""
         if not db_results:
-            return "No exact matches found in the database."
-        
-        context = "Related codes found in database:\n"
-        for result in db_results:
-            context += f"- {result['code']}: {result['short_desc']}\n  Long description: {result['long_desc']}\n"
-        
-        return context 
\ No newline at end of file
+            return self._no_results_response()
+        system_prompt, prompt_stats = self._build_prompt(user_query, db_results)
+        explanation = self._get_explanation(user_query, db_results, system_prompt)
+        verification = self._verify_mentions(explanation, db_results)
+        return self._llm_response(db_results, explanation, prompt_stats, verification)
+
+    def process_query_stream(self, user_query: str) -> Iterator[Dict]:
+        """
+        Streaming version of process_query. Yields events as they become available:
+
+        - {"type": "codes", "suggested_codes": [...]} as soon as the database answers
+        - {"type": "token", "content": "..."} for each explanation chunk from the LLM
+        - {"type": "done", "response": {...}} with the same dict process_query returns
+
+        If the LLM fails partway through, the database-only explanation is streamed
+        after whatever was already received and the final source is "database only".
+        """
+        try:
+            logger.info(f"Processing query (streaming): {user_query}")
+            db_results = self.icd_service.search_by_description(user_query)
+            logger.info(f"Found {len(db_results)} results in database")
+        except Exception as e:
+            logger.error(f"Unexpected error: {str(e)}")
+            response = self._error_response()
+            yield {"type": "codes", "suggested_codes": []}
+            yield {"type": "token", "content": response["explanation"]}
+            yield {"type": "done", "response": response}
+            return
+
+        yield {"type": "codes", "suggested_codes": db_results}
+
+        if not db_results:
+            response = self._no_results_response()
+            yield {"type": "token", "content": response["explanation"]}
+            yield {"type": "done", "response": response}
+            return
+
+        # Everything past the codes event sits in one try: whatever fails (prompt,
+        # cache key, LLM, verification), the stream still ends with a done event
+        chunks = []
+        try:
+            # Built even on a cache hit, so the final response has the same shape either way
+            system_prompt, prompt_stats = self._build_prompt(user_query, db_results)
+            cache_key = self._response_cache_key(user_query, db_results)
+            cached_entry = self.response_cache.get(cache_key)
+            if cached_entry is not None:
+                logger.info("Serving explanation from response cache")
+                chunks.append(cached_entry["explanation"])
+                yield {"type": "token", "content": cached_entry["explanation"]}
+            else:
+                started = time.perf_counter()
+                stream = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self._build_messages(user_query, system_prompt),
+                    temperature=self.temperature,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                for chunk in stream:
+                    if not chunk.choices:
+                        self._record_usage(chunk)  # the final chunk carries only usage
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        if not chunks:
+                            self.metrics.observe("llm_first_token_seconds", time.perf_counter() - started,
+                                                 model=self.model)
+                        chunks.append(content)
+                        yield {"type": "token", "content": content}
+                self.metrics.observe("llm_seconds", time.perf_counter() - started, model=self.model, stream="true")
+                self._store_explanation(cache_key, db_results, "".join(chunks))
+
+            explanation = "".join(chunks)
+            verification = self._verify_mentions(explanation, db_results)
+            response = self._llm_response(db_results, explanation, prompt_stats, verification)
+
+        except Exception as e:
+            logger.error(f"OpenAI API error: {str(e)}")
+            self.metrics.increment("llm_errors_total", model=self.model)
+            response = self._database_only_response(db_results)
+            fallback = response["explanation"]
+            if chunks:
+                fallback = f"\n\n{fallback}"
+                response["explanation"] = "".join(chunks) + fallback
+            yield {"type": "token", "content": fallback}
+
+        yield {"type": "done", "response": response}
+
+    async def process_queries_async(self, user_queries: List[str], max_concurrency: int = 16) -> List[Dict]:
+        """Process many queries concurrently, with at most max_concurrency in flight"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def process(user_query):
+            async with semaphore:
+                return await self.process_query_async(user_query)
+
+        return list(await asyncio.gather(*(process(user_query) for user_query in user_queries)))
+
+    def _build_prompt(self, user_query: str, db_results: List[Dict]) -> Tuple[str, Dict]:
+        """System prompt with the budgeted context, and its size for the response"""
+        with self.metrics.timer("prepare_context"):
+            context, context_stats = self.context_builder.build(db_results)
+            system_prompt = SYSTEM_PROMPT.format(context=context)
+        counter = self.context_builder.counter
+        prompt_tokens = counter.count(system_prompt) + counter.count(user_query) + MESSAGE_OVERHEAD_TOKENS
+        self.metrics.observe("prompt_tokens", prompt_tokens, model=self.model)
+        return system_prompt, {
+            "prompt_tokens": prompt_tokens,
+            "context_codes": context_stats["context_codes"],
+            "context_truncated": context_stats["truncated"]
+        }
+
+    def _record_usage(self, response) -> None:
+        """Count prompt/completion tokens reported by the API"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        self.metrics.increment("llm_prompt_tokens_total", usage.prompt_tokens or 0, model=self.model)
+        self.metrics.increment("llm_completion_tokens_total", usage.completion_tokens or 0, model=self.model)
+
+    def _no_results_response(self) -> Dict:
+        return {
+            "suggested_codes": [],
+            "explanation": "I couldn't find any matching ICD-10 codes in the database. Please try rephrasing your query or provide more specific medical terms.",
+            "source": "no results"
+        }
+
+    def _llm_response(self, db_results: List[Dict], explanation: str, prompt_stats: Optional[Dict] = None,
+                      verification: Optional[Dict] = None) -> Dict:
+        response = {
+            "suggested_codes": db_results,
+            "explanation": explanation,
+            "source": "database + llm",
+            "verified_codes": True
+        }
+        if prompt_stats:
+            response.update(prompt_stats)
+        if verification:
+            response.update(verification)
+        return response
+
+    def _unknown_mentions(self, explanation: str, db_results: List[Dict]) -> Tuple[List[str], List[str]]:
+        """Codes mentioned in the explanation, and those of them not among the retrieved results"""
+        normalize = self.icd_service._normalize_code
+        retrieved = {normalize(result['code']).upper() for result in db_results}
+        mentioned = list(dict.fromkeys(CODE_MENTION_PATTERN.findall(explanation or "")))
+        return mentioned, [code for code in mentioned if normalize(code) not in retrieved]
+
+    def _verification(self, mentioned: List[str], unknown: List[str], details: List[Optional[Dict]]) -> Dict:
+        unverified = [code for code, detail in zip(unknown, details) if detail is None]
+        if unverified:
+            logger.warning(f"Explanation mentions codes not in the database: {unverified}")
+            self.metrics.increment("llm_unverified_codes_total", len(unverified), model=self.model)
+        return {
+            "mentioned_codes": mentioned,
+            "unverified_codes": unverified,
+            "verified_codes": not unverified
+        }
+
+    def _verify_mentions(self, explanation: str, db_results: List[Dict]) -> Dict:
+        """
+        Check every code the model mentions. Retrieved codes are known to exist;
+        the rest are looked up together in one query (get_code_details_many)
+        """
+        mentioned, unknown = self._unknown_mentions(explanation, db_results)
+        details: List[Optional[Dict]] = []
+        if unknown:
+            try:
+                details = self.icd_service.get_code_details_many(unknown)
+            except Exception as e:
+                logger.error(f"Code verification failed: {str(e)}")
+        return self._verification(mentioned, unknown, details or [None] * len(unknown))
+
+    async def _verify_mentions_async(self, explanation: str, db_results: List[Dict]) -> Dict:
+        """Async version of _verify_mentions"""
+        mentioned, unknown = self._unknown_mentions(explanation, db_results)
+        details: List[Optional[Dict]] = []
+        if unknown:
+            try:
+                details = await self.icd_service.get_code_details_many_async(unknown)
+            except Exception as e:
+                logger.error(f"Code verification failed: {str(e)}")
+        return self._verification(mentioned, unknown, details or [None] * len(unknown))
+
+    def _database_only_response(self, db_results: List[Dict]) -> Dict:
+        return {
+            "suggested_codes": db_results,
+            "explanation": "Here are the relevant codes found in our database. For detailed explanations, please consult official ICD-10 documentation.",
+            "source": "database only",
+            "verified_codes": True
+        }
+
+    def _error_response(self) -> Dict:
+        return {
+            "suggested_codes": [],
+            "explanation": "I apologize, but I encountered an error processing your request. Please try again.",
+            "source": "error",
+            "verified_codes": False
+        }
+
+    def _response_cache_key(self, user_query: str, db_results: List[Dict],
+                            dataset_version: Optional[str] = None) -> str:
+        """
+        Key on the normalised query, the retrieved codes and the model parameters.
+        Async callers pass dataset_version (from cache_version_async) so the key
+        never reads the version synchronously on the event loop.
+        """
+        codes_fingerprint = hashlib.sha1(
+            "|".join(sorted(result['code'] for result in db_results)).encode("utf-8")
+        ).hexdigest()
+        normalized_query = " ".join(user_query.lower().split())
+        # Tie answers to the loaded dataset so a reload starts from a clean slate
+        if dataset_version is None:
+            result_cache = getattr(self.icd_service, "result_cache", None)
+            dataset_version = result_cache.version if result_cache else "0"
+        return f"{dataset_version}:{self.model}:{self.temperature}:{codes_fingerprint}:{normalized_query}"
+
+    def _get_explanation(self, user_query: str, db_results: List[Dict], system_prompt: str) -> str:
+        """
+        Return the LLM explanation, reusing a cached answer for the same query and
+        codes and sharing one in-flight completion between identical concurrent calls
+        """
+        cache_key = self._response_cache_key(user_query, db_results)
+        cached_entry = self.response_cache.get(cache_key)
+        if cached_entry is not None:
+            logger.info("Serving explanation from response cache")
+            return cached_entry["explanation"]
+
+        def complete():
+            with self.metrics.timer("llm", model=self.model, stream="false"):
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self._build_messages(user_query, system_prompt),
+                    temperature=self.temperature  # Lower temperature for more conservative responses
+                )
+            self._record_usage(response)
+            explanation = response.choices[0].message.content
+            self._store_explanation(cache_key, db_results, explanation)
+            return explanation
+
+        return self._inflight.do(cache_key, complete)
+
+    async def _get_explanation_async(self, user_query: str, db_results: List[Dict], system_prompt: str) -> str:
+        """Async version of _get_explanation; shares the response cache with it"""
+        dataset_version = await self.icd_service.cache_version_async()
+        cache_key = self._response_cache_key(user_query, db_results, dataset_version)
+        cached_entry = self.response_cache.get(cache_key)
+        if cached_entry is not None:
+            logger.info("Serving explanation from response cache")
+            return cached_entry["explanation"]
+
+        async def complete():
+            with self.metrics.timer("llm", model=self.model, stream="false"):
+                response = await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=self._build_messages(user_query, system_prompt),
+                    temperature=self.temperature
+                )
+            self._record_usage(response)
+            explanation = response.choices[0].message.content
+            self._store_explanation(cache_key, db_results, explanation)
+            return explanation
+
+        return await self._async_inflight.do(cache_key, complete)
+
+    def _build_messages(self, user_query: str, system_prompt: str) -> List[Dict]:
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_query}
+        ]
+
+    def _store_explanation(self, cache_key: str, db_results: List[Dict], explanation: str) -> None:
+        self.response_cache.set(cache_key, {
+            "explanation": explanation,
+            "codes": frozenset(result['code'] for result in db_results)
+        })
+
+    def invalidate_cache(self, codes: Optional[List[str]] = None) -> int:
+        """
+        Drop cached explanations that depend on any of the given codes (all of
+        them if codes is None), e.g. after the ICD data is reloaded
+        """
+        if codes is None:
+            dropped = len(self.response_cache)
+            self.response_cache.clear()
+            return dropped
+        codes = set(codes)
+        return self.response_cache.delete_where(lambda key, entry: not codes.isdisjoint(entry["codes"]))
+
+    def _prepare_context(self, db_results: List[Dict]) -> str:
+        """Prepare context from database results for LLM (deduplicated, grouped, within the token budget)"""
+        return self.context_builder.build(db_results)[0]
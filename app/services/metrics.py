@@ -0,0 +1,197 @@
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Recent samples kept per timer/histogram for quantiles; counts and sums are exact
+SAMPLE_WINDOW = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _quantile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[max(0, min(len(ordered) - 1, int(round(q * len(ordered))) - 1))]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class _Summary:
+    __slots__ = ("count", "total", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+        snapshot = {'count': self.count, 'sum': round(self.total, 6)}
+        for q in QUANTILES:
+            snapshot[f"p{int(q * 100)}"] = round(_quantile(ordered, q), 6)
+        return snapshot
+
+class MetricsRegistry:
+    """
+    Thread-safe in-process metrics: counters, summaries (timers and sizes) and
+    collectors that report other components' stats (e.g. cache counters) at
+    snapshot time. Rendered as a JSON-friendly dict or Prometheus text.
+    """
+
+    def __init__(self, prefix: str = "icd"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._summaries: Dict[str, Dict[LabelKey, _Summary]] = {}
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+        self.slow_queries = deque(maxlen=50)
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._summaries.setdefault(name, {})
+            summary = series.get(key)
+            if summary is None:
+                summary = series[key] = _Summary()
+            summary.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Record the block's wall time, in seconds, in the `<name>_seconds` summary"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - started, **labels)
+
+    def register_collector(self, name: str, collect: Callable[[], dict]) -> None:
+        """Report collect()'s dict under name in every snapshot (replaces a collector of the same name)"""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def unregister_collector(self, name: str, collect: Callable[[], dict]) -> None:
+        """Drop the collector registered under name, unless another one has replaced collect since"""
+        with self._lock:
+            if self._collectors.get(name) is collect:
+                del self._collectors[name]
+
+    def record_slow_query(self, entry: dict) -> None:
+        self.slow_queries.append(entry)
+        logger.warning(f"Slow Neo4j query {entry['query']} took {entry['elapsed_ms']:.0f}ms")
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+            self.slow_queries.clear()
+
+    def _collect(self) -> Dict[str, dict]:
+        collected = {}
+        for name, collect in list(self._collectors.items()):
+            try:
+                collected[name] = collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector {name} failed: {str(e)}")
+        return collected
+
+    def snapshot(self) -> dict:
+        """All metrics as plain dicts, e.g. for json.dumps or a debug panel"""
+        with self._lock:
+            counters = {
+                name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            summaries = {
+                name: [{'labels': dict(key), **summary.snapshot()} for key, summary in series.items()]
+                for name, series in self._summaries.items()
+            }
+        return {
+            'counters': counters,
+            'summaries': summaries,
+            'collectors': self._collect(),
+            'slow_queries': list(self.slow_queries)
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), default=str)
+
+    def _metric_name(self, name: str) -> str:
+        return f"{self.prefix}_{name}" if self.prefix else name
+
+    @staticmethod
+    def _labels_text(labels: dict) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in sorted(labels.items())) + "}"
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (counters, summaries, collector values as gauges)"""
+        lines = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            summaries = {name: {key: summary.snapshot() for key, summary in series.items()}
+                         for name, series in self._summaries.items()}
+
+        for name, series in sorted(counters.items()):
+            metric = self._metric_name(name)
+            lines.append(f"# TYPE {metric} counter")
+            for key, value in series.items():
+                lines.append(f"{metric}{self._labels_text(dict(key))} {value}")
+
+        for name, series in sorted(summaries.items()):
+            metric = self._metric_name(name)
+            lines.append(f"# TYPE {metric} summary")
+            for key, snapshot in series.items():
+                labels = dict(key)
+                for q in QUANTILES:
+                    quantile_labels = self._labels_text({**labels, 'quantile': str(q)})
+                    lines.append(f"{metric}{quantile_labels} {snapshot[f'p{int(q * 100)}']}")
+                lines.append(f"{metric}_sum{self._labels_text(labels)} {snapshot['sum']}")
+                lines.append(f"{metric}_count{self._labels_text(labels)} {snapshot['count']}")
+
+        for collector, values in sorted(self._collect().items()):
+            for path, value in sorted(_numeric_leaves(values).items()):
+                metric = self._metric_name(f"{collector}_{path}")
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path) -> None:
+        """Write Prometheus text to *.prom files and a JSON snapshot to anything else"""
+        content = self.to_prometheus() if str(path).endswith(".prom") else self.to_json()
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+
+def _numeric_leaves(values: dict, prefix: str = "") -> Dict[str, float]:
+    leaves = {}
+    for key, value in values.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            leaves.update(_numeric_leaves(value, f"{path}_"))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            leaves[path] = value
+    return leaves
+
+# Process-wide registry shared by ICDService, Neo4jICD and MedicalCodingAssistant
+metrics = MetricsRegistry()
@@ -0,0 +1,140 @@
+from app.database.icd_csv import DEFAULT_CSV_PATH, iter_icd_records
+from array import array
+from bisect import bisect_left
+from heapq import nsmallest
+from typing import Dict, Iterable, List
+import logging
+import re
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+class InMemorySearchIndex:
+    """
+    Token -> posting list inverted index over all ICD codes.
+
+    Documents are stored column-wise in parallel lists and postings are
+    compact arrays of document ids, so the whole ICD-10 code set fits in a
+    few megabytes and lookups never leave the process.
+    """
+
+    def __init__(self):
+        self._codes: List[str] = []  # normalized (undotted, upper-case) codes
+        self._raw_codes: List[str] = []  # codes as stored in the source
+        self._short_descs: List[str] = []
+        self._long_descs: List[str] = []
+        self._category_codes: List[str] = []
+        self._lower_short_descs: List[str] = []
+        self._code_ids: Dict[str, int] = {}
+        self._postings: Dict[str, array] = {}
+        self._vocabulary: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @staticmethod
+    def _normalize_code(code: str) -> str:
+        return code.replace(".", "").upper()
+
+    def add(self, code: str, short_desc: str, long_desc: str, category_code: str) -> None:
+        """Add one code; call finalize() once all codes are added"""
+        doc_id = len(self._codes)
+        normalized = sys.intern(self._normalize_code(code))
+        short_desc = short_desc or ""
+
+        self._codes.append(normalized)
+        self._raw_codes.append(code)
+        self._short_descs.append(short_desc)
+        self._long_descs.append(long_desc or "")
+        self._category_codes.append(sys.intern(category_code or ""))
+        self._lower_short_descs.append(short_desc.lower())
+        self._code_ids[normalized] = doc_id
+
+        tokens = set(TOKEN_PATTERN.findall(short_desc.lower()))
+        tokens.add(normalized.lower())
+        for token in tokens:
+            token = sys.intern(token)
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = array('I')
+            postings.append(doc_id)
+
+    def finalize(self) -> "InMemorySearchIndex":
+        """Sort the vocabulary for prefix lookups"""
+        self._vocabulary = sorted(self._postings)
+        return self
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "InMemorySearchIndex":
+        """Build the index from dicts with code, short_desc, long_desc and category_code"""
+        started = time.perf_counter()
+        index = cls()
+        for record in records:
+            index.add(record['code'], record['short_desc'], record['long_desc'], record['category_code'])
+        index.finalize()
+        logger.info(f"Built in-memory search index: {len(index)} codes, "
+                    f"{len(index._vocabulary)} tokens in {time.perf_counter() - started:.2f}s")
+        return index
+
+    @classmethod
+    def from_csv(cls, csv_path=DEFAULT_CSV_PATH) -> "InMemorySearchIndex":
+        """Build the index straight from the ICD codes CSV"""
+        return cls.from_records(iter_icd_records(csv_path))
+
+    def short_descriptions(self) -> List[str]:
+        return self._short_descs
+
+    def _matching_docs(self, term: str) -> set:
+        """Documents with a token starting with term (the index's take on CONTAINS)"""
+        if " " in term:
+            # Multi-word term: documents containing every word, then the exact phrase
+            words = TOKEN_PATTERN.findall(term)
+            docs = set.intersection(*(self._matching_docs(word) for word in words)) if words else set()
+            return {doc_id for doc_id in docs if term in self._lower_short_descs[doc_id]}
+        # Code tokens are indexed undotted, and description tokens never contain dots
+        term = term.replace(".", "")
+        docs = set()
+        start = bisect_left(self._vocabulary, term)
+        for position in range(start, len(self._vocabulary)):
+            token = self._vocabulary[position]
+            if not token.startswith(term):
+                break
+            docs.update(self._postings[token])
+        return docs
+
+    def search(self, search_text: str, search_terms: List[str], limit: int = 10) -> List[dict]:
+        """
+        Rank codes the same way as the Neo4j CONTAINS query: exact code match
+        (100), short description containing the whole search text (75), then
+        any term match (50), ties broken by code.
+        """
+        exact_code = self._normalize_code(search_text.strip())
+        lowered_text = search_text.lower()
+
+        candidates = set()
+        for term in search_terms:
+            candidates |= self._matching_docs(term.lower())
+        exact_id = self._code_ids.get(exact_code)
+        if exact_id is not None:
+            candidates.add(exact_id)
+
+        def relevance(doc_id):
+            if doc_id == exact_id:
+                return 100
+            if lowered_text and lowered_text in self._lower_short_descs[doc_id]:
+                return 75
+            return 50
+
+        ranked = nsmallest(limit, candidates, key=lambda doc_id: (-relevance(doc_id), self._codes[doc_id]))
+        return [
+            {
+                'code': self._raw_codes[doc_id],
+                'short_desc': self._short_descs[doc_id],
+                'long_desc': self._long_descs[doc_id],
+                'category_code': self._category_codes[doc_id]
+            }
+            for doc_id in ranked
+        ]
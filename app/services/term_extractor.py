@@ -0,0 +1,215 @@
+from bisect import bisect_left
+from collections import Counter, deque
+from typing import Dict, Iterable, List, Optional, Pattern, Sequence
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+# ICD-10 categories are a letter and two digits; only these have a letter in the third slot
+LETTER_CATEGORIES = ('C4A', 'C7A', 'C7B', 'D3A', 'M1A', 'Z3A')
+
+def code_pattern(lowercase: bool = False) -> Pattern:
+    """ICD-10 codes (J12, E11.9, S72.001A, C7B.01, undotted E119), upper- or lower-case"""
+    letters = 'a-z' if lowercase else 'A-Z'
+    categories = [category.lower() if lowercase else category for category in LETTER_CATEGORIES]
+    return re.compile(rf'\b(?:[{letters}]\d{{2}}|{"|".join(categories)})(?:\.?[0-9{letters}]{{1,4}})?\b')
+
+# ICD-10 codes typed into a query, kept whole and ahead of other terms
+CODE_PATTERN = code_pattern(lowercase=True)
+DEFAULT_MAX_TERMS = 8
+
+# Synonyms, abbreviations and code hints; phrase -> search terms. Extend or
+# override with a JSON file of the same shape (ICD_LEXICON_PATH).
+DEFAULT_LEXICON: Dict[str, List[str]] = {
+    'typhoid': ['typhoid', 'a01', 'fever'],
+    'pneumonia': ['pneumonia', 'j12', 'respiratory'],
+    'fever': ['fever', 'temperature'],
+    'respiratory': ['respiratory', 'breathing'],
+    'infection': ['infection', 'infectious'],
+    'viral': ['viral', 'virus'],
+    'high blood pressure': ['hypertension'],
+    'htn': ['hypertension'],
+    'heart attack': ['myocardial infarction'],
+    'mi': ['myocardial infarction'],
+    'chf': ['heart failure'],
+    'dm': ['diabetes'],
+    't2dm': ['type 2 diabetes'],
+    'type 2 diabetes': ['type 2 diabetes'],
+    'sugar': ['diabetes'],
+    'copd': ['chronic obstructive pulmonary'],
+    'uti': ['urinary tract infection'],
+    'urinary tract infection': ['urinary tract infection'],
+    'flu': ['influenza'],
+    'broken': ['fracture'],
+    'kidney': ['kidney', 'renal'],
+    'stroke': ['cerebral infarction'],
+    'blood clot': ['thrombosis', 'embolism'],
+    'tb': ['tuberculosis'],
+}
+
+# English function words plus the filler clinicians put around the findings
+STOPWORDS = frozenset("""
+a about after again against all also am an and any are as at be been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him
+his how i if in into is it its just me more most my no nor not now of off on once only or other our out over
+own same she should so some such than that the their them then there these they this those through to too
+under until up very was we were what when where which while who whom why will with would you your
+patient patients pt presents presenting complains complaining history hx reports reported noted shows
+diagnosed diagnosis likely possible probable suspected rule r o
+""".split())
+
+class _PhraseAutomaton:
+    """Aho-Corasick automaton over word sequences: one left-to-right pass finds every lexicon phrase"""
+
+    def __init__(self, phrases: Iterable[Sequence[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]  # phrase lengths ending at each state
+        for phrase in phrases:
+            self._add(phrase)
+        self._build_failure_links()
+
+    def _add(self, phrase: Sequence[str]) -> None:
+        state = 0
+        for word in phrase:
+            next_state = self._goto[state].get(word)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][word] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        if len(phrase) not in self._output[state]:
+            self._output[state].append(len(phrase))
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                candidate = self._goto[fail].get(word, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                self._output[next_state].extend(self._output[self._fail[next_state]])
+
+    def matches(self, words: Sequence[str]):
+        """Yield (start, end) word spans of every phrase occurrence"""
+        state = 0
+        for position, word in enumerate(words):
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            for length in self._output[state]:
+                yield position - length + 1, position + 1
+
+class TermExtractor:
+    """
+    Compiled query -> search terms extractor, built once per vocabulary.
+
+    Lexicon phrases (synonyms, abbreviations, multi-word conditions) and
+    frequent description bigrams are compiled into one phrase automaton.
+    Words outside any phrase are kept only if they are not stopwords and, when
+    a description vocabulary is loaded, prefix at least one word of it.
+    Code-shaped words (b12) are kept as codes only if their category is one
+    of codes, when those are given. Terms are ranked (codes typed in the query, lexicon expansions, phrases, then
+    rarer words first) and capped at max_terms.
+    """
+
+    def __init__(self, lexicon: Optional[Dict[str, List[str]]] = None,
+                 vocabulary: Optional[Dict[str, int]] = None, phrases: Iterable[str] = (),
+                 max_terms: int = DEFAULT_MAX_TERMS, stopwords=STOPWORDS, codes: Optional[Iterable[str]] = None):
+        self.lexicon = {self._normalize(phrase): terms for phrase, terms in (lexicon or DEFAULT_LEXICON).items()}
+        self.vocabulary = vocabulary or {}
+        self._sorted_vocabulary = sorted(self.vocabulary)
+        self.phrases = {self._normalize(phrase) for phrase in phrases} - set(self.lexicon)
+        self.max_terms = max_terms
+        self.categories = {code.replace(".", "").lower()[:3] for code in codes} if codes is not None else None
+        self.stopwords = stopwords
+        self._automaton = _PhraseAutomaton(
+            phrase.split() for phrase in list(self.lexicon) + sorted(self.phrases)
+        )
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " ".join(WORD_PATTERN.findall(text.lower()))
+
+    @staticmethod
+    def load_lexicon(path) -> Dict[str, List[str]]:
+        """DEFAULT_LEXICON extended/overridden by a JSON file of {phrase: [terms]}"""
+        with open(path, 'r', encoding='utf-8') as file:
+            lexicon = dict(DEFAULT_LEXICON)
+            lexicon.update(json.load(file))
+        return lexicon
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "TermExtractor":
+        """Extractor using ICD_LEXICON_PATH (if set) and ICD_MAX_SEARCH_TERMS"""
+        lexicon_path = os.getenv('ICD_LEXICON_PATH')
+        kwargs.setdefault('lexicon', cls.load_lexicon(lexicon_path) if lexicon_path else None)
+        kwargs.setdefault('max_terms', int(os.getenv('ICD_MAX_SEARCH_TERMS', DEFAULT_MAX_TERMS)))
+        return cls(**kwargs)
+
+    @classmethod
+    def from_descriptions(cls, descriptions: Iterable[str], min_phrase_count: int = 25,
+                          **kwargs) -> "TermExtractor":
+        """
+        Harvest the vocabulary (word -> number of descriptions containing it)
+        and recurring two-word phrases from ICD short descriptions
+        """
+        stopwords = kwargs.get('stopwords', STOPWORDS)
+        vocabulary = Counter()
+        bigrams = Counter()
+        for description in descriptions:
+            words = WORD_PATTERN.findall((description or "").lower())
+            vocabulary.update(set(words))
+            bigrams.update({
+                (first, second) for first, second in zip(words, words[1:])
+                if first not in stopwords and second not in stopwords and not first.isdigit()
+            })
+        phrases = [f"{first} {second}" for (first, second), count in bigrams.items() if count >= min_phrase_count]
+        logger.info(f"Harvested {len(vocabulary)} words and {len(phrases)} phrases for term extraction")
+        return cls.from_env(vocabulary=dict(vocabulary), phrases=phrases, **kwargs)
+
+    def _in_vocabulary(self, word: str) -> bool:
+        """True if word starts some description word (searches match by prefix/substring)"""
+        if not self._sorted_vocabulary:
+            return True
+        position = bisect_left(self._sorted_vocabulary, word)
+        return position < len(self._sorted_vocabulary) and self._sorted_vocabulary[position].startswith(word)
+
+    def extract(self, query: str) -> List[str]:
+        lowered = query.lower()
+        code_terms = [code for code in CODE_PATTERN.findall(lowered)
+                      if self.categories is None or code[:3] in self.categories]
+        code_words = set(WORD_PATTERN.findall(" ".join(code_terms)))
+        words = WORD_PATTERN.findall(lowered)
+
+        lexicon_terms: List[str] = []
+        phrase_terms: List[str] = []
+        covered = set()
+        for start, end in self._automaton.matches(words):
+            phrase = " ".join(words[start:end])
+            if phrase in self.lexicon:
+                lexicon_terms.extend(self.lexicon[phrase])
+            else:
+                phrase_terms.append(phrase)
+            covered.update(range(start, end))
+
+        word_terms = [
+            word for position, word in enumerate(words)
+            if position not in covered and word not in self.stopwords and word not in code_words
+            and len(word) > 2 and self._in_vocabulary(word)
+        ]
+        # Rarer words narrow the search most; unknown (prefix-only) words count as rare
+        word_terms.sort(key=lambda word: self.vocabulary.get(word, 0))
+
+        terms = list(dict.fromkeys(code_terms + lexicon_terms + phrase_terms + word_terms))
+        return terms[:self.max_terms]
@@ -0,0 +1,193 @@
+from app.database.icd_csv import DEFAULT_CSV_PATH, iter_icd_records
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import re
+import time
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+INDEX_FORMAT_VERSION = 1
+
+class HashedNgramVectorizer:
+    """
+    Stateless TF-IDF style vectorizer over hashed word unigrams and character
+    n-grams. Hashing uses crc32, so vectors are stable across processes and
+    can be persisted alongside the matrix.
+    """
+
+    def __init__(self, n_features: int = 512, ngram_range: Tuple[int, int] = (3, 4)):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self._word_cache: Dict[str, List[int]] = {}
+
+    def _word_features(self, word: str) -> List[int]:
+        features = self._word_cache.get(word)
+        if features is None:
+            low, high = self.ngram_range
+            grams = [f"w:{word}"]
+            padded = f"<{word}>"
+            for n in range(low, high + 1):
+                grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+            features = []
+            for gram in grams:
+                hashed = zlib.crc32(gram.encode("utf-8"))
+                index = hashed % self.n_features
+                features.append(index + 1 if hashed & 0x80000000 else -(index + 1))
+            self._word_cache[word] = features
+        return features
+
+    def features(self, text: str) -> List[int]:
+        """Signed feature ids (sign carries the hash's extra bit to reduce collisions)"""
+        features = []
+        for word in WORD_PATTERN.findall(text.lower()):
+            features.extend(self._word_features(word))
+        return features
+
+    def term_counts(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        features = np.asarray(self.features(text), dtype=np.int64)
+        if features.size:
+            np.add.at(vector, np.abs(features) - 1, np.sign(features).astype(np.float32))
+        return vector
+
+class VectorIndex:
+    """
+    Dense float32 matrix of L2-normalised hashed TF-IDF vectors, one row per
+    ICD code (short + long description). Saved as .npy files so later starts
+    memory-map the matrix instead of rebuilding it; queries are one mat-vec
+    product plus argpartition for the top k.
+    """
+
+    def __init__(self, vectorizer: HashedNgramVectorizer, matrix: np.ndarray, idf: np.ndarray, records: List[dict]):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.idf = idf
+        self.records = records
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @staticmethod
+    def _document_text(record: dict) -> str:
+        short_desc = record.get('short_desc') or ""
+        long_desc = record.get('long_desc') or ""
+        if long_desc == short_desc:
+            return short_desc
+        return f"{short_desc} {long_desc}"
+
+    @classmethod
+    def build(cls, records: Iterable[dict], n_features: int = 512) -> "VectorIndex":
+        """Vectorise records (dicts with code, short_desc, long_desc, category_code)"""
+        started = time.perf_counter()
+        records = list(records)
+        vectorizer = HashedNgramVectorizer(n_features=n_features)
+
+        rows, features = [], []
+        for row, record in enumerate(records):
+            document_features = vectorizer.features(cls._document_text(record))
+            rows.extend([row] * len(document_features))
+            features.extend(document_features)
+        rows = np.asarray(rows, dtype=np.int64)
+        features = np.asarray(features, dtype=np.int64)
+
+        matrix = np.zeros((len(records), n_features), dtype=np.float32)
+        np.add.at(matrix, (rows, np.abs(features) - 1), np.sign(features).astype(np.float32))
+
+        # Smoothed idf over hashed buckets, then sublinear tf and row normalisation
+        document_frequency = np.count_nonzero(matrix, axis=0).astype(np.float32)
+        idf = (np.log((1 + len(records)) / (1 + document_frequency)) + 1).astype(np.float32)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix)) * idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+
+        logger.info(f"Built vector index: {len(records)} codes x {n_features} dims "
+                    f"in {time.perf_counter() - started:.2f}s")
+        return cls(vectorizer, np.ascontiguousarray(matrix, dtype=np.float32), idf, records)
+
+    @classmethod
+    def from_csv(cls, csv_path=DEFAULT_CSV_PATH, n_features: int = 512) -> "VectorIndex":
+        return cls.build(iter_icd_records(csv_path), n_features=n_features)
+
+    def save(self, directory, dataset_version: Optional[str] = None) -> None:
+        """Write the index to directory, stamped with the dataset version it was built from"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "vectors.npy", self.matrix)
+        np.save(directory / "idf.npy", self.idf)
+        with open(directory / "codes.json", "w", encoding="utf-8") as file:
+            json.dump(self.records, file)
+        with open(directory / "meta.json", "w", encoding="utf-8") as file:
+            json.dump({
+                'format_version': INDEX_FORMAT_VERSION,
+                'n_features': self.vectorizer.n_features,
+                'ngram_range': list(self.vectorizer.ngram_range),
+                'size': len(self.records),
+                'dataset_version': dataset_version
+            }, file)
+
+    @classmethod
+    def load(cls, directory) -> "VectorIndex":
+        """Memory-map a saved index; pages are shared between processes via the OS cache"""
+        directory = Path(directory)
+        with open(directory / "meta.json", "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        if meta.get('format_version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported vector index format in {directory}")
+        with open(directory / "codes.json", "r", encoding="utf-8") as file:
+            records = json.load(file)
+        vectorizer = HashedNgramVectorizer(meta['n_features'], tuple(meta['ngram_range']))
+        matrix = np.load(directory / "vectors.npy", mmap_mode="r")
+        idf = np.load(directory / "idf.npy")
+        return cls(vectorizer, matrix, idf, records)
+
+    @staticmethod
+    def saved_version(directory) -> Optional[str]:
+        """Dataset version stamped on the index saved in directory (None if there is none)"""
+        meta_path = Path(directory) / "meta.json"
+        if not meta_path.exists():
+            return None
+        with open(meta_path, "r", encoding="utf-8") as file:
+            return json.load(file).get('dataset_version')
+
+    @classmethod
+    def load_or_build(cls, directory, records_factory, n_features: int = 512,
+                      dataset_version: Optional[str] = None) -> "VectorIndex":
+        """
+        Load the index from directory, building and saving it first if it
+        doesn't exist or was built from a different dataset version
+        """
+        directory = Path(directory)
+        if (directory / "meta.json").exists():
+            saved_version = cls.saved_version(directory)
+            if saved_version == dataset_version:
+                return cls.load(directory)
+            logger.info(f"Vector index in {directory} is for dataset version {saved_version}, "
+                        f"not {dataset_version}; rebuilding")
+        index = cls.build(records_factory(), n_features=n_features)
+        index.save(directory, dataset_version=dataset_version)
+        return cls.load(directory)
+
+    def query_vector(self, text: str) -> Optional[np.ndarray]:
+        counts = self.vectorizer.term_counts(text)
+        vector = np.sign(counts) * np.log1p(np.abs(counts)) * self.idf
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return (vector / norm).astype(np.float32)
+
+    def search(self, text: str, limit: int = 10) -> List[Tuple[dict, float]]:
+        """Top `limit` records by cosine similarity, best first"""
+        vector = self.query_vector(text)
+        if vector is None or not self.records:
+            return []
+        scores = self.matrix @ vector
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(self.records[i], float(scores[i])) for i in top if scores[i] > 0]
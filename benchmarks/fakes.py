@@ -0,0 +1,378 @@
+"""
+Offline stand-ins for the Neo4j driver and the OpenAI clients.
+
+The fake driver answers the queries the app actually sends (matched against
+the query constants in app.database / app.services) from an in-memory graph,
+sleeping for a configurable round-trip latency per query. It is meant for
+relative measurements of our own code paths, not for predicting Neo4j's
+server-side cost.
+"""
+from app.database import neo4j_client
+from app.services import icd_service
+from app.services.search_index import InMemorySearchIndex
+from types import SimpleNamespace
+import asyncio
+import re
+import threading
+import time
+
+LUCENE_BOOST = re.compile(r'\^\d+')
+LUCENE_WORD = re.compile(r'[a-z0-9]+')
+
+class FakeRecord(dict):
+    """dict with the neo4j.Record accessors the app uses"""
+
+    def data(self):
+        return dict(self)
+
+class FakeResult:
+    def __init__(self, records):
+        self._records = [FakeRecord(record) for record in records]
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def consume(self):
+        return SimpleNamespace(counters=SimpleNamespace(), profile=None)
+
+class FakeGraph:
+    """In-memory ICDCode/Category/Dataset store behind the fake driver"""
+
+    def __init__(self):
+        self.codes = {}  # code -> node properties
+        self.categories = {}  # code -> category name (CONTAINS)
+        self.children = {}  # parent code -> set of child codes (HAS_SUBCATEGORY)
+        self.retired = {}  # code -> node properties (RetiredICDCode)
+        self.dataset_version = None
+        self.queries = 0
+        self._lock = threading.Lock()
+        self._index = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def search_index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = InMemorySearchIndex.from_records(
+                    {'code': code, 'short_desc': node.get('short_desc'), 'long_desc': node.get('long_desc'),
+                     'category_code': node.get('category_code')}
+                    for code, node in self.codes.items()
+                )
+            return self._index
+
+    # Writes
+
+    def upsert(self, rows):
+        with self._lock:
+            for row in rows:
+                node = self.codes.setdefault(row['full_code'], {'code': row['full_code']})
+                node.update({
+                    'category_code': row['category_code'],
+                    'category_name': row['category_name'],
+                    'subcategory': row['subcategory'],
+                    'short_desc': row['short_description'],
+                    'long_desc': row['long_description'],
+                    'fingerprint': row['fingerprint']
+                })
+            self._index = None
+        return []
+
+    def set_hierarchy(self, rows):
+        with self._lock:
+            for row in rows:
+                node = self.codes.get(row['code'])
+                if node is None:
+                    continue
+                old_parent = node.get('parent_code')
+                if old_parent is not None:
+                    self.children.get(old_parent, set()).discard(row['code'])
+                node.update({'parent_code': row['parent_code'], 'ancestors': row['ancestors'],
+                             'depth': row['depth']})
+                if row['parent_code'] in self.codes:
+                    self.children.setdefault(row['parent_code'], set()).add(row['code'])
+        return []
+
+    def retire(self, codes):
+        with self._lock:
+            for code in codes:
+                node = self.codes.pop(code, None)
+                if node is None:
+                    continue
+                self.retired[code] = node
+                self.categories.pop(code, None)
+                self.children.pop(code, None)
+                for children in self.children.values():
+                    children.discard(code)
+            self._index = None
+        return []
+
+    def set_categories(self, rows):
+        with self._lock:
+            for row in rows:
+                if row['code'] in self.codes:
+                    self.categories[row['code']] = row['category_name']
+        return []
+
+    # Reads
+
+    def search(self, search_text, search_terms, limit):
+        return [
+            {'result': result, 'relevance': 1.0}
+            for result in self.search_index().search(search_text, search_terms, limit)
+        ]
+
+    def code_details_many(self, lookups):
+        records = []
+        for lookup in lookups:
+            for candidate in lookup['candidates']:
+                node = self.codes.get(candidate)
+                if node is not None:
+                    category = self.categories.get(candidate)
+                    records.append({'position': lookup['position'], 'code': dict(node),
+                                    'category': {'name': category} if category else None})
+                    break
+        return records
+
+    def category_page(self, category_code, after, limit):
+        codes = sorted(code for code, node in self.codes.items()
+                       if node.get('category_code') == category_code and code > after)[:limit]
+        records = []
+        for code in codes:
+            node = self.codes[code]
+            parent = self.codes.get(node.get('parent_code')) or {}
+            records.append({'code_info': {
+                'code': code, 'short_desc': node.get('short_desc'), 'long_desc': node.get('long_desc'),
+                'parent_code': parent.get('code', ''), 'parent_desc': parent.get('short_desc', ''),
+                'depth': node.get('depth', 0)
+            }})
+        return records
+
+    @staticmethod
+    def fulltext_terms(fulltext_query):
+        words = LUCENE_WORD.findall(LUCENE_BOOST.sub('', fulltext_query.lower()))
+        return [word for word in dict.fromkeys(words) if word not in ('code', 'or')]
+
+    def search_many(self, searches, limit, fulltext):
+        records = []
+        for search in searches:
+            if fulltext:
+                terms = self.fulltext_terms(search['fulltext_query'])
+            else:
+                terms = search['search_terms']
+            results = self.search_index().search(search['search_text'], terms, limit)
+            records.append({'position': search['position'], 'results': results})
+        return records
+
+class FakeTransaction:
+    def __init__(self, graph, latency):
+        self.graph = graph
+        self.latency = latency
+
+    def run(self, query, parameters=None, **kwargs):
+        params = dict(parameters or {}, **kwargs)
+        query = query[len("PROFILE "):] if query.startswith("PROFILE ") else query
+        graph = self.graph
+        graph.queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if query.lstrip().startswith(("CREATE CONSTRAINT", "CREATE INDEX", "CREATE FULLTEXT", "CALL db.awaitIndexes")):
+            records = []
+        elif "MATCH (dataset:Dataset" in query:
+            records = [{'version': graph.dataset_version}] if graph.dataset_version else []
+        elif "MERGE (dataset:Dataset" in query:
+            graph.dataset_version = params['version']
+            records = []
+        elif "MERGE (code:ICDCode" in query:
+            records = graph.upsert(params['rows'] if 'rows' in params else [params])
+        elif "SET code:RetiredICDCode" in query:
+            records = graph.retire(params['codes'])
+        elif query == neo4j_client.HIERARCHY_QUERY:
+            records = graph.set_hierarchy(params['rows'])
+        elif query == neo4j_client.CATEGORY_MEMBERSHIP_QUERY:
+            records = graph.set_categories(params['rows'])
+        elif query == neo4j_client.HIERARCHY_FAMILY_QUERY:
+            roots = tuple(params['roots'])
+            records = [{'code': code, 'category_code': node.get('category_code'),
+                        'category_name': node.get('category_name'), 'parent_code': node.get('parent_code'),
+                        'ancestors': node.get('ancestors') or []}
+                       for code, node in graph.codes.items() if code.startswith(roots)]
+        elif query == neo4j_client.HIERARCHY_CATEGORY_LINK_QUERY:
+            keys = set(params['keys'])
+            records = [{'code': code} for code, node in graph.codes.items() if node.get('category_code') in keys]
+        elif query == neo4j_client.HIERARCHY_ANCHOR_QUERY:
+            records = [{'code': code, 'ancestors': graph.codes[code].get('ancestors') or []}
+                       for code in params['candidates'] if code in graph.codes]
+        elif "code.fingerprint as fingerprint" in query:
+            records = [{'code': code, 'fingerprint': node.get('fingerprint')} for code, node in graph.codes.items()]
+        elif "code.category_name as category_name" in query:
+            records = [{'code': code, 'category_code': node.get('category_code'),
+                        'category_name': node.get('category_name')} for code, node in graph.codes.items()]
+        elif "code.short_desc as short_desc" in query:
+            records = [{'code': code, 'short_desc': node.get('short_desc'), 'long_desc': node.get('long_desc'),
+                        'category_code': node.get('category_code')} for code, node in graph.codes.items()]
+        elif query == icd_service.SEARCH_FULLTEXT_QUERY:
+            records = graph.search('', graph.fulltext_terms(params['fulltext_query']), params['limit'])
+        elif query == icd_service.SEARCH_CONTAINS_QUERY:
+            records = graph.search(params['search_text'], params['search_terms'], params['limit'])
+        elif query == icd_service.SEARCH_MANY_FULLTEXT_QUERY:
+            records = graph.search_many(params['searches'], params['limit'], fulltext=True)
+        elif query == icd_service.SEARCH_MANY_CONTAINS_QUERY:
+            records = graph.search_many(params['searches'], params['limit'], fulltext=False)
+        elif query == icd_service.CATEGORY_CODES_QUERY:
+            records = graph.category_page(params['category_code'], "", None)
+        elif query == icd_service.CATEGORY_PAGE_QUERY:
+            records = graph.category_page(params['category_code'], params['after'], params['limit'])
+        elif query == icd_service.CODE_DETAILS_MANY_QUERY:
+            records = graph.code_details_many(params['lookups'])
+        elif query == icd_service.CODE_DETAILS_QUERY:
+            records = [{key: value for key, value in record.items() if key != 'position'}
+                       for record in graph.code_details_many([{'position': 0, 'candidates': [params['code']]}])]
+        else:
+            raise NotImplementedError(f"FakeGraph does not understand query: {query.strip()[:80]}")
+        return FakeResult(records)
+
+class FakeSession:
+    def __init__(self, graph, latency):
+        self._tx = FakeTransaction(graph, latency)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, query, parameters=None, **kwargs):
+        return self._tx.run(query, parameters, **kwargs)
+
+    def execute_read(self, work, *args, **kwargs):
+        return work(self._tx, *args, **kwargs)
+
+    def execute_write(self, work, *args, **kwargs):
+        return work(self._tx, *args, **kwargs)
+
+    def close(self):
+        pass
+
+class FakeDriver:
+    """Stand-in for neo4j.Driver; latency_ms is added to every query as a round trip"""
+
+    def __init__(self, graph=None, latency_ms: float = 0.0):
+        self.graph = graph if graph is not None else FakeGraph()
+        self.latency = latency_ms / 1000
+
+    def session(self, **config):
+        return FakeSession(self.graph, self.latency)
+
+    def verify_connectivity(self):
+        return None
+
+    def close(self):
+        pass
+
+class FakeAsyncResult:
+    def __init__(self, result):
+        self._records = list(result)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for record in self._records:
+            yield record
+
+class FakeAsyncTransaction:
+    def __init__(self, graph, latency):
+        self._tx = FakeTransaction(graph, 0)
+        self.latency = latency
+
+    async def run(self, query, parameters=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return FakeAsyncResult(self._tx.run(query, parameters, **kwargs))
+
+class FakeAsyncSession:
+    def __init__(self, graph, latency):
+        self._tx = FakeAsyncTransaction(graph, latency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def execute_read(self, work, *args, **kwargs):
+        return await work(self._tx, *args, **kwargs)
+
+    async def close(self):
+        pass
+
+class FakeAsyncDriver:
+    """Stand-in for neo4j.AsyncDriver over the same in-memory graph; latency is awaited, not slept"""
+
+    def __init__(self, graph=None, latency_ms: float = 0.0):
+        self.graph = graph if graph is not None else FakeGraph()
+        self.latency = latency_ms / 1000
+
+    def session(self, **config):
+        return FakeAsyncSession(self.graph, self.latency)
+
+    async def close(self):
+        pass
+
+def _completion_text(messages):
+    """Deterministic explanation citing the first codes from the system prompt"""
+    codes = re.findall(r'- ([A-Z][0-9][0-9A-Z.]*):', messages[0]['content'])[:3]
+    cited = ", ".join(codes) or "no codes"
+    return f"Based on the database results, the most relevant codes are {cited}. " * 3
+
+def _usage(messages, completion):
+    prompt_tokens = sum(len(message['content']) for message in messages) // 4
+    completion_tokens = len(completion) // 4
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           total_tokens=prompt_tokens + completion_tokens)
+
+def _stream_chunks(completion, chunk_size=16):
+    for start in range(0, len(completion), chunk_size):
+        delta = SimpleNamespace(content=completion[start:start + chunk_size])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+class _StubCompletions:
+    def __init__(self, latency, token_latency):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.calls = 0
+
+    def create(self, model, messages, temperature=None, stream=False, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        completion = _completion_text(messages)
+        if stream:
+            def chunks():
+                for chunk in _stream_chunks(completion):
+                    time.sleep(self.token_latency)
+                    yield chunk
+            return chunks()
+        message = SimpleNamespace(content=completion)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=_usage(messages, completion))
+
+class _AsyncStubCompletions(_StubCompletions):
+    async def create(self, model, messages, temperature=None, stream=False, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        completion = _completion_text(messages)
+        message = SimpleNamespace(content=completion)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=_usage(messages, completion))
+
+class StubOpenAI:
+    """Stand-in for openai.OpenAI: answers after latency_ms, streaming chunks token_latency_ms apart"""
+
+    def __init__(self, latency_ms: float = 300.0, token_latency_ms: float = 5.0):
+        self.chat = SimpleNamespace(completions=_StubCompletions(latency_ms / 1000, token_latency_ms / 1000))
+
+class AsyncStubOpenAI:
+    """Stand-in for openai.AsyncOpenAI (non-streaming)"""
+
+    def __init__(self, latency_ms: float = 300.0, token_latency_ms: float = 5.0):
+        self.chat = SimpleNamespace(completions=_AsyncStubCompletions(latency_ms / 1000, token_latency_ms / 1000))
@@ -0,0 +1,252 @@
+"""
+Offline benchmark suite: load throughput, snapshot export and lookups,
+search latency per mode, memory peak and end-to-end assistant latency at
+several concurrency levels, all against the fake Neo4j driver and stub
+OpenAI client in benchmarks.fakes.
+
+    python benchmarks/run_benchmarks.py --rows 100000 --output before.json
+    python benchmarks/run_benchmarks.py --rows 100000 --output after.json --compare before.json
+"""
+import argparse
+import json
+import logging
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add project root (for app/ and benchmarks/) and scripts/ to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / 'scripts'))
+
+from app.database.neo4j_client import Neo4jICD
+from app.database.snapshot import write_snapshot
+from app.services.batch_coding import StageTimer
+from app.services.icd_service import ICDService
+from app.services.llm_service import MedicalCodingAssistant
+from benchmarks.fakes import AsyncStubOpenAI, FakeDriver, FakeGraph, StubOpenAI
+from benchmarks.synthetic_data import sample_queries, write_icd_csv
+from export_snapshot import csv_records
+from load_icd_data import load_icd_data
+
+SEARCH_MODES = ("fulltext", "contains", "memory")
+DEFAULT_CONCURRENCY = (1, 4, 16, 64)
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def make_service(driver, enable_cache=False) -> ICDService:
+    db_client = Neo4jICD(None, None, None, driver=driver)
+    return ICDService(None, None, None, db_client=db_client, enable_cache=enable_cache)
+
+def bench_load(csv_path, work_dir, driver, batch_size, workers) -> dict:
+    started = time.perf_counter()
+    load_icd_data(
+        batch_size=batch_size,
+        workers=workers,
+        csv_path=csv_path,
+        state_file=Path(work_dir) / 'load.state.json',
+        reject_file=Path(work_dir) / 'rejected.csv',
+        neo4j_client=Neo4jICD(None, None, None, driver=driver)
+    )
+    elapsed = time.perf_counter() - started
+    graph = driver.graph
+    return {
+        'rows_loaded': len(graph),
+        'codes_with_parent': sum(1 for node in graph.codes.values() if node.get('parent_code')),
+        'elapsed_s': round(elapsed, 3),
+        'rows_per_s': round(len(graph) / elapsed, 1) if elapsed > 0 else 0.0,
+        'queries': graph.queries,
+        'batch_size': batch_size,
+        'workers': workers,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def bench_search(service, queries) -> dict:
+    service.driver.graph.search_index()  # build the stand-in's own index outside the timings
+    results = {}
+    for mode in SEARCH_MODES:
+        timer = StageTimer()
+        started = time.perf_counter()
+        for query in queries:
+            timer.time(mode, lambda: service.search_by_description(query, mode=mode))
+        elapsed = time.perf_counter() - started
+        results[mode] = dict(timer.summary()[mode], qps=round(len(queries) / elapsed, 1))
+
+    # Repeated queries through the result cache (hit path)
+    cached_service = make_service(service.driver, enable_cache=True)
+    for query in queries:
+        cached_service.search_by_description(query)
+    timer = StageTimer()
+    for query in queries:
+        timer.time('cached', lambda: cached_service.search_by_description(query))
+    results['cached'] = dict(timer.summary()['cached'], cache=cached_service.cache_stats()['memory'])
+    return results
+
+def bench_memory_index(service) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = service.load_search_index()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'codes': len(index),
+        'build_s': round(elapsed, 3),
+        'build_peak_mb': round(peak / (1024 * 1024), 1),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def bench_autocomplete(service, queries) -> dict:
+    started = time.perf_counter()
+    service.load_autocomplete_index()
+    build_s = round(time.perf_counter() - started, 3)
+    # Every keystroke of every query, as a typeahead box would send them
+    prefixes = [query[:length] for query in queries for length in range(1, len(query) + 1)]
+    timer = StageTimer()
+    for prefix in prefixes:
+        timer.time('autocomplete', lambda: service.autocomplete(prefix))
+    return dict(timer.summary()['autocomplete'], build_s=build_s, prefixes=len(prefixes))
+
+def bench_snapshot(csv_path, work_dir, queries) -> dict:
+    """Export a snapshot from the CSV, then time opening it and serving lookups from it"""
+    records = csv_records(csv_path)
+    started = time.perf_counter()
+    path = write_snapshot(Path(work_dir) / 'codes.snapshot', records)
+    write_s = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    service = ICDService.from_snapshot(path)
+    open_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    codes = [record['code'] for record in records[::max(1, len(records) // len(queries))]][:len(queries)]
+    timer = StageTimer()
+    for code in codes:
+        timer.time('code_details', lambda: service.get_code_details(code))
+        timer.time('disease_info', lambda: service.get_disease_info(code))
+    summary = timer.summary()
+    service.close()
+    return {
+        'write_s': write_s,
+        'size_mb': round(path.stat().st_size / (1024 * 1024), 2),
+        'open_ms': open_ms,
+        'code_details': summary['code_details'],
+        'disease_info': summary['disease_info']
+    }
+
+def bench_assistant(driver, queries, concurrency_levels, llm_latency_ms) -> dict:
+    results = {}
+    for concurrency in concurrency_levels:
+        # Fresh service and assistant per level so no level benefits from another's caches
+        assistant = MedicalCodingAssistant(
+            make_service(driver),
+            client=StubOpenAI(latency_ms=llm_latency_ms),
+            async_client=AsyncStubOpenAI(latency_ms=llm_latency_ms)
+        )
+        timer = StageTimer()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda query: timer.time('process_query', lambda: assistant.process_query(query)),
+                          queries))
+        elapsed = time.perf_counter() - started
+        summary = timer.summary()['process_query']
+        results[str(concurrency)] = dict(
+            summary,
+            queries_per_s=round(len(queries) / elapsed, 2),
+            llm_calls=assistant.client.chat.completions.calls
+        )
+    return results
+
+def flatten(report, prefix="") -> dict:
+    values = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+def compare(report, baseline_path) -> None:
+    """Print every numeric metric that differs from a previous run"""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = flatten(json.load(file)['results'])
+    current = flatten(report['results'])
+    print(f"\nChanges against {baseline_path}:")
+    for metric in sorted(set(baseline) & set(current)):
+        before, after = baseline[metric], current[metric]
+        if before != after:
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"  {metric}: {before} -> {after} ({change})")
+
+def run(args) -> dict:
+    queries = sample_queries(args.queries)
+    report = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rows': args.rows,
+            'queries': args.queries,
+            'neo4j_latency_ms': args.neo4j_latency_ms,
+            'llm_latency_ms': args.llm_latency_ms
+        },
+        'results': {}
+    }
+    results = report['results']
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        started = time.perf_counter()
+        csv_path = write_icd_csv(Path(work_dir) / 'codes.csv', args.rows)
+        results['generate_csv_s'] = round(time.perf_counter() - started, 3)
+
+        driver = FakeDriver(FakeGraph(), latency_ms=args.neo4j_latency_ms)
+        results['load'] = bench_load(csv_path, work_dir, driver, args.batch_size, args.workers)
+        results['snapshot'] = bench_snapshot(csv_path, work_dir, queries)
+
+    service = make_service(driver)
+    results['memory_index'] = bench_memory_index(service)
+    results['search'] = bench_search(service, queries)
+    results['autocomplete'] = bench_autocomplete(service, queries)
+    if not args.skip_assistant:
+        results['assistant'] = bench_assistant(
+            driver, queries[:args.assistant_queries], args.concurrency, args.llm_latency_ms
+        )
+    results['peak_rss_mb'] = peak_rss_mb()
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for loading, search and the assistant")
+    parser.add_argument('--rows', type=int, default=10000, help="Synthetic codes to generate (10k-1M)")
+    parser.add_argument('--queries', type=int, default=500, help="Search queries per mode")
+    parser.add_argument('--assistant-queries', type=int, default=200,
+                        help="Queries sent to the assistant at each concurrency level")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=list(DEFAULT_CONCURRENCY))
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--neo4j-latency-ms', type=float, default=1.0, help="Simulated round trip per query")
+    parser.add_argument('--llm-latency-ms', type=float, default=300.0, help="Simulated completion latency")
+    parser.add_argument('--skip-assistant', action='store_true')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="Earlier results JSON to diff against")
+    parser.add_argument('--verbose', action='store_true', help="Keep the app's INFO logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    report = run(args)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(json.dumps(report['results'], indent=2))
+    print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(report, args.compare)
@@ -0,0 +1,92 @@
+"""
+Synthetic ICD-10 style CSV for benchmarks, in the same six-column layout as
+data/codes.csv (category_code, subcategory, code, short, long, category name).
+
+Codes follow the real shape - a three-character category (A00) with up to
+three further characters (A00.0, A00.01, A00.012) - so the hierarchy pass has
+parents to resolve, and descriptions are drawn from a small medical vocabulary
+so searches hit realistic posting-list sizes. Output is deterministic per seed.
+"""
+from pathlib import Path
+from string import ascii_uppercase
+from typing import Iterator, List, Tuple
+import csv
+import random
+
+CONDITIONS = [
+    "fever", "infection", "pneumonia", "bronchitis", "diabetes", "hypertension", "fracture",
+    "sprain", "contusion", "laceration", "ulcer", "neoplasm", "anemia", "asthma", "arthritis",
+    "dermatitis", "gastritis", "hepatitis", "nephropathy", "neuropathy", "retinopathy",
+    "sepsis", "abscess", "cellulitis", "obstruction", "hemorrhage", "embolism", "stenosis",
+    "insufficiency", "dislocation", "burn", "poisoning", "typhoid", "cholera", "influenza"
+]
+SITES = [
+    "lung", "kidney", "liver", "heart", "stomach", "skin", "bone", "knee", "hip", "shoulder",
+    "wrist", "ankle", "eye", "ear", "brain", "spine", "colon", "bladder", "pancreas", "thyroid",
+    "artery", "vein", "respiratory tract", "urinary tract", "lower limb", "upper limb"
+]
+QUALIFIERS = [
+    "acute", "chronic", "viral", "bacterial", "unspecified", "recurrent", "severe", "mild",
+    "congenital", "traumatic", "primary", "secondary", "left", "right", "bilateral"
+]
+CATEGORY_NAMES = [
+    "Infectious diseases", "Neoplasms", "Blood diseases", "Endocrine disorders", "Mental disorders",
+    "Nervous system", "Eye and adnexa", "Circulatory system", "Respiratory system", "Digestive system",
+    "Skin diseases", "Musculoskeletal system", "Genitourinary system", "Injury and poisoning"
+]
+
+def iter_codes() -> Iterator[Tuple[str, str, str]]:
+    """(category_code, subcategory, undotted code), parents before children; ~1.3M codes in total"""
+    for letter in ascii_uppercase:
+        for number in range(100):
+            category = f"{letter}{number:02d}"
+            yield category, "", category
+            for fourth in range(10):
+                yield category, str(fourth), f"{category}{fourth}"
+                for fifth in range(10):
+                    yield category, str(fourth), f"{category}{fourth}{fifth}"
+                    for sixth in range(4):
+                        yield category, str(fourth), f"{category}{fourth}{fifth}{sixth}"
+
+def _descriptions(rng: random.Random) -> Tuple[str, str]:
+    condition = rng.choice(CONDITIONS)
+    site = rng.choice(SITES)
+    qualifier = rng.choice(QUALIFIERS)
+    short_desc = f"{qualifier.capitalize()} {condition} of {site}"
+    long_desc = f"{short_desc}, {rng.choice(QUALIFIERS)} {rng.choice(CONDITIONS)}"
+    return short_desc, long_desc
+
+def generate_rows(rows: int, seed: int = 42) -> Iterator[List[str]]:
+    """The first `rows` synthetic CSV rows"""
+    rng = random.Random(seed)
+    for count, (category, subcategory, code) in enumerate(iter_codes()):
+        if count >= rows:
+            return
+        short_desc, long_desc = _descriptions(rng)
+        category_name = CATEGORY_NAMES[ascii_uppercase.index(category[0]) % len(CATEGORY_NAMES)]
+        yield [category, subcategory, code, short_desc, long_desc, category_name]
+
+def write_icd_csv(path, rows: int, seed: int = 42) -> Path:
+    """Write a synthetic codes CSV with `rows` rows and return its path"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        csv.writer(file).writerows(generate_rows(rows, seed))
+    return path
+
+def sample_queries(count: int, seed: int = 7) -> List[str]:
+    """Free-text clinical queries in the style users type into the assistant"""
+    rng = random.Random(seed)
+    templates = [
+        "{qualifier} {condition}",
+        "patient with {qualifier} {condition} of the {site}",
+        "{condition} {site}",
+        "{qualifier} {condition} with {condition2}"
+    ]
+    return [
+        rng.choice(templates).format(
+            qualifier=rng.choice(QUALIFIERS), condition=rng.choice(CONDITIONS),
+            condition2=rng.choice(CONDITIONS), site=rng.choice(SITES)
+        )
+        for _ in range(count)
+    ]
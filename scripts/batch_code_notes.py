@@ -0,0 +1,55 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from app.services.batch_coding import BatchCoder
+from app.services.icd_service import ICDService
+from app.services.llm_service import MedicalCodingAssistant
+from app.services.metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(description="Assign ICD-10 codes to a batch of clinical notes")
+    parser.add_argument('input', help="JSONL ({\"id\", \"text\"}) or CSV (id, text columns) of notes")
+    parser.add_argument('output', help="JSONL file results are appended to; rerun to resume")
+    parser.add_argument('--workers', type=int, default=8, help="Concurrent LLM calls")
+    parser.add_argument('--rps', type=float, default=5.0, help="Max LLM requests per second")
+    parser.add_argument('--retries', type=int, default=4, help="Retries per LLM call")
+    parser.add_argument('--lookup-batch-size', type=int, default=50,
+                        help="Searches sent to Neo4j per multi-search query")
+    parser.add_argument('--limit', type=int, default=10, help="Codes retrieved per note")
+    parser.add_argument('--metrics', help="Write stage metrics here when done (.prom for Prometheus text, else JSON)")
+    args = parser.parse_args()
+
+    icd_service = ICDService(
+        uri=os.getenv("NEO4J_URI", "neo4j://localhost:7687"),
+        user=os.getenv("NEO4J_USER", "neo4j"),
+        password=os.getenv("NEO4J_PASSWORD"),
+        metrics=metrics
+    )
+    try:
+        coder = BatchCoder(
+            MedicalCodingAssistant(icd_service),
+            max_workers=args.workers,
+            requests_per_second=args.rps,
+            max_retries=args.retries,
+            lookup_batch_size=args.lookup_batch_size,
+            limit=args.limit
+        )
+        report = coder.run(args.input, args.output)
+        print(json.dumps(report, indent=2))
+        if args.metrics:
+            icd_service.metrics.write(args.metrics)
+    finally:
+        icd_service.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from app.database.icd_csv import iter_icd_rows
+from app.database.snapshot import write_snapshot
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_SNAPSHOT_PATH = project_root / 'data' / 'icd10.snapshot'
+
+# Category names come from the CONTAINS edge written by the hierarchy pass
+EXPORT_QUERY = """
+MATCH (code:ICDCode)
+OPTIONAL MATCH (category:Category)-[:CONTAINS]->(code)
+RETURN code.code as code,
+       code.short_desc as short_desc,
+       code.long_desc as long_desc,
+       code.category_code as category_code,
+       COALESCE(category.name, code.category_name) as category_name,
+       code.subcategory as subcategory
+"""
+
+def neo4j_records():
+    """Every code in Neo4j, plus the dataset version to stamp the snapshot with"""
+    from app.database.neo4j_client import Neo4jICD
+
+    client = Neo4jICD(
+        os.getenv("NEO4J_URI", "neo4j://localhost:7687"),
+        os.getenv("NEO4J_USER", "neo4j"),
+        os.getenv("NEO4J_PASSWORD")
+    )
+    try:
+        records = [record.data() for record in client.stream(EXPORT_QUERY, fetch_size=10000)]
+        return records, client.get_dataset_version()
+    finally:
+        client.close()
+
+def csv_records(csv_path):
+    return [
+        {
+            'code': row['full_code'],
+            'short_desc': row['short_description'],
+            'long_desc': row['long_description'],
+            'category_code': row['category_code'],
+            'category_name': row['category_name'],
+            'subcategory': row['subcategory']
+        }
+        for row in iter_icd_rows(csv_path)
+    ]
+
+def export_snapshot(output=DEFAULT_SNAPSHOT_PATH, csv_path=None, dataset_version=None) -> Path:
+    """Write a snapshot of the ICD graph from Neo4j, or straight from a codes CSV"""
+    if csv_path:
+        records = csv_records(csv_path)
+    else:
+        records, graph_version = neo4j_records()
+        dataset_version = dataset_version or graph_version
+    return write_snapshot(output, records, dataset_version=dataset_version)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the ICD-10 graph to a memory-mappable snapshot file")
+    parser.add_argument('--output', default=str(DEFAULT_SNAPSHOT_PATH), help="Snapshot file to write")
+    parser.add_argument('--csv', help="Build from an ICD codes CSV instead of Neo4j")
+    parser.add_argument('--dataset-version', help="Version stamp (defaults to the version recorded in Neo4j)")
+    args = parser.parse_args()
+    path = export_snapshot(output=args.output, csv_path=args.csv, dataset_version=args.dataset_version)
+    print(f"Snapshot written to {path}")
@@ -1,81 +1,368 @@
+import argparse
 import csv
+import itertools
+import json
 import os
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
 # Add project root to Python path
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
+from app.database.icd_csv import DEFAULT_CSV_PATH, process_icd_row, row_fingerprint
 from app.database.neo4j_client import Neo4jICD
 from dotenv import load_dotenv
+from neo4j.exceptions import ClientError
 
 load_dotenv()
 
-def format_icd_code(code: str) -> str:
-    """Format ICD code with proper dots (e.g., A0109 -> A01.09)"""
-    if len(code) <= 3:
-        return code
-    return f"{code[:3]}.{code[3:]}"
-
-def process_icd_row(row):
-    """Process a row from the CSV into structured data"""
-    return {
-        'category_code': row[0],
-        'subcategory': row[1],
-        'full_code': format_icd_code(row[2]),
-        'short_description': row[3],
-        'long_description': row[4],
-        'category_name': row[5]
-    }
-
-def load_icd_data():
-    # Get the correct path to data/codes.csv
-    current_dir = Path(__file__).parent
-    csv_path = current_dir.parent / 'data' / 'codes.csv'
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_WORKERS = 4
+DEFAULT_STATE_FILE = project_root / 'data' / '.load_icd_data.state.json'
+DEFAULT_REJECT_FILE = project_root / 'data' / 'rejected_rows.csv'
+PROGRESS_INTERVAL = 5000
+# Seconds to wait for new indexes to come online before the import starts querying them
+INDEX_AWAIT_TIMEOUT = 300
+
+# Errors caused by the data itself; anything else (e.g. the database going away
+# after the driver's retries) aborts the import so the chunk is not checkpointed
+ROW_ERRORS = (ClientError, KeyError, TypeError, ValueError)
+
+def read_chunks(csv_path, chunk_size):
+    """Stream the CSV as (chunk_index, first_row_number, raw_rows) without reading it twice"""
+    with open(csv_path, 'r', encoding='utf-8', newline='') as file:
+        csv_reader = csv.reader(file)
+        chunk_index = 0
+        row_number = 1
+        while True:
+            rows = list(itertools.islice(csv_reader, chunk_size))
+            if not rows:
+                break
+            yield chunk_index, row_number, rows
+            chunk_index += 1
+            row_number += len(rows)
+
+def parse_chunk(first_row_number, raw_rows):
+    """Parse/normalise raw CSV rows; returns (processed rows, rejects)"""
+    processed = []
+    rejects = []
+    for row_number, row in enumerate(raw_rows, start=first_row_number):
+        try:
+            processed_row = process_icd_row(row)
+            processed_row['_row_number'] = row_number
+            processed.append(processed_row)
+        except Exception as row_error:
+            rejects.append((row_number, str(row_error), row))
+    return processed, rejects
+
+class RejectWriter:
+    """Appends rows that failed to parse or write to a CSV, with the reason"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def write(self, rejects):
+        if not rejects:
+            return
+        with self._lock:
+            is_new = not self.path.exists()
+            with open(self.path, 'a', encoding='utf-8', newline='') as file:
+                writer = csv.writer(file)
+                if is_new:
+                    writer.writerow(['row_number', 'error', 'row'])
+                for row_number, error, row in rejects:
+                    writer.writerow([row_number, error, *row])
+            self.count += len(rejects)
+
+class Checkpoint:
+    """
+    Records which chunks are committed, so an interrupted import resumes where
+    it left off. Only valid for the same CSV (size/mtime) and chunk size.
+    """
+
+    def __init__(self, path, csv_path, chunk_size):
+        self.path = Path(path)
+        stat = Path(csv_path).stat()
+        self.source = {'csv_path': str(csv_path), 'csv_size': stat.st_size,
+                       'csv_mtime': stat.st_mtime, 'chunk_size': chunk_size}
+        self.committed = set()
+        self.rows_written = 0
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+            if state.get('source') == self.source:
+                self.committed = set(state.get('committed', []))
+                self.rows_written = state.get('rows_written', 0)
+            else:
+                print(f"Ignoring checkpoint {self.path}: it belongs to a different CSV or chunk size")
+
+    def commit(self, chunk_index, rows_written):
+        with self._lock:
+            self.committed.add(chunk_index)
+            self.rows_written += rows_written
+            state = {'source': self.source, 'committed': sorted(self.committed),
+                     'rows_written': self.rows_written}
+            # Write-then-rename so a crash never leaves a truncated state file
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(state, file)
+            os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path.exists():
+            self.path.unlink()
+
+def write_rows_individually(neo4j_client, rows, session=None):
+    """Write rows one transaction at a time so a bad row only fails itself"""
+    written = 0
+    rejects = []
+    for row in rows:
+        try:
+            neo4j_client.create_icd_relationships(row, session=session)
+            written += 1
+        except ROW_ERRORS as row_error:
+            rejects.append((row['_row_number'], str(row_error), row['_raw_row']))
+    return written, rejects
+
+def write_batch(neo4j_client, rows, session=None):
+    """Write a batch with one UNWIND transaction, isolating bad rows on failure"""
+    try:
+        return neo4j_client.create_icd_relationships_batch(rows, session=session), []
+    except ROW_ERRORS as batch_error:
+        print(f"Batch of {len(rows)} rows failed ({str(batch_error)}), retrying row by row")
+        return write_rows_individually(neo4j_client, rows, session=session)
+
+def load_icd_data(batch_size: int = DEFAULT_BATCH_SIZE, per_row: bool = False,
+                  workers: int = DEFAULT_WORKERS, csv_path=DEFAULT_CSV_PATH,
+                  state_file=DEFAULT_STATE_FILE, reject_file=DEFAULT_REJECT_FILE,
+                  neo4j_client=None):
+    """
+    Import the ICD CSV as a pipeline: a chunked reader feeds a parse stage and
+    `workers` writer threads, each with its own session, writing non-overlapping
+    batches. Committed chunks are checkpointed to state_file so a rerun resumes;
+    rows that fail go to reject_file. The client is created from NEO4J_* unless
+    one is passed in; it is closed when the import ends either way.
+    """
+    csv_path = Path(csv_path)
 
     if not csv_path.exists():
         raise FileNotFoundError(f"CSV file not found at: {csv_path}")
 
-    neo4j_client = Neo4jICD(
+    neo4j_client = neo4j_client or Neo4jICD(
         uri=os.getenv('NEO4J_URI'),
         user=os.getenv('NEO4J_USER'),
-        password=os.getenv('NEO4J_PASSWORD')
+        password=os.getenv('NEO4J_PASSWORD'),
+        max_connection_pool_size=max(workers, 1) + 2
     )
+    checkpoint = Checkpoint(state_file, csv_path, batch_size)
+    rejects = RejectWriter(reject_file)
+
+    if checkpoint.committed:
+        print(f"Resuming: {len(checkpoint.committed)} chunks ({checkpoint.rows_written} rows) already committed")
+
+    # One session per writer thread, closed when the pool shuts down
+    local = threading.local()
+    sessions = []
+    sessions_lock = threading.Lock()
+
+    def worker_session():
+        if not hasattr(local, 'session'):
+            local.session = neo4j_client.driver.session()
+            with sessions_lock:
+                sessions.append(local.session)
+        return local.session
+
+    def process_chunk(chunk_index, first_row_number, raw_rows):
+        rows, parse_rejects = parse_chunk(first_row_number, raw_rows)
+        session = worker_session()
+        if per_row:
+            written, write_rejects = write_rows_individually(neo4j_client, rows, session=session)
+        else:
+            written, write_rejects = write_batch(neo4j_client, rows, session=session)
+        rejects.write(parse_rejects + write_rejects)
+        checkpoint.commit(chunk_index, written)
+        return written
 
     try:
-        with open(csv_path, 'r', encoding='utf-8') as file:
-            csv_reader = csv.reader(file)
-            
-            # Count total rows for progress reporting
-            total_rows = sum(1 for _ in file)
-            file.seek(0)  # Reset file pointer to start
-            
-            print(f"Found {total_rows} rows to process")
-            processed = 0
-            errors = 0
-
-            for row in csv_reader:
-                try:
-                    processed_row = process_icd_row(row)
-                    neo4j_client.create_icd_relationships(processed_row)
-                    processed += 1
-                    if processed % 100 == 0:  # Progress update every 100 rows
-                        print(f"Processed {processed} rows...")
-                except Exception as row_error:
-                    errors += 1
-                    print(f"Error processing row {processed + errors}: {str(row_error)}")
+        neo4j_client.ensure_schema(await_timeout=INDEX_AWAIT_TIMEOUT)
+
+        processed = 0
+        started = time.perf_counter()
+        next_report = PROGRESS_INTERVAL
+        max_pending = max(workers, 1) * 2  # bound memory: only a few chunks in flight
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            pending = set()
+            for chunk_index, first_row_number, raw_rows in read_chunks(csv_path, batch_size):
+                if chunk_index in checkpoint.committed:
                     continue
-            
-            print(f"\nImport completed!")
-            print(f"Successfully processed: {processed} rows")
-            if errors > 0:
-                print(f"Errors encountered: {errors} rows")
-    
+                pending.add(pool.submit(process_chunk, chunk_index, first_row_number, raw_rows))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        processed += future.result()
+                if processed >= next_report:  # Progress update every PROGRESS_INTERVAL rows
+                    print(f"Processed {processed} rows...")
+                    next_report += PROGRESS_INTERVAL
+
+            for future in pending:
+                processed += future.result()
+
+        if processed > 0 or checkpoint.committed:
+            # Edges are created once every node exists, so rows may arrive in any order
+            print("Building code hierarchy...")
+            neo4j_client.build_hierarchy(batch_size=batch_size)
+            neo4j_client.bump_dataset_version()
+
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed > 0 else 0.0
+
+        print("\nImport completed!")
+        print(f"Successfully processed: {processed} rows in {elapsed:.1f}s ({rate:.0f} rows/sec)")
+        if rejects.count > 0:
+            print(f"Errors encountered: {rejects.count} rows (see {rejects.path})")
+        checkpoint.clear()
+
     except Exception as e:
         print(f"Fatal error during data loading: {str(e)}")
+        print(f"Progress saved to {checkpoint.path}; rerun to resume")
+    finally:
+        for session in sessions:
+            session.close()
+        neo4j_client.close()
+
+def delta_sync_icd_data(batch_size: int = DEFAULT_BATCH_SIZE, csv_path=DEFAULT_CSV_PATH,
+                        manifest=None, reject_file=DEFAULT_REJECT_FILE, dry_run: bool = False,
+                        neo4j_client=None):
+    """
+    Apply only what changed between the CSV and the graph. Every row is
+    fingerprinted (code + hash of its descriptive fields) and compared with
+    the fingerprints stored on the nodes, or with a local manifest file when
+    one is given; then new and changed codes are upserted and codes missing
+    from the CSV are retired, in batches. Returns the added/changed/removed
+    counts and the new dataset version. The client is created from NEO4J_*
+    unless one is passed in; it is closed when the sync ends either way.
+    """
+    csv_path = Path(csv_path)
+
+    if not csv_path.exists():
+        raise FileNotFoundError(f"CSV file not found at: {csv_path}")
+
+    neo4j_client = neo4j_client or Neo4jICD(
+        uri=os.getenv('NEO4J_URI'),
+        user=os.getenv('NEO4J_USER'),
+        password=os.getenv('NEO4J_PASSWORD')
+    )
+    rejects = RejectWriter(reject_file)
+
+    try:
+        neo4j_client.ensure_schema(await_timeout=INDEX_AWAIT_TIMEOUT)
+        started = time.perf_counter()
+
+        incoming = {}
+        for _, first_row_number, raw_rows in read_chunks(csv_path, batch_size):
+            rows, parse_rejects = parse_chunk(first_row_number, raw_rows)
+            rejects.write(parse_rejects)
+            for row in rows:
+                row['fingerprint'] = row_fingerprint(row)
+                incoming[row['full_code']] = row
+
+        manifest_path = Path(manifest) if manifest else None
+        if manifest_path and manifest_path.exists():
+            with open(manifest_path, 'r', encoding='utf-8') as file:
+                existing = json.load(file)
+        else:
+            existing = neo4j_client.get_fingerprints()
+
+        added = [row for code, row in incoming.items() if code not in existing]
+        changed = [row for code, row in incoming.items()
+                   if code in existing and existing[code] != row['fingerprint']]
+        removed = sorted(set(existing) - set(incoming))
+
+        print(f"Delta: {len(added)} added, {len(changed)} changed, {len(removed)} removed, "
+              f"{len(incoming) - len(added) - len(changed)} unchanged")
+
+        report = {'added': len(added), 'changed': len(changed), 'removed': len(removed),
+                  'rejected': rejects.count, 'dataset_version': None}
+        if dry_run:
+            return report
+
+        upserts = added + changed
+        failed_codes = set()
+        for start in range(0, len(upserts), batch_size):
+            batch = upserts[start:start + batch_size]
+            _, write_rejects = write_batch(neo4j_client, batch)
+            rejects.write(write_rejects)
+            codes_by_row_number = {row['_row_number']: row['full_code'] for row in batch}
+            failed_codes.update(codes_by_row_number[row_number] for row_number, _, _ in write_rejects)
+        for start in range(0, len(removed), batch_size):
+            neo4j_client.retire_codes(removed[start:start + batch_size])
+
+        if upserts or removed:
+            # Only around the touched codes: a new or retired code can re-parent its neighbours
+            touched = [row['full_code'] for row in upserts if row['full_code'] not in failed_codes] + removed
+            neo4j_client.build_hierarchy(codes=touched, batch_size=batch_size)
+            report['dataset_version'] = neo4j_client.bump_dataset_version()
+        else:
+            report['dataset_version'] = neo4j_client.get_dataset_version()
+        report['rejected'] = rejects.count
+
+        if manifest_path:
+            # Codes that failed to write keep their old fingerprint so the next sync retries them
+            fingerprints = {code: row['fingerprint'] for code, row in incoming.items() if code not in failed_codes}
+            fingerprints.update({code: existing[code] for code in failed_codes if code in existing})
+            tmp_path = manifest_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(fingerprints, file)
+            os.replace(tmp_path, manifest_path)
+
+        print(f"Delta sync completed in {time.perf_counter() - started:.1f}s: {json.dumps(report)}")
+        return report
+
     finally:
         neo4j_client.close()
 
 if __name__ == "__main__":
-    load_icd_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load ICD-10 codes from data/codes.csv into Neo4j")
+    parser.add_argument('--csv', default=str(DEFAULT_CSV_PATH), help="Path to the ICD codes CSV")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Rows per chunk, written in one UNWIND transaction")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Parallel writer threads, each with its own session")
+    parser.add_argument('--per-row', action='store_true',
+                        help="Write one row per transaction (slow, useful for isolating bad rows)")
+    parser.add_argument('--state-file', default=str(DEFAULT_STATE_FILE),
+                        help="Checkpoint file used to resume an interrupted import")
+    parser.add_argument('--reject-file', default=str(DEFAULT_REJECT_FILE),
+                        help="CSV that rows failing to parse or write are appended to")
+    parser.add_argument('--delta', action='store_true',
+                        help="Only insert, update or retire codes whose content changed")
+    parser.add_argument('--manifest',
+                        help="Local fingerprint manifest for --delta (defaults to fingerprints stored in Neo4j)")
+    parser.add_argument('--dry-run', action='store_true', help="With --delta, report the changes without writing")
+    args = parser.parse_args()
+    if args.delta:
+        delta_sync_icd_data(
+            batch_size=args.batch_size,
+            csv_path=args.csv,
+            manifest=args.manifest,
+            reject_file=args.reject_file,
+            dry_run=args.dry_run
+        )
+        sys.exit(0)
+    load_icd_data(
+        batch_size=args.batch_size,
+        per_row=args.per_row,
+        workers=args.workers,
+        csv_path=args.csv,
+        state_file=args.state_file,
+        reject_file=args.reject_file
+    )
@@ -11,24 +11,69 @@ sys.path.insert(0, str(project_root))
 
 from app.services.icd_service import ICDService
 from app.services.llm_service import MedicalCodingAssistant
+from app.services.metrics import metrics
+
+try:
+    # Optional: streamlit-searchbox reruns its search function on every keystroke
+    from streamlit_searchbox import st_searchbox
+except ImportError:  # without it, suggestions only refresh when the input is submitted
+    st_searchbox = None
 
 # Load environment variables
 load_dotenv()
 
-# Initialize services
-icd_service = ICDService(
-    uri=os.getenv("NEO4J_URI", "neo4j://localhost:7687"),
-    user=os.getenv("NEO4J_USER", "neo4j"),
-    password=os.getenv("NEO4J_PASSWORD")
-)
+@st.cache_resource
+def get_icd_service() -> ICDService:
+    """One ICDService per server process, shared by every session and rerun; no I/O until first query"""
+    snapshot_path = os.getenv("ICD_SNAPSHOT_PATH")
+    if snapshot_path:
+        # Read replica / edge mode: serve lookups from a memory-mapped snapshot, no Neo4j needed
+        return ICDService.from_snapshot(snapshot_path, metrics=metrics)
+    return ICDService(
+        uri=os.getenv("NEO4J_URI", "neo4j://localhost:7687"),
+        user=os.getenv("NEO4J_USER", "neo4j"),
+        password=os.getenv("NEO4J_PASSWORD"),
+        lazy=True,
+        metrics=metrics
+    )
+
+@st.cache_resource
+def get_medical_assistant() -> MedicalCodingAssistant:
+    """One assistant per server process; the OpenAI client is created on the first question"""
+    return MedicalCodingAssistant(get_icd_service())
 
-# Initialize LLM service
-medical_assistant = MedicalCodingAssistant(icd_service)
+icd_service = get_icd_service()
+medical_assistant = get_medical_assistant()
 
 # Initialize session state for chat history
 if 'messages' not in st.session_state:
     st.session_state.messages = []
 
+def explanation_tokens(events, final):
+    """Yield explanation text from process_query_stream events, keeping the final response"""
+    for event in events:
+        if event["type"] == "token":
+            yield event["content"]
+        elif event["type"] == "done":
+            final["response"] = event["response"]
+
+def load_category_page(browse):
+    """Append the next page of the browsed category and advance its cursor (or keep it and record the error)"""
+    page = icd_service.get_category_page(browse['category'], after=browse['cursor'])
+    browse['error'] = page['error']
+    browse['codes'].extend(page['codes'])
+    browse['cursor'] = page['next_cursor']
+
+def code_suggestions(text):
+    """(label, code) pairs from the in-memory autocomplete index; no database round trip per keystroke"""
+    return [(f"{'  ' * c['level']}{c['code']} - {c['short_desc']}", c['code'])
+            for c in icd_service.autocomplete(text or "", limit=10)]
+
+def category_suggestions(text):
+    """Like code_suggestions, but each suggestion selects the code's category"""
+    return [(f"{'  ' * c['level']}{c['code']} - {c['short_desc']}", c['category_code'] or c['code'])
+            for c in icd_service.autocomplete(text or "", limit=10)]
+
 def main():
     st.title("ICD-10 Code Explorer")
 
@@ -38,7 +83,16 @@ def main():
         
         # Search section
         st.subheader("Search ICD Codes")
-        search_query = st.text_input("Enter search term (e.g., pneumonia)")
+        if st_searchbox is not None:
+            # Typeahead: suggestions follow each keystroke; plain text is searched as typed
+            search_query = st_searchbox(code_suggestions, label="Enter search term (e.g., pneumonia)",
+                                        key="search_query", default_use_searchterm=True) or ""
+        else:
+            search_query = st.text_input("Enter search term (e.g., pneumonia)")
+            if search_query:
+                suggestions = icd_service.autocomplete(search_query, limit=5)
+                if suggestions:
+                    st.caption("Suggestions: " + ", ".join(f"{c['code']} ({c['short_desc']})" for c in suggestions))
         
         if search_query:
             with st.spinner('Searching...'):
@@ -55,17 +109,50 @@ def main():
         
         # Category browser section
         st.subheader("Browse by Category")
-        category_code = st.text_input("Enter category code (e.g., J12)")
-        
+        if st_searchbox is not None:
+            category_code = st_searchbox(category_suggestions, label="Enter category code (e.g., J12)",
+                                         key="category_code") or ""
+        else:
+            category_prefix = st.text_input("Enter category code (e.g., J12)")
+            category_code = category_prefix.strip().upper()
+
+            # Completions for the submitted prefix, from the in-memory index
+            if category_prefix:
+                completions = icd_service.autocomplete(category_prefix, limit=10)
+                if completions and completions[0]['code'].replace('.', '') != category_code.replace('.', ''):
+                    choice = st.selectbox(
+                        "Matching codes",
+                        completions,
+                        format_func=lambda c: f"{'  ' * c['level']}{c['code']} - {c['short_desc']}"
+                    )
+                    category_code = choice['category_code'] or category_code
+
         if category_code:
-            with st.spinner('Loading category...'):
-                category_results = icd_service.get_category_codes(category_code)
-                
-                if category_results:
-                    for result in category_results:
-                        st.write(f"{result['code']} - {result['short_desc']}")
-                else:
-                    st.info("No codes found in this category")
+            # Pages already loaded for this category survive reruns; a new category starts over
+            browse = st.session_state.get('category_browse')
+            if browse is None or browse['category'] != category_code:
+                browse = st.session_state.category_browse = {'category': category_code, 'codes': [], 'cursor': None,
+                                                             'error': None}
+                with st.spinner('Loading category...'):
+                    load_category_page(browse)
+
+            if browse['codes']:
+                st.markdown("\n".join(
+                    f"- {result['code']} - {result['short_desc']}" for result in browse['codes']
+                ))
+            if browse['error']:
+                st.error("Couldn't load this category's codes. Please try again.")
+                st.button("Retry", on_click=load_category_page, args=(browse,))
+            elif not browse['codes']:
+                st.info("No codes found in this category")
+            elif browse['cursor']:
+                st.button("Load more", on_click=load_category_page, args=(browse,))
+
+        # Per-stage timings, query counts, cache hits and token usage for this process
+        with st.expander("Metrics"):
+            st.json(icd_service.metrics.snapshot())
+            st.download_button("Download Prometheus metrics", icd_service.metrics.to_prometheus(),
+                               file_name="icd_metrics.prom")
 
     # Main area for chat interface
     st.header("Medical Coding Assistant")
@@ -86,36 +173,48 @@ def main():
         
         # Generate assistant response
         with st.chat_message("assistant"):
-            with st.spinner("Analyzing medical description..."):
-                # Use LLM service to process query
-                response_data = medical_assistant.process_query(prompt)
-                
-                # Debug information
-                st.write("Debug Info:")
-                st.json({
-                    "source": response_data["source"],
-                    "num_codes": len(response_data["suggested_codes"]),
-                    "has_explanation": bool(response_data.get("explanation"))
-                })
-                
-                # Format the response
-                response = f"💡 {response_data['explanation']}\n\n"
-                
-                if response_data['suggested_codes']:
-                    response += "**Relevant ICD-10 Codes:**\n\n"
-                    for code in response_data['suggested_codes']:
-                        response += f"- **{code['code']}**: {code['short_desc']}\n"
-                        with st.expander(f"Details for {code['code']}"):
-                            st.write(f"Category Code: {code['category_code']}")
-                            st.write(f"Long Description: {code['long_desc']}")
-                
-                st.markdown(response)
-                
-                # Add assistant response to chat history
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": response
-                })
+            events = medical_assistant.process_query_stream(prompt)
+
+            # Database codes arrive first; show them while the explanation streams in
+            with st.spinner("Searching ICD-10 codes..."):
+                suggested_codes = next(events)["suggested_codes"]
+
+            codes_markdown = ""
+            if suggested_codes:
+                codes_markdown = "**Relevant ICD-10 Codes:**\n\n"
+                for code in suggested_codes:
+                    codes_markdown += f"- **{code['code']}**: {code['short_desc']}\n"
+                st.markdown(codes_markdown)
+                for code in suggested_codes:
+                    with st.expander(f"Details for {code['code']}"):
+                        st.write(f"Category Code: {code['category_code']}")
+                        st.write(f"Long Description: {code['long_desc']}")
+
+            final = {}
+            st.write_stream(explanation_tokens(events, final))
+            response_data = final["response"]
+            if response_data.get("unverified_codes"):
+                st.warning("Not found in the ICD-10 database: " + ", ".join(response_data["unverified_codes"]))
+
+            # Debug information
+            st.write("Debug Info:")
+            st.json({
+                "source": response_data["source"],
+                "num_codes": len(response_data["suggested_codes"]),
+                "has_explanation": bool(response_data.get("explanation")),
+                "prompt_tokens": response_data.get("prompt_tokens"),
+                "context_codes": response_data.get("context_codes"),
+                "verified_codes": response_data.get("verified_codes")
+            })
+
+            # Format the response for the chat history
+            response = f"💡 {response_data['explanation']}\n\n{codes_markdown}"
+
+            # Add assistant response to chat history
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": response
+            })
 
 if __name__ == "__main__":
     main()
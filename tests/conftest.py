@@ -0,0 +1,85 @@
+import csv
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root (for app/ and benchmarks/) and scripts/ to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / 'scripts'))
+
+from app.database.neo4j_client import AsyncNeo4jICD, Neo4jICD
+from app.services.icd_service import ICDService
+from app.services.llm_service import MedicalCodingAssistant
+from app.services.metrics import MetricsRegistry
+from benchmarks.fakes import AsyncStubOpenAI, FakeAsyncDriver, FakeDriver, FakeGraph, StubOpenAI
+
+# (category_code, subcategory, code, short description, long description, category name)
+ICD_ROWS = [
+    ["A01", "", "A01", "Typhoid and paratyphoid fevers", "Typhoid and paratyphoid fevers", "Infectious diseases"],
+    ["A01", "0", "A010", "Typhoid fever", "Typhoid fever", "Infectious diseases"],
+    ["A01", "0", "A0100", "Typhoid fever, unspecified", "Typhoid fever, unspecified", "Infectious diseases"],
+    ["A01", "0", "A0109", "Typhoid fever with other complications", "Typhoid fever with other complications",
+     "Infectious diseases"],
+    ["E11", "", "E11", "Type 2 diabetes mellitus", "Type 2 diabetes mellitus", "Endocrine disorders"],
+    ["E11", "9", "E119", "Type 2 diabetes mellitus without complications",
+     "Type 2 diabetes mellitus without complications", "Endocrine disorders"],
+    ["J12", "", "J12", "Viral pneumonia, not elsewhere classified", "Viral pneumonia, not elsewhere classified",
+     "Respiratory system"],
+    ["J12", "9", "J129", "Viral pneumonia, unspecified", "Viral pneumonia, unspecified", "Respiratory system"],
+]
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        csv.writer(file).writerows(rows)
+    return path
+
+@pytest.fixture
+def icd_csv(tmp_path):
+    return write_csv(tmp_path / 'codes.csv', ICD_ROWS)
+
+@pytest.fixture
+def graph():
+    return FakeGraph()
+
+@pytest.fixture
+def driver(graph):
+    return FakeDriver(graph)
+
+@pytest.fixture
+def metrics():
+    return MetricsRegistry()
+
+@pytest.fixture
+def db_client(driver, metrics):
+    return Neo4jICD(None, None, None, driver=driver, metrics=metrics)
+
+@pytest.fixture
+def loaded_graph(tmp_path, icd_csv, driver, metrics):
+    """The fake graph after a full import of ICD_ROWS"""
+    from load_icd_data import load_icd_data
+
+    load_icd_data(batch_size=3, workers=2, csv_path=icd_csv, state_file=tmp_path / 'load.state.json',
+                  reject_file=tmp_path / 'rejected.csv',
+                  neo4j_client=Neo4jICD(None, None, None, driver=driver, metrics=metrics))
+    return driver.graph
+
+def attach_async_client(service, graph, metrics):
+    """Point the service's async API at the fake graph too"""
+    service._async_client = AsyncNeo4jICD(None, None, None, driver=FakeAsyncDriver(graph), metrics=metrics)
+    return service
+
+@pytest.fixture
+def service(loaded_graph, db_client, metrics):
+    service = attach_async_client(
+        ICDService(None, None, None, db_client=db_client, enable_cache=False, lazy=True), loaded_graph, metrics
+    )
+    yield service
+    service.close()
+
+@pytest.fixture
+def assistant(service):
+    """Assistant over the loaded graph, answering from the stub OpenAI clients"""
+    return MedicalCodingAssistant(service, client=StubOpenAI(latency_ms=0, token_latency_ms=0),
+                                  async_client=AsyncStubOpenAI(latency_ms=0))
@@ -0,0 +1,54 @@
+from app.services.cache import ResultCache
+from app.services.icd_service import ICDService
+from app.services.llm_service import MedicalCodingAssistant
+from benchmarks.fakes import AsyncStubOpenAI, StubOpenAI
+from tests.conftest import attach_async_client
+import asyncio
+import threading
+
+import pytest
+
+@pytest.fixture
+def cached_service(loaded_graph, db_client, metrics):
+    service = attach_async_client(ICDService(None, None, None, db_client=db_client, lazy=True), loaded_graph, metrics)
+
+    def blocking_version_read():
+        raise AssertionError("sync dataset version read from the event loop")
+
+    # Only the sync API may use the sync driver for the version
+    service.result_cache.version_provider = blocking_version_read
+    return service
+
+def test_async_search_matches_sync_search(service):
+    async_results = asyncio.run(service.search_by_description_async("viral pneumonia"))
+
+    assert async_results == service.search_by_description("viral pneumonia")
+
+def test_async_paths_read_the_version_through_the_async_driver(cached_service, loaded_graph):
+    loaded_graph.dataset_version = "v7"
+    assistant = MedicalCodingAssistant(cached_service, client=StubOpenAI(latency_ms=0),
+                                       async_client=AsyncStubOpenAI(latency_ms=0))
+
+    async def run():
+        await cached_service.search_by_description_async("typhoid fever")
+        await cached_service.get_code_details_many_async(["A01.0", "X99"])
+        return await assistant.process_query_async("viral pneumonia")
+
+    response = asyncio.run(run())
+
+    assert response["source"] == "database + llm"
+    assert cached_service.result_cache.stats()['version'] == "v7"
+
+def test_async_and_sync_share_cache_entries(cached_service, loaded_graph):
+    asyncio.run(cached_service.get_category_codes_async("J12"))
+    queries = loaded_graph.queries
+
+    assert len(cached_service.get_category_codes("J12")) == 2
+    assert loaded_graph.queries == queries
+
+def test_sync_version_provider_runs_off_the_event_loop():
+    threads = []
+    cache = ResultCache(version_provider=lambda: threads.append(threading.get_ident()) or "v1")
+
+    assert asyncio.run(cache.version_async()) == "v1"
+    assert threads and threads[0] != threading.get_ident()
@@ -0,0 +1,36 @@
+from app.services.autocomplete import AutocompleteIndex
+from app.database.icd_csv import iter_icd_records
+
+def build(icd_csv):
+    return AutocompleteIndex.from_records(iter_icd_records(icd_csv))
+
+def test_code_prefix_ranks_shallower_codes_first(icd_csv):
+    results = build(icd_csv).complete("A01")
+
+    assert [result['code'] for result in results] == ["A01", "A01.0", "A01.00", "A01.09"]
+    assert [result['level'] for result in results] == [0, 1, 2, 2]
+    assert {result['match'] for result in results} == {"code"}
+
+def test_dotted_and_undotted_prefixes_match(icd_csv):
+    index = build(icd_csv)
+
+    assert [result['code'] for result in index.complete("e11.")] == ["E11", "E11.9"]
+    assert [result['code'] for result in index.complete("E119")] == ["E11.9"]
+
+def test_word_prefix_matches_descriptions(icd_csv):
+    index = build(icd_csv)
+
+    assert [result['code'] for result in index.complete("pneum")] == ["J12", "J12.9"]
+    assert [result['code'] for result in index.complete("ty", limit=2)] == ["A01", "E11"]
+
+def test_phrase_needs_every_word(icd_csv):
+    index = build(icd_csv)
+
+    assert [result['code'] for result in index.complete("typhoid fever with oth")] == ["A01.09"]
+    assert index.complete("typhoid pneum") == []
+
+def test_service_builds_the_index_on_first_use(service):
+    assert service.autocomplete_index is None
+
+    assert service.autocomplete("J12")[0]['code'] == "J12"
+    assert len(service.autocomplete_index) == 8
@@ -0,0 +1,85 @@
+from app.services.batch_coding import BatchCoder, percentile
+import json
+
+NOTES = [
+    {"id": "1", "text": "Viral pneumonia"},
+    {"id": "2", "text": "viral  pneumonia"},
+    {"id": "3", "text": "Typhoid fever with complications"},
+    {"id": "4", "text": "Type 2 diabetes without complications"},
+]
+
+def write_notes(path, notes):
+    with open(path, 'w', encoding='utf-8') as file:
+        for note in notes:
+            file.write(json.dumps(note) + "\n")
+    return path
+
+def read_output(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def make_coder(assistant, lookup_batch_size=2):
+    return BatchCoder(assistant, max_workers=2, requests_per_second=0, max_retries=0,
+                      lookup_batch_size=lookup_batch_size)
+
+def test_percentile_uses_nearest_rank():
+    assert percentile([], 50) == 0.0
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile([3, 1, 2, 4], 99) == 4
+
+def test_identical_notes_are_coded_once(tmp_path, assistant):
+    output = tmp_path / "coded.jsonl"
+    report = make_coder(assistant).run(write_notes(tmp_path / "notes.jsonl", NOTES), output)
+
+    assert report['notes_written'] == 4 and report['unique_notes'] == 3
+    assert sorted(line['id'] for line in read_output(output)) == ["1", "2", "3", "4"]
+    assert assistant.client.chat.completions.calls == 3
+
+def test_rerun_skips_notes_already_written(tmp_path, assistant):
+    notes = write_notes(tmp_path / "notes.jsonl", NOTES)
+    output = tmp_path / "coded.jsonl"
+    make_coder(assistant).run(notes, output)
+
+    report = make_coder(assistant).run(notes, output)
+
+    assert report['notes_skipped'] == 4 and report['notes_written'] == 0
+    assert len(read_output(output)) == 4
+
+def test_failed_lookups_are_not_written_and_are_retried(tmp_path, assistant):
+    notes = write_notes(tmp_path / "notes.jsonl", NOTES)
+    output = tmp_path / "coded.jsonl"
+    db_client = assistant.icd_service.db_client
+    read = db_client.read
+
+    def failing_read(query, **params):
+        if any('typhoid' in search['search_text'].lower() for search in params.get('searches', [])):
+            raise RuntimeError("database unavailable")
+        return read(query, **params)
+
+    db_client.read = failing_read
+    report = make_coder(assistant, lookup_batch_size=1).run(notes, output)
+
+    assert report['notes_failed'] == 1
+    assert {line['id'] for line in read_output(output)} == {"1", "2", "4"}
+    assert all(line['suggested_codes'] for line in read_output(output))
+
+    db_client.read = read
+    report = make_coder(assistant, lookup_batch_size=1).run(notes, output)
+
+    assert report['notes_skipped'] == 3 and report['notes_written'] == 1
+    assert {line['id'] for line in read_output(output)} == {"1", "2", "3", "4"}
+
+def test_each_distinct_note_is_searched_with_its_own_text(tmp_path, assistant):
+    searched = []
+    search_many = assistant.icd_service.search_many
+
+    def recording_search_many(texts, **kwargs):
+        searched.extend(texts)
+        return search_many(texts, **kwargs)
+
+    assistant.icd_service.search_many = recording_search_many
+    notes = [{"id": "1", "text": "A01.0 fever"}, {"id": "2", "text": "fever A01.0"}, {"id": "3", "text": "the"},
+             {"id": "4", "text": "and"}, {"id": "5", "text": "A01.0  FEVER"}]
+    make_coder(assistant).run(write_notes(tmp_path / "notes.jsonl", notes), tmp_path / "coded.jsonl")
+
+    assert sorted(searched) == ["a01.0 fever", "and", "fever a01.0", "the"]
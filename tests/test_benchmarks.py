@@ -0,0 +1,25 @@
+from argparse import Namespace
+
+from benchmarks.run_benchmarks import flatten, run
+from benchmarks.synthetic_data import generate_rows, sample_queries
+
+def test_synthetic_rows_are_deterministic_and_unique():
+    rows = list(generate_rows(500))
+
+    assert rows == list(generate_rows(500))
+    assert len({row[2] for row in rows}) == 500
+    assert sample_queries(5) == sample_queries(5)
+
+def test_flatten_keeps_only_numbers():
+    assert flatten({'load': {'rows_per_s': 10, 'ok': True}, 'label': "x", 'peak_rss_mb': 1.5}) == {
+        'load.rows_per_s': 10, 'peak_rss_mb': 1.5
+    }
+
+def test_small_run_reports_every_stage():
+    args = Namespace(rows=200, queries=10, assistant_queries=4, concurrency=[1, 2], batch_size=50, workers=2,
+                     neo4j_latency_ms=0, llm_latency_ms=0, skip_assistant=False)
+
+    results = run(args)['results']
+
+    assert {'load', 'snapshot', 'memory_index', 'search', 'autocomplete', 'assistant'} <= set(results)
+    assert set(results['assistant']) == {"1", "2"}
@@ -0,0 +1,94 @@
+from app.services.cache import DiskCache, LRUCache, ResultCache
+from app.services.icd_service import ICDService
+import asyncio
+import time
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()['evictions'] == 1
+
+def test_lru_entries_expire(monkeypatch):
+    cache = LRUCache(ttl=10)
+    cache.set("a", 1)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+
+    assert cache.get("a") is None
+    assert cache.stats()['expirations'] == 1
+
+def test_keys_collapse_whitespace_but_keep_case():
+    cache = ResultCache()
+
+    assert cache.make_key("search", "viral  pneumonia ", 10) == cache.make_key("search", "viral pneumonia", 10)
+    assert cache.make_key("code_details", "a01.0") != cache.make_key("code_details", "A01.0")
+
+def test_keys_embed_the_dataset_version():
+    versions = iter(["v1", "v2"])
+    cache = ResultCache(version_provider=lambda: next(versions), version_check_interval=0)
+
+    assert cache.make_key("search", "fever") != cache.make_key("search", "fever")
+
+def test_disk_tier_backs_the_memory_tier(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    ResultCache(disk=DiskCache(path)).set("key", {"codes": ["A01.0"]})
+
+    assert ResultCache(disk=DiskCache(path)).get("key") == {"codes": ["A01.0"]}
+
+def cached_service(db_client):
+    return ICDService(None, None, None, db_client=db_client, result_cache=ResultCache(), lazy=True)
+
+def test_repeated_lookups_are_served_from_cache(loaded_graph, db_client):
+    service = cached_service(db_client)
+    first = service.get_category_codes("A01")
+    queries = loaded_graph.queries
+
+    assert service.get_category_codes("A01") == first
+    assert [code['code'] for code in first] == ["A01", "A01.0", "A01.00", "A01.09"]
+    assert loaded_graph.queries == queries
+
+def test_lowercase_code_is_not_served_the_upper_case_entry(loaded_graph, db_client):
+    service = cached_service(db_client)
+    assert service.get_category_codes("A01")
+
+    assert service.get_category_codes("a01") == []
+
+def test_batch_lookups_do_not_leak_into_exact_code_details(loaded_graph, db_client):
+    service = cached_service(db_client)
+
+    assert service.get_code_details_many(["A010"])[0]['code'] == "A01.0"
+    assert service.get_code_details("A010") is None
+    queries = loaded_graph.queries
+    assert service.get_code_details_many(["a01.0"])[0]['code'] == "A01.0"
+    assert loaded_graph.queries == queries
+
+def test_failed_category_read_is_not_cached(loaded_graph, db_client):
+    service = cached_service(db_client)
+    read = db_client.read
+
+    def failing_read(query, **params):
+        raise RuntimeError("database unavailable")
+
+    db_client.read = failing_read
+    assert service.get_category_codes("A01") == []
+    db_client.read = read
+
+    assert len(service.get_category_codes("A01")) == 4
+
+def test_failed_async_category_read_is_not_cached(loaded_graph, db_client):
+    service = cached_service(db_client)
+
+    class FailingAsyncClient:
+        async def read(self, query, **params):
+            raise RuntimeError("database unavailable")
+
+    service._async_client = FailingAsyncClient()
+    assert asyncio.run(service.get_category_codes_async("A01")) == []
+
+    assert len(service.get_category_codes("A01")) == 4
@@ -0,0 +1,32 @@
+import pytest
+
+from app.services import icd_service as icd_service_module
+
+def test_pages_follow_the_cursor(service):
+    first = service.get_category_page("A01", page_size=3)
+    second = service.get_category_page("A01", after=first['next_cursor'], page_size=3)
+
+    assert [code['code'] for code in first['codes']] == ["A01", "A01.0", "A01.00"]
+    assert first['next_cursor'] == "A01.00" and first['error'] is None
+    assert [code['code'] for code in second['codes']] == ["A01.09"]
+    assert second['next_cursor'] is None
+
+def test_mid_stream_failure_returns_an_error_not_a_partial_page(service):
+    stream = service.db_client.stream
+
+    def failing_stream(query, **params):
+        assert query == icd_service_module.CATEGORY_PAGE_QUERY
+        for count, record in enumerate(stream(query, **params)):
+            if count == 1:
+                raise ConnectionError("connection reset")
+            yield record
+
+    service.db_client.stream = failing_stream
+
+    page = service.get_category_page("A01", after="A01", page_size=2)
+
+    assert page == {'codes': [], 'next_cursor': "A01", 'error': "connection reset"}
+
+def test_page_size_must_be_positive(service):
+    with pytest.raises(ValueError, match="page_size"):
+        service.get_category_page("A01", page_size=0)
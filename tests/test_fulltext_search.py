@@ -0,0 +1,62 @@
+from app.services import icd_service as icd_service_module
+from neo4j.exceptions import ClientError
+
+def client_error(code, message):
+    """ClientError carrying a server status code, as the driver raises it"""
+    error_type = type("ClientError", (ClientError,), {'code': code, 'message': message})
+    return error_type(message)
+
+MISSING_INDEX = client_error(
+    "Neo.ClientError.Procedure.ProcedureCallFailed",
+    "Failed to invoke procedure `db.index.fulltext.queryNodes`: Caused by: "
+    "java.lang.IllegalArgumentException: There is no such fulltext schema index: icd_code_text"
+)
+PARSE_ERROR = client_error(
+    "Neo.ClientError.Procedure.ProcedureCallFailed",
+    "Failed to invoke procedure `db.index.fulltext.queryNodes`: Caused by: "
+    "org.apache.lucene.queryparser.classic.ParseException: Cannot parse 'index: ...'"
+)
+
+def fail_fulltext(service, error):
+    read = service.db_client.read
+
+    def failing_read(query, **params):
+        if query in (icd_service_module.SEARCH_FULLTEXT_QUERY, icd_service_module.SEARCH_MANY_FULLTEXT_QUERY):
+            raise error
+        return read(query, **params)
+
+    service.db_client.read = failing_read
+
+def test_fulltext_search_finds_codes(service):
+    results = service.search_by_description("viral pneumonia")
+    assert "J12.9" in [result['code'] for result in results]
+
+def test_missing_index_disables_fulltext(service):
+    fail_fulltext(service, MISSING_INDEX)
+
+    results = service.search_by_description("viral pneumonia")
+
+    assert results  # answered by the CONTAINS scan
+    assert service._fulltext_available is False
+
+def test_unparsable_query_only_falls_back_for_that_search(service):
+    fail_fulltext(service, PARSE_ERROR)
+
+    assert service.search_by_description("pneumonia index") is not None
+    assert service.search_many(["typhoid fever"])[0]
+    assert service._fulltext_available is True
+
+def test_other_client_errors_keep_fulltext(service):
+    fail_fulltext(service, client_error("Neo.ClientError.Statement.SyntaxError", "Invalid input 'index'"))
+
+    service.search_by_description("typhoid")
+
+    assert service._fulltext_available is True
+
+def test_fulltext_query_escapes_lucene_syntax(service):
+    query = service._build_fulltext_query('fever (A01) "x"', ["AND", "type 2 diabetes", "a01:b"])
+
+    assert 'code:"fever \\(A01\\) \\"x\\""^10' in query
+    clauses = query.split(" OR ")
+    assert "and" in clauses and "AND" not in clauses
+    assert "a01\\:b" in query
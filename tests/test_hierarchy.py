@@ -0,0 +1,62 @@
+from app.database import neo4j_client
+from app.database.hierarchy import ancestor_paths, code_forms, resolve_parents
+from app.database.neo4j_client import Neo4jICD
+from app.models.icd_models import ICDCode
+from app.services.icd_service import ICDService
+from load_icd_data import load_icd_data
+from tests.conftest import ICD_ROWS, write_csv
+
+def test_parent_is_the_longest_existing_prefix():
+    parents = resolve_parents([("A01", "A01"), ("A01.09", "A01"), ("A01.0", "A01")])
+
+    assert parents == {"A01": None, "A01.09": "A01.0", "A01.0": "A01"}
+    assert ancestor_paths(parents)["A01.09"] == ["A01", "A01.0"]
+
+def test_code_forms():
+    assert code_forms("a0109") == ["A01.09", "A0109"]
+    assert code_forms("E11") == ["E11"]
+
+def load_without_a010(tmp_path, driver, metrics):
+    rows = [row for row in ICD_ROWS if row[2] != "A010"]
+    client = Neo4jICD(None, None, None, driver=driver, metrics=metrics)
+    load_icd_data(csv_path=write_csv(tmp_path / 'codes.csv', rows), state_file=tmp_path / 'state.json',
+                  reject_file=tmp_path / 'rejected.csv', neo4j_client=client)
+    return client
+
+def record_reads(client):
+    reads = []
+    read = client.read
+
+    def recording_read(query, **params):
+        reads.append((query, params))
+        return read(query, **params)
+
+    client.read = recording_read
+    return reads
+
+def test_create_icd_code_reads_only_its_family(tmp_path, driver, metrics):
+    client = load_without_a010(tmp_path, driver, metrics)
+    assert driver.graph.codes["A01.09"]["parent_code"] == "A01"
+    service = ICDService(None, None, None, db_client=client, enable_cache=False, lazy=True)
+    reads = record_reads(client)
+
+    service.create_icd_code(ICDCode(category_code="A01", subcategory="0", full_code="A01.0",
+                                    short_description="Typhoid fever", long_description="Typhoid fever",
+                                    category_name="Infectious diseases"))
+
+    assert [params['roots'] for query, params in reads if query == neo4j_client.HIERARCHY_FAMILY_QUERY] == [["A01"]]
+    assert all("STARTS WITH" in query or "$keys" in query for query, _ in reads)
+    nodes = driver.graph.codes
+    assert nodes["A01.0"]["parent_code"] == "A01"
+    assert nodes["A01.09"]["parent_code"] == "A01.0"
+    assert nodes["A01.09"]["ancestors"] == ["A01", "A01.0"]
+    assert nodes["E11.9"]["parent_code"] == "E11"
+
+def test_partial_build_writes_only_the_new_code_and_its_children(tmp_path, driver, metrics):
+    client = load_without_a010(tmp_path, driver, metrics)
+    client.create_icd_relationships({'category_code': "A01", 'subcategory': "0", 'full_code': "A01.0",
+                                     'short_description': "Typhoid fever", 'long_description': "Typhoid fever",
+                                     'category_name': "Infectious diseases"})
+
+    assert client.build_hierarchy(codes=["A01.0"]) == 3  # A01.0, A01.00 and A01.09
+    assert driver.graph.children["A01.0"] == {"A01.00", "A01.09"}
@@ -0,0 +1,43 @@
+from app.database.neo4j_client import Neo4jICD
+from app.services.context_builder import TokenCounter
+from app.services.icd_service import ICDService
+from app.services.llm_service import MedicalCodingAssistant
+from benchmarks.fakes import FakeDriver
+
+def refuse(*args, **kwargs):
+    raise AssertionError(f"unexpected I/O: {args}")
+
+def test_lazy_service_does_no_io(monkeypatch):
+    monkeypatch.setattr(Neo4jICD, "_create_driver", refuse)
+
+    service = ICDService("neo4j://localhost:7687", "neo4j", "secret", enable_cache=False, lazy=True)
+
+    assert service.db_client._driver is None
+
+def test_eager_service_checks_connectivity_without_a_scan(metrics):
+    checks = []
+
+    class CheckedDriver(FakeDriver):
+        def verify_connectivity(self):
+            checks.append(1)
+
+    client = Neo4jICD(None, None, None, driver=CheckedDriver(), metrics=metrics)
+    client.read = refuse
+
+    ICDService(None, None, None, db_client=client, enable_cache=False)
+
+    assert checks == [1]
+
+def test_assistant_creates_openai_clients_on_first_use(service, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    assistant = MedicalCodingAssistant(service)
+
+    assert assistant._client is None and assistant._async_client is None
+    assert assistant.client is assistant.client
+
+def test_token_counter_loads_its_encoding_on_first_count():
+    counter = TokenCounter()
+    assert counter._loaded is False
+
+    assert counter.count("type 2 diabetes") > 0
+    assert counter._loaded is True
@@ -0,0 +1,98 @@
+from benchmarks.fakes import StubOpenAI
+from concurrent.futures import ThreadPoolExecutor
+
+def completions(assistant):
+    return assistant.client.chat.completions
+
+def test_identical_queries_reuse_the_explanation(assistant):
+    first = assistant.process_query("viral pneumonia")
+    second = assistant.process_query("Viral  pneumonia")
+
+    assert first["source"] == "database + llm"
+    assert second["explanation"] == first["explanation"]
+    assert completions(assistant).calls == 1
+
+def test_concurrent_identical_queries_share_one_completion(assistant):
+    assistant._client = StubOpenAI(latency_ms=100, token_latency_ms=0)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        responses = list(pool.map(assistant.process_query, ["typhoid fever"] * 4))
+
+    assert len({response["explanation"] for response in responses}) == 1
+    assert completions(assistant).calls == 1
+
+def test_invalidate_cache_drops_answers_that_cite_the_codes(assistant):
+    assistant.process_query("viral pneumonia")
+    assistant.process_query("typhoid fever")
+
+    assert assistant.invalidate_cache(["J12.9"]) == 1
+    assert len(assistant.response_cache) == 1
+    assert assistant.invalidate_cache() == 1
+
+def test_stream_yields_codes_then_tokens_then_done(assistant):
+    events = list(assistant.process_query_stream("viral pneumonia"))
+
+    assert events[0]["type"] == "codes" and events[0]["suggested_codes"]
+    assert {event["type"] for event in events[1:-1]} == {"token"}
+    response = events[-1]["response"]
+    assert events[-1]["type"] == "done"
+    assert response["explanation"] == "".join(event["content"] for event in events[1:-1])
+    assert response["source"] == "database + llm"
+
+def test_stream_falls_back_to_database_answer_when_the_llm_fails_midway(assistant):
+    def failing_stream(**kwargs):
+        yield from list(StubOpenAI(latency_ms=0, token_latency_ms=0).chat.completions.create(**kwargs))[:2]
+        raise RuntimeError("connection reset")
+
+    assistant.client.chat.completions.create = failing_stream
+    events = list(assistant.process_query_stream("viral pneumonia"))
+
+    response = events[-1]["response"]
+    assert response["source"] == "database only"
+    assert response["explanation"] == "".join(event["content"] for event in events if event["type"] == "token")
+
+def test_stream_cache_hit_has_the_same_response_shape(assistant):
+    miss = list(assistant.process_query_stream("viral pneumonia"))[-1]["response"]
+    hit = list(assistant.process_query_stream("viral pneumonia"))[-1]["response"]
+
+    assert completions(assistant).calls == 1
+    assert set(hit) == set(miss)
+    assert hit["prompt_tokens"] == miss["prompt_tokens"]
+
+def test_mentions_of_u_codes_are_verified(assistant):
+    results = assistant.icd_service.search_by_description("viral pneumonia")
+
+    verification = assistant._verify_mentions("Consider J12.9; if COVID-19 is confirmed use U07.1.", results)
+
+    assert verification["mentioned_codes"] == ["J12.9", "U07.1"]
+    assert verification["unverified_codes"] == ["U07.1"]
+
+def test_stream_ends_with_done_when_the_prompt_cannot_be_built(assistant, monkeypatch):
+    def broken_count(text):
+        raise ValueError("tokenizer failed")
+
+    monkeypatch.setattr(assistant.context_builder.counter, "count", broken_count)
+    events = list(assistant.process_query_stream("viral pneumonia"))
+
+    assert [event["type"] for event in events] == ["codes", "token", "done"]
+    assert events[-1]["response"]["source"] == "database only"
+    assert completions(assistant).calls == 0
+
+def test_stream_ends_with_done_when_cached_answer_verification_fails(assistant, monkeypatch):
+    cached = list(assistant.process_query_stream("viral pneumonia"))[-1]["response"]["explanation"]
+
+    def broken_verify(explanation, db_results):
+        raise RuntimeError("verification failed")
+
+    monkeypatch.setattr(assistant, "_verify_mentions", broken_verify)
+    events = list(assistant.process_query_stream("viral pneumonia"))
+
+    assert events[-1]["type"] == "done"
+    response = events[-1]["response"]
+    assert response["source"] == "database only" and response["explanation"].startswith(cached)
+
+def test_letter_category_mentions_are_verified(assistant):
+    results = assistant.icd_service.search_by_description("viral pneumonia")
+
+    verification = assistant._verify_mentions("C7B.00 is a secondary neuroendocrine tumor code.", results)
+
+    assert verification["mentioned_codes"] == ["C7B.00"]
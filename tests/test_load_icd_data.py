@@ -0,0 +1,111 @@
+from app.database.neo4j_client import Neo4jICD
+from benchmarks.fakes import FakeDriver
+from load_icd_data import delta_sync_icd_data, load_icd_data
+from neo4j.exceptions import ClientError
+from tests.conftest import ICD_ROWS, write_csv
+import csv
+import json
+
+def run_load(tmp_path, icd_csv, driver, neo4j_client=None, **kwargs):
+    kwargs.setdefault('batch_size', 3)
+    kwargs.setdefault('workers', 2)
+    load_icd_data(csv_path=icd_csv, state_file=tmp_path / 'load.state.json',
+                  reject_file=tmp_path / 'rejected.csv',
+                  neo4j_client=neo4j_client or Neo4jICD(None, None, None, driver=driver), **kwargs)
+
+def failing_client(driver, bad_code):
+    """Client whose batch writes fail and whose single-row write fails for bad_code"""
+    client = Neo4jICD(None, None, None, driver=driver)
+    create_one = client.create_icd_relationships
+
+    def create_batch(rows, session=None):
+        raise ClientError("constraint violation in batch")
+
+    def create(row, session=None):
+        if row['full_code'] == bad_code:
+            raise ClientError(f"cannot write {bad_code}")
+        return create_one(row, session=session)
+
+    client.create_icd_relationships_batch = create_batch
+    client.create_icd_relationships = create
+    return client
+
+def read_rejects(path):
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        return list(csv.reader(file))[1:]
+
+def test_batched_load_writes_every_row_with_dotted_codes(tmp_path, icd_csv, driver):
+    run_load(tmp_path, icd_csv, driver)
+
+    graph = driver.graph
+    assert set(graph.codes) == {'A01', 'A01.0', 'A01.00', 'A01.09', 'E11', 'E11.9', 'J12', 'J12.9'}
+    assert graph.codes['A01.09']['short_desc'] == "Typhoid fever with other complications"
+    assert graph.dataset_version is not None
+    assert not (tmp_path / 'load.state.json').exists()  # checkpoint cleared on success
+
+def test_batched_load_uses_one_write_per_chunk(tmp_path, icd_csv):
+    batched, per_row = FakeDriver(), FakeDriver()
+    run_load(tmp_path, icd_csv, batched, batch_size=100, workers=1)
+    run_load(tmp_path, icd_csv, per_row, batch_size=100, workers=1, per_row=True)
+
+    assert set(batched.graph.codes) == set(per_row.graph.codes)
+    # One UNWIND write for the chunk instead of one write per row
+    assert per_row.graph.queries - batched.graph.queries == len(per_row.graph) - 1
+
+def test_load_builds_hierarchy_after_all_nodes_exist(loaded_graph):
+    assert loaded_graph.codes['A01.09']['parent_code'] == 'A01.0'
+    assert loaded_graph.codes['A01.09']['ancestors'] == ['A01', 'A01.0']
+    assert loaded_graph.codes['A01']['parent_code'] is None
+    assert loaded_graph.children['A01.0'] == {'A01.00', 'A01.09'}
+    assert loaded_graph.categories['E11.9'] == "Endocrine disorders"
+
+def test_rows_that_fail_to_parse_are_rejected_verbatim(tmp_path, driver):
+    short_row = ["J12", "", "J128"]
+    icd_csv = write_csv(tmp_path / 'codes.csv', ICD_ROWS + [short_row])
+    run_load(tmp_path, icd_csv, driver)
+
+    assert read_rejects(tmp_path / 'rejected.csv') == [["9", "list index out of range", *short_row]]
+    assert len(driver.graph) == len(ICD_ROWS)
+
+def test_rows_that_fail_to_write_are_rejected_verbatim(tmp_path, icd_csv, driver):
+    run_load(tmp_path, icd_csv, driver, neo4j_client=failing_client(driver, "E11.9"))
+
+    assert read_rejects(tmp_path / 'rejected.csv') == [["6", "cannot write E11.9", *ICD_ROWS[5]]]
+    assert "E11.9" not in driver.graph.codes and len(driver.graph) == len(ICD_ROWS) - 1
+
+def test_delta_sync_keeps_the_old_fingerprint_of_codes_that_failed_to_write(tmp_path, icd_csv, loaded_graph, driver):
+    manifest = tmp_path / 'manifest.json'
+    with open(manifest, 'w', encoding='utf-8') as file:
+        json.dump({code: node['fingerprint'] for code, node in loaded_graph.codes.items()}, file)
+    old_fingerprint = loaded_graph.codes['E11.9']['fingerprint']
+    changed = [row[:3] + [row[3] + " (revised)"] + row[4:] if row[2] in ("E119", "J129") else row for row in ICD_ROWS]
+    write_csv(icd_csv, changed)
+
+    report = delta_sync_icd_data(batch_size=10, csv_path=icd_csv, manifest=manifest,
+                                 reject_file=tmp_path / 'delta_rejected.csv',
+                                 neo4j_client=failing_client(driver, "E11.9"))
+
+    assert report['changed'] == 2 and report['rejected'] == 1
+    assert read_rejects(tmp_path / 'delta_rejected.csv')[0][2:] == changed[5]
+    with open(manifest, 'r', encoding='utf-8') as file:
+        fingerprints = json.load(file)
+    assert fingerprints['E11.9'] == old_fingerprint  # retried by the next sync
+    assert fingerprints['J12.9'] == loaded_graph.codes['J12.9']['fingerprint'] != old_fingerprint
+
+def test_delta_sync_reparents_around_added_and_retired_codes(tmp_path, driver):
+    without_a010 = [row for row in ICD_ROWS if row[2] != "A010"]
+    icd_csv = write_csv(tmp_path / 'codes.csv', without_a010)
+    run_load(tmp_path, icd_csv, driver)
+    graph = driver.graph
+    assert graph.codes['A01.09']['parent_code'] == "A01"
+
+    write_csv(icd_csv, [row for row in ICD_ROWS if row[2] != "J12"])
+    report = delta_sync_icd_data(batch_size=10, csv_path=icd_csv, reject_file=tmp_path / 'rejected.csv',
+                                 neo4j_client=Neo4jICD(None, None, None, driver=driver))
+
+    assert (report['added'], report['changed'], report['removed']) == (1, 0, 1)
+    assert graph.codes['A01.09']['parent_code'] == "A01.0"
+    assert graph.codes['A01.09']['ancestors'] == ["A01", "A01.0"]
+    assert graph.children['A01.0'] == {"A01.00", "A01.09"} and "A01.09" not in graph.children['A01']
+    assert graph.codes['J12.9']['parent_code'] is None and graph.codes['J12.9']['depth'] == 0
+    assert "J12" in graph.retired
@@ -0,0 +1,103 @@
+from app.database.neo4j_client import Neo4jICD
+from app.services.icd_service import ICDService
+from app.services.metrics import MetricsRegistry
+from benchmarks.fakes import FakeDriver, FakeSession
+
+class CountingDriver(FakeDriver):
+    def __init__(self):
+        super().__init__()
+        self.sessions = 0
+        self.closed = False
+        self.transactions = []
+
+    def session(self, **config):
+        self.sessions += 1
+        driver = self
+
+        class CountingSession(FakeSession):
+            def execute_read(self, work, *args, **kwargs):
+                driver.transactions.append("read")
+                return super().execute_read(work, *args, **kwargs)
+
+            def execute_write(self, work, *args, **kwargs):
+                driver.transactions.append("write")
+                return super().execute_write(work, *args, **kwargs)
+
+        return CountingSession(self.graph, self.latency)
+
+    def close(self):
+        self.closed = True
+
+def test_driver_is_created_on_first_use(monkeypatch):
+    created = []
+    monkeypatch.setattr(Neo4jICD, "_create_driver", lambda self: created.append(1) or FakeDriver())
+
+    client = Neo4jICD("neo4j://localhost:7687", "neo4j", "secret")
+    assert created == []
+
+    client.get_dataset_version()
+    client.get_dataset_version()
+    assert created == [1]
+
+def test_reads_and_writes_use_managed_transactions(metrics):
+    driver = CountingDriver()
+    client = Neo4jICD(None, None, None, driver=driver, metrics=metrics)
+
+    client.bump_dataset_version("v1")
+    assert client.get_dataset_version() == "v1"
+    assert driver.transactions == ["write", "read"]
+
+def test_services_share_one_client_and_leave_it_open(metrics):
+    driver = CountingDriver()
+    client = Neo4jICD(None, None, None, driver=driver, metrics=metrics)
+    first = ICDService(None, None, None, db_client=client, enable_cache=False, lazy=True)
+    second = ICDService(None, None, None, db_client=client, enable_cache=False, lazy=True)
+
+    assert first.driver is second.driver is driver
+    first.close()
+    assert driver.closed is False
+
+def test_service_closes_the_client_it_created(monkeypatch):
+    driver = CountingDriver()
+    monkeypatch.setattr(Neo4jICD, "_create_driver", lambda self: driver)
+    service = ICDService("neo4j://localhost:7687", "neo4j", "secret", enable_cache=False, lazy=True)
+
+    service.get_code_details_many(["A01.0"])
+    service.close()
+
+    assert driver.closed is True
+
+def test_client_without_a_registry_records_nothing():
+    client = Neo4jICD(None, None, None, driver=FakeDriver())
+
+    client.get_dataset_version()
+    assert client.metrics is None
+
+def test_service_injects_its_registry_and_reports_query_texts():
+    registry = MetricsRegistry()
+    client = Neo4jICD(None, None, None, driver=FakeDriver())
+    service = ICDService(None, None, None, db_client=client, enable_cache=False, lazy=True, metrics=registry)
+
+    service.db_client.get_dataset_version()
+
+    snapshot = registry.snapshot()
+    assert client.metrics is registry
+    assert any("Dataset" in text for text in snapshot['collectors']['neo4j_queries'].values())
+
+def test_collectors_stay_off_the_process_wide_registry():
+    from app.services.metrics import metrics as process_metrics
+    before = set(process_metrics.snapshot()['collectors'])
+
+    ICDService(None, None, None, db_client=Neo4jICD(None, None, None, driver=FakeDriver()), lazy=True).close()
+
+    assert set(process_metrics.snapshot()['collectors']) == before
+
+def test_close_unregisters_the_service_collectors():
+    registry = MetricsRegistry()
+    service = ICDService(None, None, None, db_client=Neo4jICD(None, None, None, driver=FakeDriver()),
+                         lazy=True, metrics=registry)
+    assert {"result_cache", "neo4j_queries"} <= set(registry.snapshot()['collectors'])
+
+    service.close()
+
+    assert registry.snapshot()['collectors'] == {}
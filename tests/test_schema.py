@@ -0,0 +1,48 @@
+from app.database.neo4j_client import Neo4jICD
+from app.database.schema import SCHEMA_STATEMENTS, ensure_schema
+from app.services.icd_service import ICDService
+from benchmarks.fakes import FakeDriver, FakeSession
+from load_icd_data import INDEX_AWAIT_TIMEOUT, load_icd_data
+
+class RecordingDriver(FakeDriver):
+    """FakeDriver that remembers every statement run through session.run"""
+
+    def __init__(self):
+        super().__init__()
+        self.statements = []
+
+    def session(self, **config):
+        driver = self
+
+        class RecordingSession(FakeSession):
+            def run(self, query, parameters=None, **kwargs):
+                driver.statements.append((query, parameters))
+                return super().run(query, parameters, **kwargs)
+
+        return RecordingSession(self.graph, self.latency)
+
+def test_ensure_schema_creates_every_index_without_waiting():
+    driver = RecordingDriver()
+    ensure_schema(driver)
+
+    assert [query for query, _ in driver.statements] == SCHEMA_STATEMENTS
+
+def test_ensure_schema_awaits_indexes_when_asked():
+    driver = RecordingDriver()
+    ensure_schema(driver, await_timeout=30)
+
+    assert driver.statements[-1] == ("CALL db.awaitIndexes($timeout)", {'timeout': 30})
+
+def test_service_start_does_not_await_indexes(metrics):
+    driver = RecordingDriver()
+    ICDService(None, None, None, db_client=Neo4jICD(None, None, None, driver=driver, metrics=metrics),
+               enable_cache=False)
+
+    assert [query for query, _ in driver.statements] == SCHEMA_STATEMENTS
+
+def test_loader_awaits_indexes(tmp_path, icd_csv):
+    driver = RecordingDriver()
+    load_icd_data(csv_path=icd_csv, state_file=tmp_path / 'state.json', reject_file=tmp_path / 'rejected.csv',
+                  neo4j_client=Neo4jICD(None, None, None, driver=driver))
+
+    assert ("CALL db.awaitIndexes($timeout)", {'timeout': INDEX_AWAIT_TIMEOUT}) in driver.statements
@@ -0,0 +1,47 @@
+from app.services.search_index import InMemorySearchIndex
+
+def test_from_csv_indexes_every_code(icd_csv):
+    index = InMemorySearchIndex.from_csv(icd_csv)
+    assert len(index) == 8
+
+def test_exact_code_ranks_first(icd_csv):
+    index = InMemorySearchIndex.from_csv(icd_csv)
+
+    results = index.search("A010", ["typhoid"], limit=3)
+
+    assert results[0]['code'] == "A01.0"
+    assert len(results) == 3
+
+def test_whole_text_match_outranks_term_match(icd_csv):
+    index = InMemorySearchIndex.from_csv(icd_csv)
+
+    results = index.search("viral pneumonia, unspecified", ["viral", "pneumonia"])
+
+    assert [result['code'] for result in results] == ["J12.9", "J12"]
+
+def test_terms_match_by_prefix_and_phrase(icd_csv):
+    index = InMemorySearchIndex.from_csv(icd_csv)
+
+    assert {result['code'] for result in index.search("", ["diab"])} == {"E11", "E11.9"}
+    assert [result['code'] for result in index.search("", ["without complications"])] == ["E11.9"]
+
+def test_memory_mode_never_queries_the_database(service, graph):
+    service.load_search_index()
+    queries = graph.queries
+
+    results = service.search_by_description("typhoid fever", mode="memory")
+
+    assert results[0]['code'].startswith("A01")
+    assert graph.queries == queries
+
+def test_dotted_code_terms_match_undotted_code_tokens(icd_csv):
+    index = InMemorySearchIndex.from_csv(icd_csv)
+
+    assert [result['code'] for result in index.search("", ["e11.9"])] == ["E11.9"]
+
+def test_memory_mode_finds_typed_dotted_codes(service):
+    service.load_search_index()
+
+    results = service.search_by_description("E11.9 fever", mode="memory")
+
+    assert "E11.9" in [result['code'] for result in results]
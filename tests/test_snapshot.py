@@ -0,0 +1,58 @@
+import pytest
+
+from app.database.neo4j_client import Neo4jICD
+from app.database.snapshot import ICDSnapshot, ReadOnlySnapshotError, write_snapshot
+from app.models.icd_models import ICDCode
+from app.services.icd_service import ICDService
+from export_snapshot import csv_records
+
+@pytest.fixture
+def snapshot_path(tmp_path, icd_csv):
+    return write_snapshot(tmp_path / 'icd10.snapshot', csv_records(icd_csv), dataset_version="v7")
+
+def test_snapshot_answers_lookups_like_neo4j(snapshot_path):
+    snapshot = ICDSnapshot(snapshot_path)
+
+    assert len(snapshot) == 8 and snapshot.dataset_version == "v7"
+    details = snapshot.code_details("A0109")
+    assert details['code'] == "A01.09"
+    assert details['parent_code'] == "A01.0" and details['ancestors'] == ["A01", "A01.0"]
+    assert details['category_name'] == "Infectious diseases"
+    assert sorted(snapshot.disease_info("A01.0")['child_codes']) == ["A01.00", "A01.09"]
+    assert snapshot.code_details("Z99") is None
+    snapshot.close()
+
+def test_category_page_resumes_after_a_code(snapshot_path):
+    snapshot = ICDSnapshot(snapshot_path)
+
+    assert [code['code'] for code in snapshot.category_page("A01", limit=2)] == ["A01", "A01.0"]
+    assert [code['code'] for code in snapshot.category_page("A01", after="A01.0")] == ["A01.00", "A01.09"]
+    snapshot.close()
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / 'codes.snapshot'
+    path.write_bytes(b"not a snapshot" * 8)
+
+    with pytest.raises(ValueError, match="not an ICD snapshot"):
+        ICDSnapshot(path)
+
+def test_cached_snapshot_service_never_opens_a_driver(monkeypatch, snapshot_path):
+    monkeypatch.setattr(Neo4jICD, "_create_driver", lambda self: pytest.fail("driver created"))
+    service = ICDService.from_snapshot(snapshot_path, enable_cache=True)
+
+    assert service.result_cache.version == "v7"
+    assert service.get_code_details("J12.9")['category_code'] == "J12"
+    service.close()
+
+def test_snapshot_service_is_read_only(snapshot_path):
+    service = ICDService.from_snapshot(snapshot_path)
+    code = ICDCode(category_code="A01", subcategory="1", full_code="A01.1", short_description="Paratyphoid fever A",
+                   long_description="Paratyphoid fever A", category_name="Infectious diseases")
+
+    with pytest.raises(ReadOnlySnapshotError, match="read-only snapshot backend"):
+        service.create_icd_code(code)
+    service.close()
+
+def test_client_without_a_uri_fails_clearly():
+    with pytest.raises(RuntimeError, match="No Neo4j URI configured"):
+        Neo4jICD(None, None, None).get_dataset_version()
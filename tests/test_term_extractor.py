@@ -0,0 +1,24 @@
+from app.services.term_extractor import TermExtractor
+
+def test_codes_need_the_icd_category_shape():
+    terms = TermExtractor().extract("t2dm follow-up, E11.9 and C7A.01, r/o S72.001")
+
+    assert terms[:3] == ["e11.9", "c7a.01", "s72.001"]
+    assert "t2dm" not in terms and "type 2 diabetes" in terms
+
+def test_letter_in_third_slot_only_for_real_categories():
+    assert TermExtractor().extract("a1b c4a z3a.0 c8a") == ["c4a", "z3a.0", "a1b", "c8a"]
+
+def test_known_codes_filter_code_shaped_words():
+    extractor = TermExtractor(codes=["E11", "E11.9", "U07.1"])
+
+    terms = extractor.extract("low b12 with E11.9 and u07.1")
+
+    assert terms[:2] == ["e11.9", "u07.1"]
+    assert "b12" in terms[2:]  # still searched, but as a plain word
+
+def test_vocabulary_load_registers_known_codes(service, icd_csv):
+    extractor = service.load_term_vocabulary(csv_path=icd_csv)
+
+    assert extractor.extract("A01.0 or b12")[0] == "a01.0"
+    assert extractor.categories == {"a01", "e11", "j12"}
@@ -0,0 +1,36 @@
+from app.services.vector_index import VectorIndex
+
+def test_semantic_search_ranks_similar_descriptions_first(service, tmp_path):
+    service.load_vector_index(str(tmp_path / "vectors"))
+
+    results = service.semantic_search("typhoid fever complications", limit=3)
+
+    assert results[0]['code'] == "A01.09"
+
+def test_saved_index_is_stamped_with_the_dataset_version(service, loaded_graph, tmp_path):
+    service.load_vector_index(str(tmp_path / "vectors"))
+
+    assert VectorIndex.saved_version(tmp_path / "vectors") == loaded_graph.dataset_version
+
+def test_index_is_reused_for_the_same_version(service, loaded_graph, tmp_path):
+    service.load_vector_index(str(tmp_path / "vectors"))
+    loaded_graph.codes.pop("E11.9")
+
+    assert len(service.load_vector_index(str(tmp_path / "vectors"))) == 8
+
+def test_index_is_rebuilt_when_the_dataset_version_changes(service, loaded_graph, tmp_path):
+    service.load_vector_index(str(tmp_path / "vectors"))
+    loaded_graph.codes.pop("E11.9")
+    service.db_client.bump_dataset_version("next")
+
+    index = service.load_vector_index(str(tmp_path / "vectors"))
+
+    assert len(index) == 7
+    assert VectorIndex.saved_version(tmp_path / "vectors") == "next"
+
+def test_csv_index_is_rebuilt_when_the_csv_changes(service, icd_csv, tmp_path):
+    service.load_vector_index(str(tmp_path / "vectors"), csv_path=str(icd_csv))
+    with open(icd_csv, 'a', encoding='utf-8') as file:
+        file.write("J12,1,J121,Respiratory syncytial virus pneumonia,RSV pneumonia,Respiratory system\n")
+
+    assert len(service.load_vector_index(str(tmp_path / "vectors"), csv_path=str(icd_csv))) == 9